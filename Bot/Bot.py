@@ -1,11 +1,16 @@
 import datetime
+import time
+from BotHelper import Onboarding
 from BotHelper import Scheduler
 from BotHelper import Response
-from BotHelper import output
+from BotHelper import SingleFlight
+from BotHelper import NOOP_SPAN, SAMPLED, get_logger, metrics, tracer
 
 # Import bot cmds
 import cmds
 
+log = get_logger(__name__)
+
 
 class Bot:
     # constants
@@ -25,6 +30,24 @@ class Bot:
         self.slack_client = slack_client
         self.scheduler = scheduler
         self.db_conn = db_conn
+
+        # greet users joining the workspace in batches. The Slack connection outlives the Bot, which is created
+        # again on every reconnect, so the previous Bot's onboarding is shut down and its queued users moved over
+        self.onboarding = None
+        if slack_client:
+            previous = getattr(slack_client, "onboarding", None)
+            self.onboarding = Onboarding(slack_client, lambda: cmds.greet_user.render_template(self))
+
+            if previous is not None:
+                for user, joined in previous.shutdown():
+                    self.onboarding.add(user, joined)
+
+            slack_client.onboarding = self.onboarding
+            slack_client.team_join_handler = self.onboarding.add
+
+        # identical commands running at the same time share one execution
+        self.single_flight = SingleFlight("commands")
+
         # list of available commands
         self.commands = list(cmds.COMMANDS.values())
         self.commands.sort()
@@ -48,12 +71,48 @@ class Bot:
 
         for k, v in commands:
             if command.lower().startswith(v):
-                cmd = getattr(getattr(cmds, k), 'execute')
-
-                response1, response2 = cmd(command, user, self)
+                module = getattr(cmds, k)
+                cmd = getattr(module, 'execute')
+                start = time.perf_counter()
+                outcome = "error"
+
+                try:
+                    with tracer.span("command", command=k) as span:
+                        response1, response2, outcome = self.run_command(module, cmd, k, command, user)
+                        span.set_attribute("outcome", outcome)
+                finally:
+                    metrics.record("command.duration", time.perf_counter() - start, command=k, outcome=outcome)
 
         return response1, response2
 
+    def run_command(self, module, cmd, name, command, user):
+        """
+        Calls a command's execute function, sharing the execution with identical commands already running if
+        the command allows it
+
+        Returns:
+            (tuple) The two responses of the command, and whether it ran ("ok") or shared a result ("shared")
+        """
+        if not self.can_coalesce(module, command):
+            response1, response2 = cmd(command, user, self)
+            return response1, response2, "ok"
+
+        key = (name, " ".join(command.split()))
+        (response1, response2), shared = self.single_flight.do(key, lambda: cmd(command, user, self))
+
+        return response1, response2, "shared" if shared else "ok"
+
+    @staticmethod
+    def can_coalesce(module, command):
+        """
+        Returns True if concurrent runs of the command can share one execution. Commands opt in with a module
+        level coalesce, either True or a function deciding for a given command. The shared result is sent to
+        every caller unchanged, so commands whose output depends on the calling user must not coalesce.
+        """
+        coalesce = getattr(module, 'coalesce', False)
+
+        return coalesce(command) if callable(coalesce) else bool(coalesce)
+
     def handle_command(self, command, channel, user, msg_type):
         """
         Processes an incoming bot command, if the command is known.
@@ -75,7 +134,7 @@ class Bot:
         response = None
         attachment = None
 
-        output(f"Command: '{command}' - User: {user} - Channel: {channel}")
+        log.info("Command: '%s' - User: %s - Channel: %s", command, user, channel, extra=SAMPLED)
 
         if self.db_conn:
             # TODO: create a document generator
@@ -86,15 +145,16 @@ class Bot:
                 'channel': channel
             }
 
-            result = self.db_conn.insert_document(
-                doc,
-                db=self.db_conn.CONFIG['db'],
-                collection=self.db_conn.CONFIG['collections']['cmds']
-            )
+            with metrics.timer("stage.duration", stage="mongo_insert"), tracer.span("mongo.insert"):
+                result = self.db_conn.insert_document(
+                    doc,
+                    db=self.db_conn.CONFIG['db'],
+                    collection=self.db_conn.CONFIG['collections']['cmds']
+                )
 
             # TODO: Fix logging output for DB stuff
-            output(
-               f"[{self.db_conn.db}: {self.db_conn.collection}] - Inserted: {result.inserted_id}")
+            log.debug("[%s: %s] - Inserted: %s", self.db_conn.CONFIG['db'],
+                      self.db_conn.CONFIG['collections']['cmds'], result.inserted_id)
 
         if msg_type == "message":
             response, attachment = self.execute_command(
@@ -118,15 +178,16 @@ class Bot:
                 }
             }}
 
-            result = self.db_conn.update_document_by_oid(
-                result.inserted_id,
-                update,
-                db=self.db_conn.CONFIG['db'],
-                collection=self.db_conn.CONFIG['collections']['cmds']
-            )
+            with metrics.timer("stage.duration", stage="mongo_update"), tracer.span("mongo.update"):
+                result = self.db_conn.update_document_by_oid(
+                    result.inserted_id,
+                    update,
+                    db=self.db_conn.CONFIG['db'],
+                    collection=self.db_conn.CONFIG['collections']['cmds']
+                )
 
-            output(
-               f"[{self.db_conn.db}: {self.db_conn.collection}] - Updated: {result.raw_result}")
+            log.debug("[%s: %s] - Updated: %s", self.db_conn.CONFIG['db'],
+                      self.db_conn.CONFIG['collections']['cmds'], result.raw_result)
 
         return out
 
@@ -147,7 +208,61 @@ class Bot:
         if args:
             command = " ".join([command, args])
 
-        response = self.handle_command(command, channel, user, msg_type)
+        trace = tracer.start_trace("scheduled_command", command=command, channel=channel)
+
+        with tracer.activate(trace):
+            try:
+                self.reply(command, channel, user, msg_type)
+            except Exception as err:
+                trace.set_error(err)
+                raise
+            finally:
+                trace.end()
+
+    def respond_to_command(self, command, channel, user, msg_type, trace=NOOP_SPAN):
+        """
+        Executes a command received from Slack and sends its response.
+        Used to handle commands on worker threads, so a slow command doesn't hold up the others. When the command
+        fails, the user is told so and the exception is raised again, for the main loop to handle through the
+        command's future.
+
+        Args:
+            trace (Span): Root span of the command's trace, started when the command was received
+        """
+        # time between receiving the command and a worker picking it up
+        trace.set_attribute("queued_ms", round(trace.elapsed() * 1000, 3))
+
+        with tracer.activate(trace):
+            try:
+                self.reply(command, channel, user, msg_type)
+            except Exception as err:
+                trace.set_error(err)
+                self.reply_error(command, channel, user)
+                raise
+            finally:
+                trace.end()
+
+    def reply_error(self, command, channel, user):
+        """
+        Tells the user that their command failed. Errors while doing so are logged, not raised, so they don't
+        hide the command's own exception.
+        """
+        # commands that weren't sent in a channel, like greeting a user, have nobody to tell
+        if channel is None:
+            return
+
+        response = Response(channel, "Sorry <@{}>, something went wrong while running `{}`. "
+                                     "My admins have been notified.".format(user, command))
+
+        try:
+            self.slack_client.response_to_client(response)
+        except Exception as err:
+            log.error("Unable to tell %s that '%s' failed: %s", user, command, err)
+
+    def reply(self, command, channel, user, msg_type):
+        with metrics.timer("stage.duration", stage="handle_command"), tracer.span("handle_command"):
+            response = self.handle_command(command, channel, user, msg_type)
+
         self.slack_client.response_to_client(response)
 
     def cleanup_your_mess(self):
@@ -157,8 +272,11 @@ class Bot:
 
         # TODO: I believe this works, but urllib3.connectionpool retries to
         # connect 3 times after close. Might be fine.
-        output("Closing Chrome driver")
-        driver = getattr(getattr(cmds, 'packtbook'), 'driver')
+        if self.scheduler:
+            self.scheduler.stop()
+
+        cmds.snhu_catalog.stop_watch()
 
-        if driver:
-            driver.quit()
+        log.info("Closing Chrome drivers")
+        cmds.packtbook.cache.stop()
+        cmds.packtbook.pool.shutdown()
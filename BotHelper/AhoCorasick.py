@@ -0,0 +1,123 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Implements an Aho-Corasick automaton for finding many patterns in a text with a single pass.
+
+    Patterns can be added and removed at any time; the failure links are recomputed lazily on the next search.
+    """
+
+    def __init__(self, patterns=()):
+        self.goto = [{}]  # node -> {character: next node}
+        self.terminal = [None]  # node -> pattern ending at the node
+        self.fail = [0]
+        self.output = [()]  # node -> patterns ending at the node, including through failure links
+        self.patterns = set()
+        self.built = True
+
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def add(self, pattern):
+        """
+        Adds a pattern to the automaton
+
+        Args:
+            pattern (str): Non-empty pattern to find
+        """
+        if not pattern or pattern in self.patterns:
+            return
+
+        node = 0
+
+        for ch in pattern:
+            next_node = self.goto[node].get(ch)
+
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][ch] = next_node
+                self.goto.append({})
+                self.terminal.append(None)
+
+            node = next_node
+
+        self.terminal[node] = pattern
+        self.patterns.add(pattern)
+        self.built = False
+
+    def remove(self, pattern):
+        """
+        Removes a pattern from the automaton, if present. The trie nodes are kept for reuse.
+        """
+        if pattern not in self.patterns:
+            return
+
+        node = 0
+        for ch in pattern:
+            node = self.goto[node][ch]
+
+        self.terminal[node] = None
+        self.patterns.discard(pattern)
+        self.built = False
+
+    def build(self):
+        """
+        Computes the failure links and outputs of every node, breadth first
+        """
+        self.fail = [0] * len(self.goto)
+        self.output = [()] * len(self.goto)
+        queue = deque()
+
+        for child in self.goto[0].values():
+            self.output[child] = (self.terminal[child],) if self.terminal[child] else ()
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+
+            for ch, child in self.goto[node].items():
+                fallback = self.fail[node]
+
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                own = (self.terminal[child],) if self.terminal[child] else ()
+                self.output[child] = own + self.output[self.fail[child]]
+                queue.append(child)
+
+        self.built = True
+
+    def find(self, text):
+        """
+        Finds every occurrence of every pattern in text, including overlapping ones
+
+        Args:
+            text (str): Text to search
+
+        Returns:
+            (generator) Tuples of (start index, pattern)
+        """
+        if not self.built:
+            self.build()
+
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        node = 0
+
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(ch, 0)
+
+            for pattern in output[node]:
+                yield i - len(pattern) + 1, pattern
@@ -1,12 +1,60 @@
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+
+from .Metrics import metrics
+from .RequisiteGraph import RequisiteGraph
+from .SearchIndex import SearchIndex
+
+# Snapshot layout: header (magic, format version, payload length, payload crc32) followed by a UTF-8 JSON payload
+# holding the catalog version, the subject documents and the search index postings (see Catalog.save).
+# SNAPSHOT_FORMAT must be bumped whenever the keys or meaning of that payload change; older snapshots are then
+# rejected and the catalog is reloaded from the database instead.
+SNAPSHOT_MAGIC = b"SNHUCAT"
+SNAPSHOT_FORMAT = 4
+SNAPSHOT_HEADER = struct.Struct("<7sHQI")
+
+
+def intern_string(value):
+    """
+    Interns string values so that repeated strings share a single object in memory
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def build_subjects(documents):
+    """
+    Builds the subject -> course ID -> Course mapping from subject documents
+
+    Args:
+        documents (list): Subject documents containing a title and a list of courses
+    """
+    subjects = {}
+
+    for subject in documents:
+        course_data = {}
+        for course in subject['courses']:
+            course_data[course['id']] = Course(
+                course['title'], course['description'], course['credits'], course['requisites'])
+        subjects[intern_string(subject['title'])] = course_data
+
+    return subjects
+
+
 class Course:
     """
     Implements a Course data structure to be used within a Subject.
+    Uses __slots__ to avoid a per-instance __dict__, as catalogs can hold many thousands of courses.
     """
+    __slots__ = ('title', 'description', 'credits', 'requisites')
 
     def __init__(self, title, description, creds, reqs):
         self.title = title
         self.description = description
-        self.credits = creds
+        self.credits = intern_string(creds)
         self.requisites = reqs
 
     def __repr__(self):
@@ -25,7 +73,12 @@ class Catalog:
     """
 
     def __init__(self):
+        self.version = 0  # catalog version in the database, see CatalogIngest
         self.subjects = {}
+        self.courses = {}  # flat course_id -> Course lookup, sharing objects with subjects
+        self.index = SearchIndex()
+        self.graph = RequisiteGraph()
+        self.lock = threading.RLock()
 
     def __repr__(self):
         return repr(self.subjects)
@@ -33,6 +86,138 @@ class Catalog:
     def __len__(self):
         return len(self.subjects)
 
+    def save(self, path):
+        """
+        Writes a snapshot of the catalog, including its search index, to path. Only the course records and
+        index postings are stored; the requisite graph is rebuilt when the snapshot is loaded.
+        The file is readable by its owner only, written to a temporary location first and then moved into place.
+
+        Args:
+            path (str): Location of the snapshot file
+        """
+        with self.lock:
+            data = {
+                "version": self.version,
+                "subjects": [
+                    {
+                        "title": title,
+                        "courses": [
+                            {"id": course_id, "title": course.title, "description": course.description,
+                             "credits": course.credits, "requisites": course.requisites}
+                            for course_id, course in course_data.items()
+                        ]
+                    }
+                    for title, course_data in self.subjects.items()
+                ],
+                "index": self.index.dump(),
+            }
+            payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+        tmp_path = path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+        with os.fdopen(fd, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(payload), zlib.crc32(payload)))
+            f.write(payload)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a catalog from a snapshot file written by save()
+
+        Args:
+            path (str): Location of the snapshot file
+
+        Returns:
+            (Catalog) The catalog stored in the snapshot
+
+        Raises:
+            ValueError: The file is not a valid snapshot, or was written by an incompatible version
+        """
+        with open(path, 'rb') as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+
+            if len(header) < SNAPSHOT_HEADER.size:
+                raise ValueError("{} is not a catalog snapshot".format(path))
+
+            magic, version, length, crc = SNAPSHOT_HEADER.unpack(header)
+
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError("{} is not a catalog snapshot".format(path))
+            if version != SNAPSHOT_FORMAT:
+                raise ValueError("Unsupported catalog snapshot format: {}".format(version))
+
+            payload = f.read(length)
+
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError("Catalog snapshot {} is corrupt".format(path))
+
+        try:
+            data = json.loads(payload.decode("utf-8"))
+
+            catalog = cls()
+            catalog.version = data["version"]
+            catalog.subjects = build_subjects(data["subjects"])
+            catalog.courses = {course_id: course
+                               for course_data in catalog.subjects.values()
+                               for course_id, course in course_data.items()}
+            catalog.index = SearchIndex.restore(data["index"])
+        except (KeyError, TypeError, AttributeError, UnicodeDecodeError) as err:
+            raise ValueError("Catalog snapshot {} is corrupt: {!r}".format(path, err))
+
+        catalog.graph.build(catalog.courses)
+
+        return catalog
+
+    def load_documents(self, documents):
+        """
+        Loads subject documents (as stored in the catalog database) into the catalog.
+        Only courses that were added, changed or removed since the last load are re-indexed, and the
+        requisite graph is only rebuilt when something changed.
+
+        Args:
+            documents (list): Subject documents containing a title and a list of courses
+
+        Returns:
+            (int) Number of courses that were added, changed or removed
+        """
+        subjects = build_subjects(documents)
+
+        with self.lock:
+            old_courses = self.courses
+            new_courses = {}
+            changes = 0
+
+            for course_data in subjects.values():
+                for course_id, course in course_data.items():
+                    old = old_courses.get(course_id)
+
+                    if old is None or old.to_tuple() != course.to_tuple() or old.requisites != course.requisites:
+                        self.index.add(course_id, f"{course.title} {course.description}")
+                        changes += 1
+                    else:
+                        # keep the existing object so unchanged courses are not duplicated in memory
+                        course_data[course_id] = old
+
+                    new_courses[course_id] = course_data[course_id]
+
+            for course_id in old_courses.keys() - new_courses.keys():
+                self.index.remove(course_id)
+                changes += 1
+
+            self.subjects = subjects
+            self.courses = new_courses
+
+            # the requisite graph is precomputed once for each version of the catalog
+            if changes:
+                graph = RequisiteGraph()
+                graph.build(new_courses)
+                self.graph = graph
+
+        return changes
+
     def get_subject(self, subject):
         """
         Returns the subject data if it exists
@@ -50,11 +235,7 @@ class Catalog:
         """
         Checks all subjects for the course, and returns the data if it finds it, else None
         """
-        for subject in self.subjects.keys():
-            if course in self.subjects[subject].keys():
-                return self.subjects[subject][course]
-
-        return None
+        return self.courses.get(course)
 
     def get_courses(self, subject):
         """
@@ -62,3 +243,20 @@ class Catalog:
         """
         return list(self.subjects[subject].keys(
         ))  # wrap in list to work with dictionary objects
+
+    def search(self, query, limit=3):
+        """
+        Performs a ranked full-text search over course titles and descriptions
+
+        Args:
+            query (str): Free text query
+            limit (int): Maximum number of courses to return
+
+        Returns:
+            (list) Tuples of (course_id, Course), best match first
+        """
+        with metrics.timer('catalog.search'), self.lock:
+            results = self.index.search(query, limit)
+
+            # resolved under the lock, so a refresh can't remove a course between the search and the lookup
+            return [(course_id, self.courses[course_id]) for course_id, _ in results if course_id in self.courses]
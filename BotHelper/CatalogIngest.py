@@ -0,0 +1,267 @@
+import csv
+import json
+import re
+import time
+
+from pymongo import UpdateOne
+
+from .Logger import get_logger
+
+log = get_logger(__name__)
+
+CATALOG_DB = "catalog"
+SUBJECTS_COLLECTION = "subjects"
+META_COLLECTION = "meta"
+VERSION_ID = "version"
+
+COURSE_ID_REGEX = re.compile(r"^([A-Z]{2,4})([0-9]{3})$")
+COURSE_FIELDS = ("title", "description", "credits", "requisites")
+
+
+def normalize_course_id(course_id):
+    """
+    Normalizes a course ID (CS 499, cs-499, ...) to the catalog format (CS499)
+
+    Returns:
+        The normalized ID, or None if the ID is not valid
+    """
+    course_id = re.sub(r"[\s-]", "", str(course_id or "")).upper()
+
+    return course_id if COURSE_ID_REGEX.match(course_id) else None
+
+
+def read_json(f, chunk_size=65536):
+    """
+    Streams records from a JSON array, or from JSON lines, without loading the whole file
+
+    Args:
+        f: Text file object
+        chunk_size (int): Number of characters to read at a time
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    in_array = None
+    eof = False
+
+    while True:
+        buffer = buffer.lstrip()
+
+        # skip the array delimiters between records
+        if in_array is None and buffer:
+            in_array = buffer.startswith("[")
+            if in_array:
+                buffer = buffer[1:].lstrip()
+        if in_array and buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if in_array and buffer.startswith("]"):
+            return
+
+        if buffer:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                # a record ending exactly at the buffer boundary may be incomplete (e.g. a number)
+                if end < len(buffer) or eof:
+                    yield record
+                    buffer = buffer[end:]
+                    continue
+
+        if eof:
+            return
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+
+def read_csv(f):
+    """
+    Streams records from a CSV file with a header row
+    """
+    for row in csv.DictReader(f):
+        yield {k: (v if v != "" else None) for k, v in row.items()}
+
+
+def read_records(path, fmt=None):
+    """
+    Streams the records of a catalog export, one at a time
+
+    Args:
+        path (str): Location of the export
+        fmt (str): "json" or "csv", detected from the file extension when omitted
+    """
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "json")
+
+    with open(path, "r", encoding="utf-8", newline="" if fmt == "csv" else None) as f:
+        reader = read_csv(f) if fmt == "csv" else read_json(f)
+
+        for record in reader:
+            yield record
+
+
+class CatalogIngest:
+    """
+    Applies a stream of course records to the catalog database.
+
+    Records are validated and normalized, compared against the current catalog, and only the differences
+    are written, using batched bulk_write upserts. The catalog version is bumped when anything changed so
+    that running bots refresh their cached catalog.
+    """
+
+    def __init__(self, db_conn, batch_size=500, dry_run=False):
+        """
+        Args:
+            db_conn: Reference to a valid Mongo database connection
+            batch_size (int): Number of write operations sent per bulk_write
+            dry_run (bool): Compute the differences without writing them
+        """
+        self.db_conn = db_conn
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.current = {}  # course_id -> (subject, course document)
+        self.seen = set()
+        self.batch = []
+        self.stats = {"records": 0, "invalid": 0, "unchanged": 0, "added": 0, "updated": 0, "removed": 0,
+                      "written": 0}
+
+    def load_current(self):
+        """
+        Loads the current catalog so incoming records can be compared against it
+        """
+        subjects = self.db_conn.find_documents({}, db=CATALOG_DB, collection=SUBJECTS_COLLECTION)
+
+        for subject in subjects:
+            for course in subject.get("courses", []):
+                self.current[course["id"]] = (subject["title"], course)
+
+    def normalize(self, record):
+        """
+        Validates a raw record and converts it to a course document
+
+        Returns:
+            (tuple) subject, course document; or None, None if the record is invalid
+        """
+        course_id = normalize_course_id(record.get("id") or record.get("course_id"))
+        subject = (record.get("subject") or "").strip()
+        title = (record.get("title") or "").strip()
+
+        if not (course_id and subject and title):
+            return None, None
+
+        course = {"id": course_id}
+        for field in COURSE_FIELDS:
+            value = record.get(field)
+            course[field] = value.strip() if isinstance(value, str) else value
+
+        return subject, course
+
+    def add(self, record):
+        """
+        Compares a single record against the current catalog and queues the required write
+        """
+        self.stats["records"] += 1
+        subject, course = self.normalize(record)
+
+        # duplicate course IDs within the same export are treated as invalid
+        if course is None or course["id"] in self.seen:
+            self.stats["invalid"] += 1
+            return
+
+        self.seen.add(course["id"])
+        existing = self.current.get(course["id"])
+
+        if existing is None:
+            self.stats["added"] += 1
+            self.queue(UpdateOne({"title": subject}, {"$push": {"courses": course}}, upsert=True))
+        elif existing[0] != subject:
+            # the course moved to another subject
+            self.stats["updated"] += 1
+            self.queue(UpdateOne({"title": existing[0]}, {"$pull": {"courses": {"id": course["id"]}}}))
+            self.queue(UpdateOne({"title": subject}, {"$push": {"courses": course}}, upsert=True))
+        elif any(existing[1].get(field) != course[field] for field in COURSE_FIELDS):
+            self.stats["updated"] += 1
+            self.queue(UpdateOne({"title": subject, "courses.id": course["id"]}, {"$set": {"courses.$": course}}))
+        else:
+            self.stats["unchanged"] += 1
+
+    def prune(self):
+        """
+        Queues the removal of every current course that did not appear in the ingested records
+        """
+        for course_id, (subject, _) in self.current.items():
+            if course_id not in self.seen:
+                self.stats["removed"] += 1
+                self.queue(UpdateOne({"title": subject}, {"$pull": {"courses": {"id": course_id}}}))
+
+    def queue(self, operation):
+        self.batch.append(operation)
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Sends the queued operations in a single bulk_write
+        """
+        if self.batch and not self.dry_run:
+            # ordered, so that a $pull/$push pair for a moved course is applied in sequence
+            self.db_conn.bulk_write(self.batch, ordered=True, db=CATALOG_DB, collection=SUBJECTS_COLLECTION)
+
+        self.stats["written"] += len(self.batch)
+        self.batch = []
+
+    def bump_version(self):
+        """
+        Increments the catalog version so running bots know to refresh
+
+        Returns:
+            (int) The new catalog version
+        """
+        result = self.db_conn.find_one_and_update(
+            {"_id": VERSION_ID},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            db=CATALOG_DB,
+            collection=META_COLLECTION
+        )
+
+        return result["version"]
+
+    def run(self, records, prune=False):
+        """
+        Ingests a stream of records
+
+        Args:
+            records: Iterable of raw course records
+            prune (bool): Remove courses that are not present in records
+
+        Returns:
+            (dict) Statistics describing the ingest
+        """
+        start = time.perf_counter()
+
+        self.load_current()
+
+        for record in records:
+            self.add(record)
+
+        if prune:
+            self.prune()
+
+        self.flush()
+
+        changes = self.stats["added"] + self.stats["updated"] + self.stats["removed"]
+        if changes and not self.dry_run:
+            self.stats["version"] = self.bump_version()
+
+        self.stats["seconds"] = time.perf_counter() - start
+        self.stats["records_per_second"] = self.stats["records"] / self.stats["seconds"] if self.stats["seconds"] else 0
+
+        log.info("Ingested %(records)d records (%(invalid)d invalid) in %(seconds).2fs (%(records_per_second).0f records/s): "
+                 "%(added)d added, %(updated)d updated, %(removed)d removed, %(unchanged)d unchanged, "
+                 "%(written)d writes", self.stats)
+
+        return self.stats
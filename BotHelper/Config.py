@@ -0,0 +1,22 @@
+import os
+import sys
+
+import yaml
+
+
+def load_config(config):
+    """
+    Process the YAML contents of a configuration file.
+    Exit's the program if an invalid file is passed.
+
+    Args:
+        config (str): Path of the configuration file to be processed
+
+    Returns:
+        Python object representing the YAML configuration
+    """
+    try:
+        with open(os.path.realpath(config), 'r') as f:
+            return yaml.load(f.read(), Loader=yaml.FullLoader)
+    except FileNotFoundError as e:
+        sys.exit("Could not find configuration file: {}".format(e.filename))
@@ -0,0 +1,197 @@
+import threading
+from contextlib import contextmanager
+
+from .Logger import get_logger
+
+try:
+    import psutil
+except ImportError:
+    # psutil is in requirements.txt; memory based recycling is only skipped on installs without it
+    psutil = None
+
+log = get_logger(__name__)
+
+
+class DriverPool:
+    """
+    Manages a small pool of WebDriver instances.
+
+    Drivers are started on demand, checked out exclusively by one thread at a time, health checked before
+    use, and recycled after a number of uses or once their browser uses too much memory.
+    """
+
+    def __init__(self, factory, size=1, max_uses=50, max_memory_mb=512):
+        """
+        Args:
+            factory (function): Creates and returns a new WebDriver
+            size (int): Maximum number of drivers running at once
+            max_uses (int): Number of checkouts before a driver is restarted
+            max_memory_mb (int): Resident memory of the driver and its browser processes before it is restarted
+        """
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.max_memory_mb = max_memory_mb
+        self.idle = []
+        self.uses = {}  # driver -> number of checkouts
+        self.starting = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.uses)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Checks out a driver for the duration of the with block, returning it to the pool afterwards.
+        A driver that raises an exception from the block is assumed broken and is shut down.
+
+        Args:
+            timeout (float): Seconds to wait for a driver when all are in use (default: wait forever)
+
+        Raises:
+            TimeoutError: No driver became available in time
+        """
+        driver = self.checkout(timeout)
+
+        try:
+            yield driver
+        except Exception:
+            self.discard(driver)
+            raise
+        else:
+            self.checkin(driver)
+
+    def checkout(self, timeout=None):
+        # browsers are health checked, started and shut down outside the lock, so a hung one only holds up
+        # the thread using it
+        while True:
+            with self.condition:
+                driver = self.reserve(timeout)
+
+            if driver is None:
+                break
+
+            if self.is_healthy(driver):
+                return driver
+
+            log.warning("Discarding unresponsive WebDriver")
+            self.discard(driver)
+
+        driver = None
+
+        try:
+            driver = self.factory()
+        finally:
+            with self.condition:
+                self.starting -= 1
+
+                if driver is not None:
+                    self.uses[driver] = 1
+
+                self.condition.notify()
+
+        return driver
+
+    def reserve(self, timeout):
+        """
+        Takes an idle driver, or reserves a slot to start a new one. Called while holding the lock.
+
+        Returns:
+            The idle driver, counted as checked out, or None if a new driver should be started
+
+        Raises:
+            TimeoutError: No driver became available in time
+        """
+        while True:
+            if self.closed:
+                raise RuntimeError("The driver pool has been shut down")
+
+            if self.idle:
+                driver = self.idle.pop()
+                self.uses[driver] += 1
+                return driver
+
+            if len(self.uses) + self.starting < self.size:
+                self.starting += 1
+                return None
+
+            if not self.condition.wait(timeout):
+                raise TimeoutError("Timed out waiting for a WebDriver")
+
+    def checkin(self, driver):
+        memory = self.memory_mb(driver)
+
+        with self.condition:
+            if self.closed:
+                reason = "the pool was shut down"
+            elif self.uses[driver] >= self.max_uses:
+                reason = "{} uses".format(self.uses[driver])
+            elif memory is not None and memory > self.max_memory_mb:
+                reason = "reaching {:.0f}MB of memory".format(memory)
+            else:
+                reason = None
+                self.idle.append(driver)
+
+            if reason:
+                self.uses.pop(driver, None)
+
+            self.condition.notify()
+
+        if reason:
+            log.info("Recycling WebDriver after %s", reason)
+            self._quit(driver)
+
+    def discard(self, driver):
+        with self.condition:
+            self.uses.pop(driver, None)
+            self.condition.notify()
+
+        self._quit(driver)
+
+    def shutdown(self):
+        """
+        Shuts down all idle drivers. Drivers in use are shut down when they are returned.
+        """
+        with self.condition:
+            self.closed = True
+            drivers, self.idle = self.idle, []
+
+            for driver in drivers:
+                self.uses.pop(driver, None)
+
+            self.condition.notify_all()
+
+        for driver in drivers:
+            self._quit(driver)
+
+    def is_healthy(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def memory_mb(self, driver):
+        """
+        Returns: Resident memory of the driver service and its browser processes in MB, or None if unknown
+        """
+        pid = getattr(getattr(getattr(driver, "service", None), "process", None), "pid", None)
+
+        if psutil is None or pid is None:
+            return None
+
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+
+            return sum(p.memory_info().rss for p in processes) / (1024 * 1024)
+        except psutil.Error:
+            return None
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as err:
+            log.warning("Error while closing WebDriver: %s", err)
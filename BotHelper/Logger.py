@@ -0,0 +1,221 @@
+import json
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT = "snhubot"
+
+# attributes every LogRecord has, anything else was passed with extra= and is written as a field
+RESERVED = set(vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+# extra= for records logged on hot paths, sampled at the rate given to setup_logging
+SAMPLED = {"sample": True}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+
+    Every line has the UTC timestamp, level, logger name and message; values passed with extra= are added as
+    fields, and exceptions are included with their traceback.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+
+        for key, value in vars(record).items():
+            if key not in RESERVED and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps one in every N records of high volume messages.
+
+    A record is sampled when it is logged with extra={"sample": N}, or at the configured rate with
+    extra=SAMPLED; records are counted per logger and message template, so different messages don't share a
+    count. Other records always pass.
+    """
+
+    def __init__(self, rate=1):
+        """
+        Args:
+            rate (int): Keep one in every rate records logged with extra=SAMPLED
+        """
+        super().__init__()
+        self.rate = rate
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        rate = getattr(record, "sample", 1)
+
+        if rate is True:
+            rate = self.rate
+
+        if rate <= 1:
+            return True
+
+        key = (record.name, record.msg)
+
+        with self.lock:
+            count = self.counts.get(key, 0)
+            self.counts[key] = count + 1
+
+        if count % rate:
+            return False
+
+        record.sampled = rate
+        return True
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Hands records to a background thread for formatting and writing.
+
+    The message is not formatted in the calling thread; only its arguments are kept, so they must not be
+    changed after logging them. When the queue is full the record is dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StdoutHandler(logging.StreamHandler):
+    """
+    Writes to whatever sys.stdout is when the record is emitted, so redirecting stdout also redirects the log.
+    """
+
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class LogManager:
+    """
+    Configures the "snhubot" logger hierarchy.
+
+    By default records are written synchronously to stdout, so scripts and tests see them straight away.
+    start() switches to an asynchronous handler; stop() flushes what is queued and goes back to writing
+    synchronously.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(ROOT)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.sampler = SamplingFilter()
+        self.handler = None
+        self.listener = None
+        self.lock = threading.Lock()
+
+        self.set_handler(self.stream_handler())
+
+    def stream_handler(self, stream=None):
+        handler = logging.StreamHandler(stream) if stream else StdoutHandler()
+        handler.setFormatter(JsonFormatter())
+
+        return handler
+
+    def set_handler(self, handler):
+        if self.handler is not None:
+            self.logger.removeHandler(self.handler)
+
+        handler.addFilter(self.sampler)
+        self.logger.addHandler(handler)
+        self.handler = handler
+
+    def start(self, level="INFO", stream=None, queue_size=10000, sample_rate=1):
+        """
+        Logs asynchronously from now on
+
+        Args:
+            level (str): Lowest level written, records below it are discarded before any formatting
+            stream: File object records are written to (default: stdout)
+            queue_size (int): Records waiting to be written before new ones are dropped
+            sample_rate (int): Keep one in every sample_rate records of high volume messages (see SAMPLED)
+        """
+        with self.lock:
+            self.stop_listener()
+            self.logger.setLevel(level.upper() if isinstance(level, str) else level)
+            self.sampler.rate = sample_rate
+
+            log_queue = queue.Queue(queue_size)
+            self.listener = QueueListener(log_queue, self.stream_handler(stream))
+            self.set_handler(QueueLogHandler(log_queue))
+            self.listener.start()
+
+    def stop(self):
+        """
+        Writes every queued record and goes back to logging synchronously
+        """
+        with self.lock:
+            self.stop_listener()
+            self.set_handler(self.stream_handler())
+
+    def stop_listener(self):
+        """
+        Stops the logging thread once it has written every queued record, then reports records that were dropped
+        """
+        if self.listener is None:
+            return
+
+        self.listener.stop()
+
+        if self.handler.dropped:
+            record = self.logger.makeRecord(self.logger.name, logging.WARNING, __file__, 0,
+                                            "Dropped %d log record(s), the log queue was full",
+                                            (self.handler.dropped,), None)
+            for handler in self.listener.handlers:
+                handler.handle(record)
+
+        self.listener = None
+
+
+log_manager = LogManager()
+
+
+def get_logger(name):
+    """
+    Returns the logger for a module, below the "snhubot" logger
+
+    Args:
+        name (str): Usually the module's __name__
+    """
+    return logging.getLogger("{}.{}".format(ROOT, name))
+
+
+def setup_logging(level="INFO", stream=None, queue_size=10000, sample_rate=1):
+    """
+    Starts asynchronous logging (see LogManager.start)
+    """
+    log_manager.start(level, stream, queue_size, sample_rate)
+
+
+def shutdown_logging():
+    """
+    Flushes queued records and stops the logging thread
+    """
+    log_manager.stop()
@@ -0,0 +1,212 @@
+import bisect
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = "snhubot_"
+INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, as a Prometheus histogram.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """
+        Returns: (list) (upper bound, observations less than or equal to it) for each bucket, ending with +Inf
+        """
+        total = 0
+        result = []
+
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+
+        return result
+
+
+class Metrics:
+    """
+    Collects simple in-process counters and timings for the bot.
+
+    Counters and timings can be given labels (e.g. command="roll", outcome="ok"), which are kept as separate
+    series. Every timing is also counted in a latency histogram. Recording is a dictionary update under a lock;
+    everything else happens in render_prometheus, only when the metrics are scraped.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            buckets (tuple): Upper bounds of the histogram buckets, in seconds
+        """
+        self.buckets = buckets
+        self.counters = {}  # name -> total over all labels
+        self.timings = {}  # name -> summary over all labels
+        self.labeled_counters = {}  # (name, labels) -> count
+        self.histograms = {}  # (name, labels) -> Histogram
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1, **labels):
+        """
+        Increments a named counter
+
+        Args:
+            name (str): Name of the counter
+            value (int): Amount to add to the counter
+            **labels: Labels of the counter's series
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+            key = series_key(name, labels)
+            self.labeled_counters[key] = self.labeled_counters.get(key, 0) + value
+
+    def record(self, name, seconds, **labels):
+        """
+        Records a single timing observation
+
+        Args:
+            name (str): Name of the timing
+            seconds (float): Duration of the observed event, in seconds
+            **labels: Labels of the timing's series
+        """
+        key = series_key(name, labels)
+
+        with self._lock:
+            timing = self.timings.get(name)
+
+            if timing is None:
+                timing = self.timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0}
+
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['max'] = max(timing['max'], seconds)
+
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Context manager recording the duration of the wrapped block
+
+        Args:
+            name (str): Name of the timing
+            **labels: Labels of the timing's series
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, **labels)
+
+    def get_timing(self, name):
+        """
+        Returns: A copy of the timing data for name, or None if nothing has been recorded
+        """
+        with self._lock:
+            timing = self.timings.get(name)
+
+            if timing is None:
+                return None
+
+            timing = dict(timing)
+            timing['mean'] = timing['total'] / timing['count']
+
+            return timing
+
+    def get_histogram(self, name, **labels):
+        """
+        Returns: (list) The cumulative bucket counts of a timing series (see Histogram.cumulative), or None
+        """
+        with self._lock:
+            histogram = self.histograms.get(series_key(name, labels))
+
+            return histogram.cumulative() if histogram else None
+
+    def render_prometheus(self):
+        """
+        Renders every counter and histogram in the Prometheus text exposition format. Metric names are
+        prefixed with "snhubot_" and dots become underscores, e.g. "command.duration" is exported as
+        snhubot_command_duration_seconds.
+
+        Returns:
+            (str) The exposition text
+        """
+        with self._lock:
+            counters = sorted(self.labeled_counters.items())
+            histograms = sorted((key, histogram.cumulative(), histogram.sum, histogram.count)
+                                for key, histogram in self.histograms.items())
+
+        lines = []
+        declared = set()
+
+        for (name, labels), value in counters:
+            metric = metric_name(name, "_total")
+
+            if metric not in declared:
+                declared.add(metric)
+                lines.append("# TYPE {} counter".format(metric))
+
+            lines.append("{}{} {}".format(metric, format_labels(labels), value))
+
+        for (name, labels), buckets, total, count in histograms:
+            metric = metric_name(name, "_seconds")
+
+            if metric not in declared:
+                declared.add(metric)
+                lines.append("# TYPE {} histogram".format(metric))
+
+            for bound, bucket_count in buckets:
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("{}_bucket{} {}".format(metric, format_labels(labels + (("le", le),)), bucket_count))
+
+            lines.append("{}_sum{} {}".format(metric, format_labels(labels), repr(total)))
+            lines.append("{}_count{} {}".format(metric, format_labels(labels), count))
+
+        return "\n".join(lines) + "\n"
+
+
+def series_key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def metric_name(name, suffix):
+    return PREFIX + INVALID_NAME_CHARS.sub("_", name) + suffix
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join('{}="{}"'.format(INVALID_NAME_CHARS.sub("_", key), escape_label(value))
+                          for key, value in labels) + "}"
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Shared registry used throughout the bot
+metrics = Metrics()
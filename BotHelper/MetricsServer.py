@@ -0,0 +1,67 @@
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .Logger import get_logger
+from .Metrics import metrics as default_metrics
+
+log = get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render_prometheus().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("Metrics scraped by %s: " + format, self.client_address[0], *args)
+
+
+class MetricsServer:
+    """
+    Serves the bot's metrics at /metrics in the Prometheus text format, from a background thread.
+
+    Metrics are only rendered when they are scraped, so the server costs nothing between scrapes.
+    """
+
+    def __init__(self, port=9100, host="127.0.0.1", metrics=None):
+        """
+        Args:
+            port (int): Port to listen on (0 for any free port)
+            host (str): Address to listen on, only the local machine by default
+            metrics (Metrics): Registry to serve (default: the shared registry)
+        """
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.metrics = metrics or default_metrics
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.5})
+        self.thread.daemon = True
+        self.thread.start()
+
+        log.info("Serving metrics at http://%s:%d/metrics", self.server.server_address[0], self.port)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,17 +1,26 @@
+import copy
+
 from .MongoConnection import MongoConnection
 
 
 def context_aware(func):
     def wrapper(*args, **kwargs):
-        if "db" in kwargs:
-            if args[0].db != kwargs["db"]:
-                args[0].use_db(kwargs["db"])
+        conn = args[0]
+        db = kwargs.pop("db", None)
+        collection = kwargs.pop("collection", None)
+
+        if db is not None or collection is not None:
+            # The connection is shared between threads, so the db/collection of this call is chosen on a
+            # shallow copy instead of switching the shared one. pymongo clients are thread-safe themselves.
+            conn = copy.copy(conn)
+
+            if db is not None:
+                conn.use_db(db)
 
-        if "collection" in kwargs:
-            if args[0].db != kwargs["collection"]:
-                args[0].use_collection(kwargs["collection"])
+            if collection is not None:
+                conn.use_collection(collection)
 
-        return func(*args)
+        return func(conn, *args[1:], **kwargs)
 
     return wrapper
 
@@ -45,3 +54,13 @@ class MongoConn(MongoConnection):
     def find_documents(self, query):
 
         return super().find_documents(query)
+
+    @context_aware
+    def find_one_and_update(self, query, update, upsert=False):
+
+        return super().find_one_and_update(query, update, upsert=upsert)
+
+    @context_aware
+    def bulk_write(self, requests, ordered=True):
+
+        return super().bulk_write(requests, ordered=ordered)
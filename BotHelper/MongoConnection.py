@@ -1,7 +1,11 @@
 from bson import json_util
 from bson import SON
 from bson.objectid import ObjectId
-from pymongo import MongoClient, errors
+from pymongo import MongoClient, ReturnDocument, errors
+
+from .Logger import get_logger
+
+log = get_logger(__name__)
 
 
 class MongoConnection:
@@ -21,7 +25,7 @@ class MongoConnection:
             self.client.server_info()
             self.connected = True
         except errors.ServerSelectionTimeoutError as err:
-            print(err)
+            log.error("Unable to connect to MongoDB: %s", err)
             self.connected = False
 
     def connect_to_host(self, hostname, port):
@@ -83,6 +87,15 @@ class MongoConnection:
         """ Update many document """
         return self.collection.update_many(query, update)
 
+    def find_one_and_update(self, query, update, upsert=False):
+        """ Update single document, returning the updated document """
+        return self.collection.find_one_and_update(
+            query, update, upsert=upsert, return_document=ReturnDocument.AFTER)
+
+    def bulk_write(self, requests, ordered=True):
+        """ Execute many write operations in a single round trip """
+        return self.collection.bulk_write(requests, ordered=ordered)
+
     def delete_document(self, query):
         """ Delete single document """
         return self.collection.delete_one(query)
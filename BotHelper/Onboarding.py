@@ -0,0 +1,173 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .Logger import SAMPLED, get_logger
+from .Metrics import metrics
+from .SlackConn import get_retry_after
+
+log = get_logger(__name__)
+
+
+class Onboarding:
+    """
+    Greets users joining the workspace, in batches.
+
+    Joins arriving within window seconds of each other are greeted together: the greeting template is rendered
+    once per batch, and the IM channels are opened in parallel while keeping under Slack's rate limit for
+    im.open. The time from joining to being greeted is recorded per user as the "onboarding.latency" timing.
+    """
+
+    def __init__(self, slack_client, render, window=2.0, workers=4, rate=1.0, retry_after=5):
+        """
+        Args:
+            slack_client: Reference to a valid Slack connection
+            render (function): Returns the greeting text, with "{user}" where the user's ID goes
+            window (float): Seconds to wait for more joins before greeting a batch
+            workers (int): Number of users greeted at the same time
+            rate (float): Maximum im.open calls per second
+            retry_after (float): Seconds to wait before retrying a rate limited call, if Slack doesn't say
+        """
+        self.slack_client = slack_client
+        self.render = render
+        self.window = window
+        self.interval = 1.0 / rate
+        self.retry_after = retry_after
+        self.pending = []  # (user id, time joined)
+        self.timer = None
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.submit_lock = threading.Lock()  # held while a batch is handed to the executor
+        self.closed = False  # set by shutdown(), after which batches are greeted on the timer thread
+        self.rate_lock = threading.Lock()
+        self.next_call = 0
+
+    def add(self, user, joined=None):
+        """
+        Queues a user that joined the workspace, greeting them with the next batch
+
+        Args:
+            user (str): Slack user ID
+            joined (float): Timestamp the user joined (default: now)
+        """
+        with self.lock:
+            self.pending.append((user, joined or time.time()))
+
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """
+        Greets every queued user
+        """
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.timer = None
+
+        if not batch:
+            return
+
+        start = time.time()
+
+        try:
+            template = self.render()
+        except Exception as err:
+            log.error("Unable to render the greeting for %d user(s): %s", len(batch), err)
+            return
+
+        with self.submit_lock:
+            closed = self.closed
+
+            if not closed:
+                futures = [self.executor.submit(self.greet, template, *item) for item in batch]
+
+        if closed:
+            # shut down after this batch was taken, so it wasn't handed to the replacement either
+            greeted = sum(self.greet(template, *item) for item in batch)
+        else:
+            greeted = sum(future.result() for future in futures)
+
+        log.info("Onboarded %d of %d user(s) in %.2fs", greeted, len(batch), time.time() - start)
+
+    def shutdown(self):
+        """
+        Stops batching and lets the greetings already started finish in the background
+
+        Returns:
+            (list) (user id, time joined) of the users queued but not greeted yet, to hand to a replacement
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            batch, self.pending = self.pending, []
+
+        with self.submit_lock:
+            self.closed = True
+            self.executor.shutdown(wait=False)
+
+        return batch
+
+    def greet(self, template, user, joined):
+        """
+        Opens an IM channel with the user and posts the greeting
+
+        Returns:
+            (bool) True if the user was greeted
+        """
+        try:
+            return self.send_greeting(template, user, joined)
+        except Exception as err:
+            log.exception("Unable to greet %s: %s", user, err)
+            metrics.increment("onboarding.failure")
+            return False
+
+    def send_greeting(self, template, user, joined):
+        im_channel = self.call("im.open", rate_limited=True, user=user)
+
+        if not im_channel.get("ok"):
+            log.warning("Unable to open an IM with %s: %s", user, im_channel.get("error"))
+            metrics.increment("onboarding.failure")
+            return False
+
+        result = self.call("chat.postMessage", channel=im_channel["channel"]["id"],
+                           text=template.replace("{user}", user), unfurl_links=True)
+
+        if not result.get("ok"):
+            log.warning("Unable to greet %s: %s", user, result.get("error"))
+            metrics.increment("onboarding.failure")
+            return False
+
+        latency = time.time() - joined
+        metrics.record("onboarding.latency", latency)
+        log.info("Greeted %s %.2fs after joining", user, latency, extra=SAMPLED)
+
+        return True
+
+    def call(self, method, rate_limited=False, **kwargs):
+        """
+        Calls the Slack API, optionally spacing calls to stay under the rate limit, and retrying once when
+        Slack reports that the limit was hit anyway
+        """
+        for attempt in range(2):
+            if rate_limited:
+                self.wait_for_slot()
+
+            result = self.slack_client.api_call(method, **kwargs)
+
+            if result.get("error") != "ratelimited" or attempt:
+                return result
+
+            time.sleep(get_retry_after(result, self.retry_after))
+
+    def wait_for_slot(self):
+        with self.rate_lock:
+            now = time.time()
+            slot = max(now, self.next_call)
+            self.next_call = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
@@ -1,8 +1,12 @@
-import datetime
+from .Logger import get_logger
+
+log = get_logger("output")
 
 
 def output(message):
     """
-    Print message with UTC timestamp
+    Log message at the INFO level
+
+    Kept for scripts and commands written before per-module loggers; new code should use get_logger.
     """
-    print(f"UTC: {datetime.datetime.utcnow().timestamp()} - {message}")
+    log.info("%s", message)
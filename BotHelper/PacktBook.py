@@ -0,0 +1,143 @@
+import threading
+import time
+
+from .Logger import get_logger
+
+log = get_logger(__name__)
+
+
+class PacktPageError(Exception):
+    """
+    Raised when the Packt page loaded, but doesn't show a free book. The message is suitable for users.
+    """
+
+
+class PacktBook:
+    """
+    Implements the data scraped for the Packt free book of the day.
+    """
+
+    def __init__(self, title, image, expires, fetched=None):
+        """
+        Args:
+            title (str): Title of the book
+            image (str): URL of the cover image
+            expires (float): Timestamp when the offer ends
+            fetched (float): Timestamp when the page was scraped (default: now)
+        """
+        self.title = title
+        self.image = image
+        self.expires = expires
+        self.fetched = fetched or time.time()
+
+    @classmethod
+    def from_countdown(cls, title, image, countdown):
+        """
+        Creates a book from the page's countdown timer string, HH:MM:SS
+        """
+        hours, minutes, seconds = [int(x) for x in countdown.split(":")]
+        now = time.time()
+
+        return cls(title, image, now + hours * 3600 + minutes * 60 + seconds, now)
+
+    def __repr__(self):
+        return f"{{'title': {repr(self.title)}, 'image': {repr(self.image)}, 'expires': {repr(self.expires)}}}"
+
+    def time_left(self):
+        """
+        Returns: (int) Seconds left before the offer ends
+        """
+        return max(0, int(self.expires - time.time()))
+
+    def is_expired(self):
+        return self.time_left() <= 0
+
+
+class BookCache:
+    """
+    Caches the Packt free book of the day and refreshes it in the background.
+
+    The book is refreshed every refresh_interval seconds, and just after the current offer expires, so that
+    requests for the book can be answered from memory.
+    """
+
+    def __init__(self, fetch, refresh_interval=3 * 3600, retry_interval=300, expiry_margin=60):
+        """
+        Args:
+            fetch (function): Returns a freshly scraped PacktBook, raising an exception on failure
+            refresh_interval (int): Seconds between background refreshes
+            retry_interval (int): Seconds to wait before retrying a failed background refresh
+            expiry_margin (int): Seconds after an offer expires before the new book is fetched
+        """
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.expiry_margin = expiry_margin
+        self.book = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def get(self):
+        """
+        Returns the cached book, fetching it first if there is no current book.
+        Exceptions raised by fetch are passed on to the caller.
+        """
+        book = self.book
+
+        if book is None or book.is_expired():
+            book = self.refresh(book)
+
+        return book
+
+    def refresh(self, stale=None):
+        """
+        Fetches the book and stores it in the cache. Only one fetch runs at a time; callers that waited for
+        another fetch to finish use its result instead of fetching again.
+
+        Args:
+            stale (PacktBook): The cached book the caller considered out of date
+        """
+        with self.lock:
+            if self.book is not stale and self.book is not None and not self.book.is_expired():
+                return self.book
+
+            self.book = self.fetch()
+            log.info("Packt book cached: %s (%ss left)", self.book.title, self.book.time_left())
+
+            return self.book
+
+    def next_refresh(self):
+        """
+        Returns: (float) Seconds until the next background refresh
+        """
+        book = self.book
+
+        if book is None:
+            return self.retry_interval
+
+        return max(self.expiry_margin, min(self.refresh_interval, book.time_left() + self.expiry_margin))
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.refresh(self.book)
+                delay = self.next_refresh()
+            except Exception as err:
+                log.warning("Unable to refresh the Packt book: %s", err)
+                delay = self.retry_interval
+
+            self.stopped.wait(delay)
+
+    def start(self):
+        """
+        Starts the background refresh thread, if it isn't running already
+        """
+        if not (self.thread and self.thread.is_alive()):
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
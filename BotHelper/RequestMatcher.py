@@ -0,0 +1,87 @@
+import threading
+
+from .AhoCorasick import AhoCorasick
+
+
+class RequestMatcher:
+    """
+    Matches book titles against every user's requested words and phrases.
+
+    Requests are kept in memory with a compiled Aho-Corasick automaton, so tagging subscribers takes a single
+    pass over the title no matter how many requests exist. Words only match on word boundaries, so "java"
+    doesn't match "javascript", while phrases like "machine learning" match as a whole.
+    """
+
+    def __init__(self):
+        self.requests = {}  # word -> set of users
+        self.automaton = AhoCorasick()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.requests)
+
+    def load(self, documents):
+        """
+        Replaces all requests with the given book_requests documents
+
+        Args:
+            documents (list): Documents with a "word" and a list of "users"
+        """
+        requests = {doc["word"]: set(doc["users"]) for doc in documents if doc.get("users")}
+
+        with self.lock:
+            self.requests = requests
+            self.automaton = AhoCorasick(requests)
+
+    def add(self, word, user):
+        with self.lock:
+            if word not in self.requests:
+                self.requests[word] = set()
+                self.automaton.add(word)
+
+            self.requests[word].add(user)
+
+    def remove(self, word, user):
+        with self.lock:
+            users = self.requests.get(word)
+
+            if users is not None:
+                users.discard(user)
+
+                if not users:
+                    del self.requests[word]
+                    self.automaton.remove(word)
+
+    def clear(self, user):
+        with self.lock:
+            for word in [w for w, users in self.requests.items() if user in users]:
+                self.requests[word].discard(user)
+
+                if not self.requests[word]:
+                    del self.requests[word]
+                    self.automaton.remove(word)
+
+    @staticmethod
+    def is_boundary(text, start, end):
+        """
+        Checks that text[start:end] isn't part of a larger word, mirroring the regex \\b for patterns
+        that start or end with punctuation (c++, .net)
+        """
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+
+        return not (text[start].isalnum() and before.isalnum()) and not (text[end - 1].isalnum() and after.isalnum())
+
+    def match(self, title):
+        """
+        Returns: (set) Users that requested a word or phrase found in title
+        """
+        text = title.lower()
+        users = set()
+
+        with self.lock:
+            for start, word in self.automaton.find(text):
+                if self.is_boundary(text, start, start + len(word)):
+                    users.update(self.requests[word])
+
+        return users
@@ -0,0 +1,141 @@
+import re
+
+
+class RequisiteGraph:
+    """
+    Implements a directed graph of course requisites with precomputed transitive closures.
+
+    The graph is built once for each version of the catalog, so that queries are simple lookups instead of
+    graph walks. Every course ID mentioned in a requisites string is treated as a prerequisite, regardless
+    of any "and"/"or" wording around it.
+    """
+
+    # CS499, CS 499, CS-499, ACC-499, etc.
+    COURSE_REGEX = re.compile(r"\b([a-zA-Z]{2,4})[- ]?([0-9]{3})\b")
+
+    def __init__(self):
+        self.requires = {}  # course -> direct prerequisites
+        self.unlocks = {}  # course -> courses it is a direct prerequisite of
+        self.ancestors = {}  # course -> all prerequisites, in the order they can be taken
+        self.descendants = {}  # course -> all courses it eventually unlocks
+        self.levels = {}  # course -> topological level, 0 having no prerequisites
+
+    @classmethod
+    def parse(cls, requisites):
+        """
+        Extracts the normalized course IDs from a requisites string
+
+        Args:
+            requisites (str): Requisites text, as found in the catalog
+
+        Returns:
+            (list) Unique course IDs in the order they are mentioned
+        """
+        if not requisites:
+            return []
+
+        ids = ["{}{}".format(subject.upper(), number) for subject, number in cls.COURSE_REGEX.findall(requisites)]
+
+        return list(dict.fromkeys(ids))
+
+    def build(self, courses):
+        """
+        Builds the graph and all precomputed lookups from the given courses
+
+        Args:
+            courses (dict): Mapping of course ID to Course
+        """
+        requires = {}
+        unlocks = {course_id: [] for course_id in courses}
+
+        for course_id, course in courses.items():
+            # only link courses that exist in the catalog, and never a course to itself
+            requires[course_id] = tuple(r for r in self.parse(course.requisites) if r in courses and r != course_id)
+
+            for req in requires[course_id]:
+                unlocks[req].append(course_id)
+
+        levels = self._compute_levels(requires, unlocks)
+
+        def order(course_id):
+            # courses stuck in a requisite cycle have no level and are listed last
+            return (levels.get(course_id, len(levels)), course_id)
+
+        self.requires = requires
+        self.unlocks = {k: tuple(sorted(v)) for k, v in unlocks.items()}
+        self.levels = levels
+        self.ancestors = {k: tuple(sorted(self._closure(k, requires), key=order)) for k in courses}
+        self.descendants = {k: tuple(sorted(self._closure(k, self.unlocks), key=order)) for k in courses}
+
+    @staticmethod
+    def _compute_levels(requires, unlocks):
+        """
+        Assigns each course the length of its longest prerequisite chain (Kahn's algorithm).
+        Courses that are part of a cycle are left out.
+        """
+        remaining = {k: len(v) for k, v in requires.items()}
+        current = [k for k, v in remaining.items() if v == 0]
+        levels = {}
+        level = 0
+
+        while current:
+            following = []
+
+            for course_id in current:
+                levels[course_id] = level
+
+                for dependent in unlocks[course_id]:
+                    remaining[dependent] -= 1
+
+                    if remaining[dependent] == 0:
+                        following.append(dependent)
+
+            current = following
+            level += 1
+
+        return levels
+
+    @staticmethod
+    def _closure(start, edges):
+        """
+        Returns every course reachable from start through edges, excluding start itself
+        """
+        seen = set()
+        stack = list(edges.get(start, ()))
+
+        while stack:
+            course_id = stack.pop()
+
+            if course_id not in seen:
+                seen.add(course_id)
+                stack.extend(edges.get(course_id, ()))
+
+        seen.discard(start)
+
+        return seen
+
+    def get_prerequisites(self, course, transitive=False):
+        """
+        Returns the prerequisites of a course, or None if the course is unknown
+
+        Args:
+            course (str): Course ID
+            transitive (bool): Include prerequisites of prerequisites, ordered by level
+        """
+        return (self.ancestors if transitive else self.requires).get(course)
+
+    def get_unlocks(self, course, transitive=False):
+        """
+        Returns the courses that a course is a prerequisite for, or None if the course is unknown
+
+        Args:
+            course (str): Course ID
+            transitive (bool): Include courses that are unlocked further down the line, ordered by level
+        """
+        return (self.descendants if transitive else self.unlocks).get(course)
+
+    def get_level(self, course):
+        """
+        Returns the topological level of a course, or None if unknown or part of a requisite cycle
+        """
+        return self.levels.get(course)
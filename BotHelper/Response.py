@@ -1,6 +1,61 @@
+# Slack truncates messages longer than 40,000 characters, and recommends keeping them under 4,000
+MAX_MESSAGE_LENGTH = 4000
+
+
 class Response:
 
     def __init__(self, channel, message=None, attachment=None):
+        """
+        Args:
+            channel (str): Slack channel ID, or a list of IDs, to send the response to
+            message (str): Text of the response, or a list of texts to be posted as separate messages in order
+            attachment (str): JSON attachments of the response, sent instead of the message
+        """
         self.channel = channel
         self.message = message
         self.attachment = attachment
+
+    def get_messages(self):
+        """
+        Returns: (list) The texts to post, in order
+        """
+        if isinstance(self.message, (list, tuple)):
+            return list(self.message)
+
+        return [self.message]
+
+
+def split_message(lines, limit=MAX_MESSAGE_LENGTH):
+    """
+    Joins lines of text into as few messages as possible without exceeding limit characters each.
+    Lines are consumed one at a time, so a large output is never built up as a single string.
+
+    Args:
+        lines: Iterable of lines, without their line breaks
+        limit (int): Maximum number of characters per message
+
+    Returns:
+        (generator) The messages, in order
+    """
+    chunk = []
+    size = 0
+
+    for line in lines:
+        # a line that doesn't fit in a message of its own is cut
+        while len(line) > limit:
+            if chunk:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+
+            yield line[:limit]
+            line = line[limit:]
+
+        if chunk and size + 1 + len(line) > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+
+        size += len(line) + (1 if chunk else 0)
+        chunk.append(line)
+
+    if chunk:
+        yield "\n".join(chunk)
@@ -1,25 +1,67 @@
-import sched
+import heapq
+import itertools
+import json
+import os
 import threading
 import time
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import pytz
+import yaml
 from croniter import croniter
 
-from .Output import output
+from .Logger import get_logger
+
+log = get_logger(__name__)
+
+CATCH_UP_POLICIES = ("skip", "once", "all")
+MAX_CATCH_UP = 50  # most missed runs fired by the "all" policy
 
 
 class Scheduler:
 
-    def __init__(self, config=None, timezone='US/Eastern'):
+    def __init__(self, config=None, timezone='US/Eastern', workers=4, state_path=None, catch_up="skip"):
         """
-        Maintains the scheduled tasks for the bot
+        Maintains the scheduled tasks for the bot.
+
+        Tasks are kept in a min-heap ordered by fire time and fired by a single timer thread, which hands each
+        one to a small pool of worker threads so that a slow command doesn't delay the next task.
+
+        The last fire time of every command is recorded before it runs, and saved to state_path when given, so
+        a run is never delivered twice, even across restarts. Runs missed while the bot was down or reconnecting
+        are handled according to catch_up: "skip" them, fire the latest one "once", or fire "all" of them.
+
         Args:
             config (dict): Configuration containing tasks to schedule
+            timezone (str): Timezone the cron schedules are evaluated in
+            workers (int): Number of threads executing fired tasks
+            state_path (str): File the last fire times are persisted to (default: kept in memory only)
+            catch_up (str): Policy for missed runs, one of CATCH_UP_POLICIES
         """
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError("Unknown catch up policy: {}".format(catch_up))
+
         self.CONFIG = config
-        self.schedule = {}
+        self.schedule = {}  # (command, channel, time) -> task
         self.tz = pytz.timezone(timezone)
+        self.tasks = {}  # command -> keys of its scheduled tasks
+        self.queue = []  # heap of (time, sequence, key)
+        self.ids = itertools.count(1)
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.thread = None
+        self.stopped = False
+        self.entries = {}  # command -> compiled cron schedule and next fire time
+        self.compiled = None  # (config, bot_commands) the entries were compiled from
+        self.next_due = None
+        self.state_path = state_path
+        self.catch_up = catch_up
+        self.last_fired = self.load_state()  # command -> time of the last run fired
+        self.config_path = None  # watched configuration file, see watch_config()
+        self.config_interval = 5
+        self.config_checked = 0
+        self.config_signature = None
 
     def get_num_of_tasks(self):
         """
@@ -27,58 +69,202 @@ class Scheduler:
         """
         return len(self.schedule)
 
-    def has_task(self, task, sched_time=None):
+    def has_task(self, task, sched_time=None, channel=None):
         """
-        Returns true or false if the a task is currently scheduled
+        Returns true or false if the a task is currently scheduled. The command name must match exactly.
+        Args:
+            task (str): Name of the command
+            sched_time (float): Only match the task scheduled at this time
+            channel (str): Only match the task scheduled in this channel
         """
-        if sched_time:
-            return any([task in v['arguments'] and sched_time == v['time']
-                        for v in self.schedule.values()])
+        if sched_time is not None and channel is not None:
+            return (task, channel, sched_time) in self.schedule
 
-        return any([task in v['arguments'] for v in self.schedule.values()])
+        with self.condition:
+            return any((sched_time is None or k[2] == sched_time) and (channel is None or k[1] == channel)
+                       for k in self.tasks.get(task, ()))
 
-    def cleanup_sched(self):
+    def add_task(self, key, function, arguments):
         """
-        Removes expired events from the schedule when their threads become inactive
+        Add a scheduled task to the scheduler dictionary and the timer queue
+        Args:
+            key (tuple): (command, channel, time) identifying the task
+            function (function): Reference to function used to process the command (usually Bot.handle_scheduled_cmd)
+            arguments (tuple): Arguments passed to the function
+
+        Returns:
+            (bool) False if the task was already scheduled
         """
+        with self.condition:
+            if key in self.schedule:
+                return False
 
-        schedule = list(self.schedule.items())
+            self.schedule[key] = {
+                'time': key[2],
+                'function': function,
+                'arguments': arguments,
+                'future': None
+            }
+            self.tasks.setdefault(key[0], set()).add(key)
 
-        for k, v in schedule:
-            if datetime.now().timestamp() >= v['time']:
+            heapq.heappush(self.queue, (key[2], next(self.ids), key))
 
-                if not v['thread'].is_alive():
-                    self.schedule.pop(k, None)
+            # wake the timer thread in case this task is due before the one it is waiting for
+            self.condition.notify()
 
-                    output("Scheduled Tasks: {}".format(
-                        self.get_num_of_tasks()))
+        log.debug("Scheduled Tasks: %d", self.get_num_of_tasks())
 
-    def add_task(self, id, thread, time, function, arguments):
+        return True
+
+    def remove_task(self, key):
+        """
+        Removes a task from the schedule. Tasks are removed as soon as they finish executing; removing a task
+        that hasn't fired yet cancels it.
         """
-        Add a scheduled task to the scheduler dictionary
+        with self.condition:
+            if self.schedule.pop(key, None) is None:
+                return
+
+            keys = self.tasks[key[0]]
+            keys.discard(key)
+
+            if not keys:
+                del self.tasks[key[0]]
+
+        log.debug("Scheduled Tasks: %d", self.get_num_of_tasks())
+
+    def run(self):
+        """
+        Timer loop: sleeps until the earliest task is due, then dispatches every due task to the executor
+        """
+        with self.condition:
+            while not self.stopped:
+                if not self.queue:
+                    self.condition.wait()
+                    continue
+
+                delay = self.queue[0][0] - time.time()
+
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                _, _, key = heapq.heappop(self.queue)
+                task = self.schedule.get(key)
+
+                # cancelled tasks are simply skipped
+                if task is None or task['future'] is not None:
+                    continue
+
+                if self.last_fired.get(key[0], 0) >= key[2]:
+                    # this run was already delivered, e.g. before a restart
+                    log.info("Skipping '%s' at %s, it already ran", key[0], key[2])
+                    self.remove_task(key)
+                    continue
+
+                # recorded before running, so that a crash can't cause a second delivery
+                self.last_fired[key[0]] = key[2]
+                self.save_state()
+
+                task['future'] = self.executor.submit(self.execute, task['function'], task['arguments'])
+                task['future'].add_done_callback(lambda future, key=key: self.remove_task(key))
+
+    def execute(self, function, arguments):
+        try:
+            function(*arguments)
+        except Exception as err:
+            log.error("Scheduled task %s failed: %s", arguments[0], err)
+
+    def load_state(self):
+        """
+        Returns: (dict) The last fire time of every command, read from state_path
+        """
+        if not (self.state_path and os.path.exists(self.state_path)):
+            return {}
+
+        try:
+            with open(self.state_path, "r") as f:
+                return {k: float(v) for k, v in json.load(f)["last_fired"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+            log.warning("Unable to read the scheduler state from %s: %s", self.state_path, err)
+            return {}
+
+    def save_state(self):
+        """
+        Writes the last fire times to state_path, replacing the previous file atomically
+        """
+        if not self.state_path:
+            return
+
+        tmp_path = self.state_path + ".tmp"
+
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"last_fired": self.last_fired}, f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tmp_path, self.state_path)
+        except OSError as err:
+            log.error("Unable to save the scheduler state to %s: %s", self.state_path, err)
+
+    def missed_runs(self, schedule, since, now):
+        """
+        Returns the runs of a cron schedule after since and before now that should be caught up on
+
         Args:
-            id (int): Thread identifier
-            thread (threading.Thread): Reference to the thread object
-            time (float): Timestamp representation of when to execute the command
-            function (function): Reference to function used to process the command (usually Bot.handle_scheduled_cmd)
-            arguments (tuple): Arguments that were passed to the thread
+            schedule (str): Cron schedule
+            since (float): Timestamp of the last run that was fired, or queued to fire
+            now (datetime): Current, timezone aware, time
+
+        Returns:
+            (list) Timestamps of the runs to fire, oldest first
         """
-        self.schedule[id] = {
-            'thread': thread,
-            'time': time,
-            'function': function,
-            'arguments': arguments
-        }
+        if self.catch_up == "skip" or since is None:
+            return []
+
+        cron = croniter(schedule, now)
+        limit = 1 if self.catch_up == "once" else MAX_CATCH_UP
+        runs = []
+
+        while len(runs) < limit:
+            run = cron.get_prev()
+
+            if run <= since:
+                break
+
+            runs.append(run)
 
-        output("Scheduled Tasks: {}".format(self.get_num_of_tasks()))
+        return runs[::-1]
+
+    def start(self):
+        """
+        Starts the timer thread, if it isn't running already
+        """
+        with self.condition:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopped = False
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def stop(self):
+        """
+        Stops the timer thread. Tasks that already fired are allowed to finish.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+        self.executor.shutdown(wait=False)
 
     def schedule_cmd(self, command, channel, sched_time,
                      function, user_id, event_type='message', args=None):
         """
-        Creates a thread to execute a bot command at a specific time.
+        Schedules a bot command to be executed at a specific time.
         Args:
             command (str): Name of the command to be executed
-            channel (str): Slack Channel ID to execute the command in
+            channel (str): Slack Channel ID to execute the command in, or a tuple of IDs to post its output to
             sched_time (float): Timestamp representation of when to execute the command
             function (function): Reference to function used to process the command (usually Bot.handle_scheduled_cmd)
             user_id (str): Slack User ID to use when executing the command (usually the ID of the Bot)
@@ -86,53 +272,239 @@ class Scheduler:
             args (str): Argumnets to be appended to the command when executed
                 (i.e. The "roll" command takes a valid die roll as an argument. "1d20" could be passed here
         """
-        s = sched.scheduler(time.time, timedelta)
+        self.start()
 
-        # Add the task to the scheduler
-        task = s.enterabs(
-            sched_time,
-            1,
-            function,
-            (command, channel, user_id, event_type, args)
-        )
+        # Add task to SCHED
+        if self.add_task((command, channel, sched_time), function, (command, channel, user_id, event_type, args)):
+            log.info("Scheduled '%s' in %s at %s", command, channel, datetime.fromtimestamp(sched_time, self.tz))
 
-        # Spawn a thread daemon to handle the task
-        t = threading.Thread(target=s.run)
-        t.daemon = True
-        t.start()
+    @staticmethod
+    def get_channel(cmd_data):
+        """
+        Returns the channel a configured command is posted to: a channel ID, or a tuple of channel IDs when
+        the command is configured with a list of channels
+        """
+        channel = cmd_data.get("channel")
 
-        # Add task to SCHED
-        self.add_task(t.ident, t, task.time,
-                      task.action.__name__, task.argument)
+        if isinstance(channel, (list, tuple)):
+            channel = tuple(channel)
+            return channel[0] if len(channel) == 1 else channel
+
+        return channel
+
+    def compile_entry(self, cmd, cmd_data, now):
+        """
+        Parses the cron schedule of a configured command and computes its next fire time.
+        """
+        cron = croniter(cmd_data.get("schedule"), now)
 
-        print(task)
+        self.entries[cmd] = {
+            'cron': cron,
+            'next': cron.get_next(),
+            'data': cmd_data,
+            'channel': self.get_channel(cmd_data),
+            'missed_since': None
+        }
+
+    def compile_schedule(self, bot_commands):
+        """
+        Parses the cron schedule of every configured command once and computes its next fire time.
+        Args:
+            bot_commands (list): List of command values, for validation of config file.
+        """
+        self.entries = {}
+        now = datetime.now(self.tz)
+
+        for cmd, cmd_data in (self.CONFIG or {}).items():
+            if cmd in bot_commands:
+                self.compile_entry(cmd, cmd_data, now)
+                self.entries[cmd]['missed_since'] = self.last_fired.get(cmd)
+            else:
+                log.warning("No command found for: %s", cmd)
+
+        self.compiled = (self.CONFIG, bot_commands)
+        self.next_due = min((entry['next'] for entry in self.entries.values()), default=None)
+
+        if self.catch_up != "skip" and any(entry['missed_since'] for entry in self.entries.values()):
+            # process right away, to catch up on runs missed while the bot was down
+            self.next_due = 0
+
+    def update_schedule(self, bot_commands):
+        """
+        Applies a changed configuration: only the commands that were added, removed or changed are recompiled,
+        and their queued tasks that haven't fired yet are cancelled. Tasks that are already running finish.
+        Args:
+            bot_commands (list): List of command values, for validation of config file.
+        """
+        old, new = self.compiled[0] or {}, self.CONFIG or {}
+        now = datetime.now(self.tz)
+
+        for cmd in set(old) | set(new):
+            if cmd in new and cmd in old and new[cmd] == old[cmd]:
+                continue
+
+            with self.condition:
+                for key in list(self.tasks.get(cmd, ())):
+                    if self.schedule[key]['future'] is None:
+                        self.remove_task(key)
+
+            self.entries.pop(cmd, None)
+
+            if cmd not in new:
+                log.info("Unscheduled: %s", cmd)
+            elif cmd in bot_commands:
+                self.compile_entry(cmd, new[cmd], now)
+                log.info("Rescheduled: %s", cmd)
+            else:
+                log.warning("No command found for: %s", cmd)
+
+        self.compiled = (self.CONFIG, bot_commands)
+        self.next_due = min((entry['next'] for entry in self.entries.values()), default=None)
+
+    def validate_config(self, config):
+        """
+        Checks a scheduler configuration before it is used
+
+        Returns:
+            (list) Descriptions of the problems found, empty when the configuration is valid
+        """
+        if config is None:
+            return []
+
+        if not isinstance(config, dict):
+            return ["the configuration must be a mapping of commands"]
+
+        errors = []
+
+        for cmd, cmd_data in config.items():
+            if not isinstance(cmd_data, dict):
+                errors.append("{}: must be a mapping with args, channel and schedule".format(cmd))
+                continue
+
+            if not cmd_data.get("channel"):
+                errors.append("{}: no channel".format(cmd))
+
+            try:
+                croniter(cmd_data.get("schedule"))
+            except (ValueError, TypeError, KeyError, AttributeError):
+                errors.append("{}: invalid schedule {}".format(cmd, repr(cmd_data.get("schedule"))))
+
+        return errors
+
+    def reload_config(self):
+        """
+        Reloads the configuration file if it changed since it was last read. An invalid file is reported and
+        ignored, keeping the current configuration.
+
+        Returns:
+            (bool) True if a new configuration was loaded
+        """
+        try:
+            stat = os.stat(self.config_path)
+        except OSError as err:
+            log.error("Unable to read the scheduler configuration: %s", err)
+            return False
+
+        signature = (stat.st_mtime, stat.st_size)
+
+        if signature == self.config_signature:
+            return False
+
+        self.config_signature = signature
+
+        try:
+            with open(self.config_path, "r") as f:
+                config = yaml.load(f.read(), Loader=yaml.FullLoader)
+        except (OSError, yaml.YAMLError) as err:
+            log.error("Unable to load the scheduler configuration: %s", err)
+            return False
+
+        errors = self.validate_config(config)
+
+        if errors:
+            log.error("Ignoring invalid scheduler configuration: %s", "; ".join(errors))
+            return False
+
+        if config == self.CONFIG:
+            return False
+
+        log.info("Scheduler configuration reloaded from %s", self.config_path)
+        self.CONFIG = config
+
+        return True
+
+    def watch_config(self, config_path, interval=5):
+        """
+        Reloads the configuration from config_path whenever the file changes
+        Args:
+            config_path (str): Path of the YAML configuration file
+            interval (int): Seconds between checks for changes
+        """
+        self.config_path = config_path
+        self.config_interval = interval
+        self.config_checked = time.time()
+
+        try:
+            stat = os.stat(config_path)
+            self.config_signature = (stat.st_mtime, stat.st_size)
+        except OSError:
+            self.config_signature = None
 
     def process_schedule(self, bot_id, bot_commands,
                          schedule_function, schedule_delay=600):
         """
-        Read active configuration for Scheduler, determine next run iteration,
-        and created the scheduled command as necessary within the allotted schedule_delay time period.
+        Queue the configured commands whose next run falls within the allotted schedule_delay time period.
+
+        Next run times are cached from compile_schedule() and only advanced once a command has been queued,
+        so a tick with nothing due is a single comparison.
         Args:
             bot_id (str): The ID of the bot to be passed to the scheduled command as the "user".
             bot_commands (list): List of command values, for validation of config file.
             schedule_function (function): Function to be called by the scheduled task.
-            schedule_delay (int): Time, in seconds, before a scheduled task time to spawn a scheduled task thread
-        """
-        if self.CONFIG:
-            for cmd in self.CONFIG.keys():
-                if cmd in bot_commands:
-                    cmd_data = self.CONFIG.get(cmd)
-
-                    local = self.tz.localize(datetime.now())
-
-                    cmd_time = croniter(cmd_data.get("schedule"), local)
-                    next_run = self.tz.localize(datetime.fromtimestamp(cmd_time.get_next()))
-
-                    # if within the schedule_delay time period
-                    if timedelta(seconds=schedule_delay) >= next_run - local:
-                        # if not already scheduled
-                        if not self.has_task(cmd, next_run.timestamp()):
-                            self.schedule_cmd(cmd, cmd_data.get("channel"), next_run.timestamp(), schedule_function,
-                                              bot_id, args=cmd_data.get("args"))
-                else:
-                    output("No command found for: {}".format(cmd))
+            schedule_delay (int): Time, in seconds, before a scheduled task time to queue the task
+        """
+        now = time.time()
+
+        if self.config_path and now - self.config_checked >= self.config_interval:
+            self.config_checked = now
+            self.reload_config()
+
+        if self.compiled is None or self.compiled[1] != bot_commands:
+            if not self.CONFIG:
+                return
+
+            self.compile_schedule(bot_commands)
+        elif self.compiled[0] is not self.CONFIG:
+            self.update_schedule(bot_commands)
+
+        if self.next_due is None or self.next_due - now > schedule_delay:
+            return
+
+        for cmd, entry in self.entries.items():
+            cmd_data = entry['data']
+
+            if entry['next'] < now:
+                # missed while the schedule wasn't being processed (e.g. reconnecting)
+                entry['missed_since'] = entry['next'] - 1
+                entry['cron'] = croniter(cmd_data.get("schedule"), datetime.now(self.tz))
+                entry['next'] = entry['cron'].get_next()
+
+            if entry['missed_since'] is not None:
+                for run in self.missed_runs(cmd_data.get("schedule"), entry['missed_since'],
+                                            datetime.fromtimestamp(now, self.tz)):
+                    log.info("Catching up on '%s' missed at %s", cmd, datetime.fromtimestamp(run, self.tz))
+                    self.schedule_cmd(cmd, entry['channel'], run, schedule_function,
+                                      bot_id, args=cmd_data.get("args"))
+
+                entry['missed_since'] = None
+
+            # if within the schedule_delay time period
+            if entry['next'] - now <= schedule_delay:
+                # if not already scheduled
+                if not self.has_task(cmd, entry['next'], entry['channel']):
+                    self.schedule_cmd(cmd, entry['channel'], entry['next'], schedule_function,
+                                      bot_id, args=cmd_data.get("args"))
+
+                entry['next'] = entry['cron'].get_next()
+
+        self.next_due = min(entry['next'] for entry in self.entries.values())
@@ -0,0 +1,161 @@
+import heapq
+import math
+import re
+import sys
+
+
+class SearchIndex:
+    """
+    Implements an in-memory inverted index with BM25 ranking.
+
+    Documents can be added and removed individually so that the index can be updated
+    incrementally when the underlying data changes.
+    """
+
+    # BM25 tuning parameters
+    K1 = 1.5
+    B = 0.75
+
+    TOKEN_REGEX = re.compile(r"[a-z0-9]+")
+    STOP_WORDS = frozenset([
+        "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into", "is", "it",
+        "of", "on", "or", "such", "that", "the", "their", "this", "to", "with", "will", "which", "who"
+    ])
+
+    def __init__(self):
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_terms = {}  # doc_id -> terms in the document, used for removal
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def dump(self):
+        """
+        Returns the index as plain data, to be stored and passed to restore()
+
+        Returns:
+            (dict) The postings of every term and the length of every document
+        """
+        return {"postings": self.postings, "lengths": self.doc_lengths}
+
+    @classmethod
+    def restore(cls, data):
+        """
+        Rebuilds an index from the data returned by dump()
+
+        Args:
+            data (dict): Postings and document lengths
+
+        Returns:
+            (SearchIndex) The restored index
+        """
+        index = cls()
+        doc_terms = {doc_id: [] for doc_id in data["lengths"]}
+
+        for term, posting in data["postings"].items():
+            term = sys.intern(term)
+            index.postings[term] = {doc_id: int(tf) for doc_id, tf in posting.items()}
+
+            for doc_id in posting:
+                doc_terms[doc_id].append(term)
+
+        index.doc_terms = {doc_id: tuple(terms) for doc_id, terms in doc_terms.items()}
+        index.doc_lengths = {doc_id: int(length) for doc_id, length in data["lengths"].items()}
+        index.total_length = sum(index.doc_lengths.values())
+
+        return index
+
+    @classmethod
+    def tokenize(cls, text):
+        """
+        Splits text into lowercase index terms, dropping stop words
+
+        Args:
+            text (str): Text to tokenize
+
+        Returns:
+            (list) Terms in the order they appear in text
+        """
+        return [sys.intern(t) for t in cls.TOKEN_REGEX.findall((text or "").lower()) if t not in cls.STOP_WORDS]
+
+    def add(self, doc_id, text):
+        """
+        Adds a document to the index, replacing any existing document with the same id
+
+        Args:
+            doc_id (str): Unique identifier of the document
+            text (str): Text content of the document
+        """
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        terms = self.tokenize(text)
+        counts = {}
+
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+        self.doc_terms[doc_id] = tuple(counts)
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def remove(self, doc_id):
+        """
+        Removes a document from the index if it exists
+
+        Args:
+            doc_id (str): Unique identifier of the document
+        """
+        if doc_id not in self.doc_lengths:
+            return
+
+        for term in self.doc_terms.pop(doc_id):
+            posting = self.postings[term]
+            posting.pop(doc_id, None)
+
+            if not posting:
+                del self.postings[term]
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query, limit=10):
+        """
+        Ranks the indexed documents against a free text query using BM25
+
+        Args:
+            query (str): Free text query
+            limit (int): Maximum number of results to return
+
+        Returns:
+            (list) Tuples of (doc_id, score), best match first
+        """
+        num_docs = len(self.doc_lengths)
+
+        if not num_docs:
+            return []
+
+        avg_length = self.total_length / num_docs or 1
+        scores = {}
+
+        for term in set(self.tokenize(query)):
+            posting = self.postings.get(term)
+
+            if not posting:
+                continue
+
+            df = len(posting)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+
+            for doc_id, tf in posting.items():
+                norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,62 @@
+import threading
+
+from .Metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is running, other callers with the same key
+    wait for it and share its result instead of running the function again.
+    """
+
+    def __init__(self, name="singleflight"):
+        """
+        Args:
+            name (str): Prefix of the metrics counters for executed and shared calls
+        """
+        self.name = name
+        self.calls = {}  # key -> in-flight call
+        self.lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Runs function, unless a call with the same key is already in flight, in which case its result is
+        returned (or its exception raised) once it completes.
+
+        Args:
+            key: Hashable identifier of the call
+            function (function): Function to call
+
+        Returns:
+            (tuple) The result of the call, and True if this caller shared another caller's result
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            shared = call is not None
+
+            if not shared:
+                call = self.calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if shared:
+            call['done'].wait()
+            metrics.increment("{}.shared".format(self.name))
+
+            if call['error'] is not None:
+                raise call['error']
+
+            return call['result'], True
+
+        metrics.increment("{}.executed".format(self.name))
+
+        try:
+            call['result'] = function(*args, **kwargs)
+        except Exception as err:
+            call['error'] = err
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+            call['done'].set()
+
+        return call['result'], False
@@ -1,18 +1,65 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from slackclient import SlackClient
 
-from .Output import output
+from .Logger import SAMPLED, get_logger
+from .Metrics import metrics
+from .Tracing import NOOP_SPAN, tracer
+from .WorkspaceDirectory import WorkspaceDirectory
+
+log = get_logger(__name__)
+
+
+def get_retry_after(result, default):
+    """
+    Returns the seconds to wait before retrying a rate limited API call
+
+    slackclient copies the HTTP response headers into the result of api_call under "headers", with the case
+    the server sent them in; default is used when there is no Retry-After header.
+
+    Args:
+        result (dict): Result of SlackClient.api_call
+        default (float): Seconds to wait when Slack doesn't say
+    """
+    for name, value in (result.get("headers") or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                break
+
+    return default
 
 
 class SlackConn(SlackClient):
     MENTION_REGEX = "^<@(|[WU].+?)>(.*)"
+    MAX_SEND_WORKERS = 8
+    RATE_LIMIT_RETRIES = 5  # times a rate limited page is retried before giving up
+    RETRY_AFTER = 5  # seconds to wait before retrying a rate limited page, if Slack doesn't say
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Channels, users and team info, loaded on first use and kept up to date from RTM events
+        self.directory = WorkspaceDirectory(self)
+
+        # Called with the user ID of every team_join event instead of returning a "greet user" command
+        self.team_join_handler = None
+
+        # Onboarding pipeline of the current Bot, replaced when the Bot is created again on reconnect
+        self.onboarding = None
+
+        # Root span of the last command found by parse_bot_commands
+        self.trace = NOOP_SPAN
 
     def parse_bot_commands(self, slack_events, bot_id):
         """
         Parses a list of events coming from the Slack RTM API to find bot commands.
-        If a bot command is found, this function returns a tuple of command, channel, user id, and event type.
-        If it's not found, then this function returns None, None, None, None.
+        If a bot command is found, this function returns a tuple of command, channel, user id, and event type,
+        and starts a trace for handling it in self.trace. If it's not found, then this function returns None,
+        None, None, None.
 
         Args:
             slack_events (list): A list of Slack events, generally from the rtm_read() method of a Slack client
@@ -21,16 +68,33 @@ class SlackConn(SlackClient):
         Returns:
             (tuple) command, channel, user_id, event_type
         """
+        result = None, None, None, None
+
         for event in slack_events:
+            # keep the workspace directory current with every event, even after a command was found
+            self.directory.handle_event(event)
+
+            # joins are batched by the onboarding pipeline when there is one, so none of a burst is missed
+            if event["type"] == "team_join" and self.team_join_handler:
+                self.team_join_handler(event["user"].get("id"))
+                continue
+
+            if result[0] is not None:
+                continue
+
             if event["type"] == "message" and not "subtype" in event:
                 user_id, message = self.parse_direct_mention(event["text"])
                 if user_id == bot_id:
-                    return message, event["channel"], event["user"], event["type"]
+                    result = message, event["channel"], event["user"], event["type"]
             elif event["type"] == "team_join":
-                return "greet user", None, event["user"].get(
+                result = "greet user", None, event["user"].get(
                     "id"), event["type"]
 
-        return None, None, None, None
+        if result[0] is not None:
+            self.trace = tracer.start_trace("slack.command", command=result[0], channel=result[1], user=result[2],
+                                            event_type=result[3])
+
+        return result
 
     def parse_direct_mention(self, message_text):
         """
@@ -52,7 +116,8 @@ class SlackConn(SlackClient):
 
     def response_to_client(self, response):
         """
-        Sends a response back to the channel on the provided slack_client
+        Sends a response back to the channel on the provided slack_client.
+        A response with a list of channels is posted to all of them concurrently.
 
         Args:
             response (Response): A response object to be sent back to Slack
@@ -60,18 +125,115 @@ class SlackConn(SlackClient):
         Returns:
             None
         """
+        if isinstance(response.channel, (list, tuple)):
+            channels = list(response.channel)
+        else:
+            channels = [response.channel]
+
+        log.info("Sending %s to %d channel(s)", "attachment" if response.attachment else "response", len(channels),
+                 extra=SAMPLED)
+        # the full payload is only formatted when debug logging is on
+        log.debug("Response payload: %s", response.attachment or response.message)
+
+        with tracer.span("response_to_client", channels=len(channels)) as span:
+            if len(channels) == 1:
+                self.post_response(response, channels[0])
+                return
+
+            with ThreadPoolExecutor(max_workers=min(len(channels), self.MAX_SEND_WORKERS)) as executor:
+                results = executor.map(lambda c: self.post_response(response, c, span), channels)
+
+                for channel, result in zip(channels, results):
+                    if result and not result.get("ok", True):
+                        log.error("Failed to send response to %s: %s", channel, result.get("error"))
+
+    def post_response(self, response, channel, span=None):
+        """
+        Posts the message or attachment of a response to a single channel. A list of messages is posted one
+        after the other, stopping at the first failure.
+
+        Args:
+            response (Response): The response to post
+            channel (str): Slack channel ID
+            span (Span): The trace span to post under, when posting from another thread than the caller's
+
+        Returns:
+            (dict) The Slack API result of the last message posted
+        """
+        if span is not None:
+            with tracer.activate(span):
+                return self.post_response(response, channel)
+
         if response.attachment:
-            output(f"Sending attachment: {response.attachment}")
-            self.api_call(
-                "chat.postMessage",
-                channel=response.channel,
+            return self.post_message(
+                channel=channel,
                 attachments=response.attachment
             )
-        else:
-            output(f"Sending response: {response.message}")
-            self.api_call(
-                "chat.postMessage",
-                channel=response.channel,
-                text=response.message,
+
+        result = None
+
+        for message in response.get_messages():
+            result = self.post_message(
+                channel=channel,
+                text=message,
                 unfurl_links=True
             )
+
+            if result and not result.get("ok", True):
+                break
+
+        return result
+
+    def post_message(self, **kwargs):
+        """
+        Calls chat.postMessage, recording its latency and outcome
+
+        Returns:
+            (dict) The Slack API result
+        """
+        with tracer.span("slack.post_message", channel=kwargs.get("channel")) as span:
+            start = time.perf_counter()
+            result = self.api_call("chat.postMessage", **kwargs)
+            outcome = "error" if result and not result.get("ok", True) else "ok"
+            metrics.record("stage.duration", time.perf_counter() - start, stage="post_message", outcome=outcome)
+
+            if outcome == "error":
+                span.set_error(result.get("error"))
+
+        return result
+
+    def iter_pages(self, method, limit=200, **kwargs):
+        """
+        Calls a cursor-paginated Slack API method until every page has been read. A page that hits the rate
+        limit is requested again with the same cursor after the delay Slack asks for.
+
+        Args:
+            method (str): Slack API method, e.g. "channels.list"
+            limit (int): Number of items requested per page
+            **kwargs: Additional arguments for the API method
+
+        Returns:
+            (generator) The response of each page, in order. A response that isn't ok is the last one yielded.
+        """
+        args = dict(kwargs, limit=limit)
+
+        while True:
+            for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+                page = self.api_call(method, **args)
+
+                if page.get("error") != "ratelimited" or attempt == self.RATE_LIMIT_RETRIES:
+                    break
+
+                delay = get_retry_after(page, self.RETRY_AFTER)
+                log.warning("%s is rate limited, retrying in %.1fs", method, delay)
+                metrics.increment("slack.ratelimited", method=method)
+                time.sleep(delay)
+
+            yield page
+
+            cursor = (page.get("response_metadata") or {}).get("next_cursor")
+
+            if not page.get("ok") or not cursor:
+                return
+
+            args["cursor"] = cursor
@@ -0,0 +1,290 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import Request, urlopen
+
+from .Logger import get_logger
+
+log = get_logger(__name__)
+
+
+class Span:
+    """
+    A timed operation within a trace. Spans are created by Tracer, not directly.
+    """
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def elapsed(self):
+        """
+        Returns: (float) Seconds since the span started
+        """
+        return time.perf_counter() - self.started
+
+    def set_error(self, err):
+        """
+        Marks the span as failed
+
+        Args:
+            err: The exception raised, or an error message
+        """
+        self.status = "error"
+        self.attributes["error"] = "{}: {}".format(type(err).__name__, err) if isinstance(err, Exception) else err
+
+    def end(self):
+        """
+        Ends the span. Ending the root span of a trace hands the whole trace to the tracer for export.
+        """
+        if self.duration is not None:
+            return
+
+        self.duration = time.perf_counter() - self.started
+        self.trace.add(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class NoopSpan:
+    """
+    Stands in for a span when tracing is off or the trace isn't sampled, so callers never check.
+    """
+    trace = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def elapsed(self):
+        return 0.0
+
+    def set_error(self, err):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Trace:
+    """
+    Collects the ended spans of one trace until its root span ends
+    """
+
+    def __init__(self, tracer, sampled):
+        self.tracer = tracer
+        self.trace_id = os.urandom(16).hex()
+        self.sampled = sampled
+        self.root = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+        if span is self.root:
+            self.tracer.finish(self)
+
+
+class Tracer:
+    """
+    Traces the handling of a message, from the RTM event to the reply posted to Slack.
+
+    The span of the operation running on a thread is kept in a thread local; spans opened with span() are its
+    children. A trace is started with start_trace() and run with activate(), on whichever thread does the
+    work; work handed to another thread takes current() with it and activates it there.
+
+    Sampling is decided per trace: a trace is kept with probability sample_rate, and traces that took at
+    least slow_threshold seconds or failed are always kept. Spans are only recorded when the trace may be
+    kept; everything else is a no-op. Kept traces are exported from a background thread.
+    """
+
+    def __init__(self, exporter=None, sample_rate=1.0, slow_threshold=None, queue_size=1000):
+        """
+        Args:
+            exporter: Receives the spans of every kept trace, see FileExporter and CollectorExporter
+                      (default: tracing is off)
+            sample_rate (float): Fraction of traces kept, between 0 and 1
+            slow_threshold (float): Seconds after which a trace is kept regardless of sample_rate
+            queue_size (int): Traces waiting to be exported before new ones are dropped
+        """
+        self.local = threading.local()
+        self.queue = queue.Queue(queue_size)
+        self.thread = None
+        self.configure(exporter, sample_rate, slow_threshold)
+
+    def configure(self, exporter=None, sample_rate=1.0, slow_threshold=None):
+        """
+        Sets where traces are exported and how they are sampled (see __init__)
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+
+        if exporter is not None and self.thread is None:
+            self.thread = threading.Thread(target=self.export_traces)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def start_trace(self, name, **attributes):
+        """
+        Starts a new trace
+
+        Returns:
+            (Span) The root span, to be activated while doing the traced work and ended when it is done
+        """
+        if self.exporter is None:
+            return NOOP_SPAN
+
+        sampled = random.random() < self.sample_rate
+
+        if not sampled and self.slow_threshold is None:
+            return NOOP_SPAN
+
+        trace = Trace(self, sampled)
+        trace.root = Span(trace, name, attributes=attributes)
+
+        return trace.root
+
+    def current(self):
+        """
+        Returns: The span running on this thread, or a no-op span
+        """
+        return getattr(self.local, "span", None) or NOOP_SPAN
+
+    @contextmanager
+    def activate(self, span):
+        """
+        Context manager making span the current span of this thread
+        """
+        previous = getattr(self.local, "span", None)
+        self.local.span = span
+
+        try:
+            yield span
+        finally:
+            self.local.span = previous
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Context manager timing the wrapped block as a child of the current span. An exception raised in the
+        block marks the span as failed.
+
+        Yields:
+            (Span) The child span, to add attributes to
+        """
+        parent = self.current()
+
+        if parent.trace is None:
+            yield NOOP_SPAN
+            return
+
+        span = Span(parent.trace, name, parent.span_id, attributes)
+
+        with self.activate(span):
+            try:
+                yield span
+            except Exception as err:
+                span.set_error(err)
+                raise
+            finally:
+                span.end()
+
+    def finish(self, trace):
+        """
+        Queues a finished trace for export if it is kept
+        """
+        root = trace.root
+        failed = any(span.status == "error" for span in trace.spans)
+        slow = self.slow_threshold is not None and root.duration >= self.slow_threshold
+
+        if not (trace.sampled or failed or slow):
+            return
+
+        try:
+            self.queue.put_nowait([span.to_dict() for span in trace.spans])
+        except queue.Full:
+            log.warning("Dropping trace %s, the export queue is full", trace.trace_id)
+
+    def export_traces(self):
+        while True:
+            spans = self.queue.get()
+
+            try:
+                self.exporter.export(spans)
+            except Exception as err:
+                log.warning("Unable to export trace: %s", err)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """
+        Waits until every queued trace was exported
+        """
+        if self.thread is not None:
+            self.queue.join()
+
+
+class FileExporter:
+    """
+    Appends spans to a file, one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span, default=str) + "\n" for span in spans)
+
+        with self.lock, open(self.path, "a") as f:
+            f.write(lines)
+
+
+class CollectorExporter:
+    """
+    POSTs the spans of each trace as a JSON list to a collector.
+    """
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def export(self, spans):
+        request = Request(self.url, data=json.dumps(spans, default=str).encode("utf-8"),
+                          headers={"Content-Type": "application/json"})
+
+        with urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+# Shared tracer used throughout the bot, off until configured
+tracer = Tracer()
@@ -0,0 +1,207 @@
+import threading
+import time
+
+from .Logger import get_logger
+
+log = get_logger(__name__)
+
+# RTM events that change the cached directory
+DIRECTORY_EVENTS = frozenset(("channel_created", "channel_rename", "channel_deleted", "channel_archive",
+                              "channel_unarchive", "team_join", "user_change", "team_rename"))
+
+
+class WorkspaceDirectory:
+    """
+    Caches the channels, users and team info of the Slack workspace.
+
+    Everything is loaded with one set of API calls, kept up to date from RTM events, and reloaded after ttl
+    seconds in case an event was missed. A load where any part failed is retried after retry_interval seconds.
+    Lookups by ID and by name are dictionary lookups.
+    """
+
+    def __init__(self, slack_client, ttl=3600, retry_interval=30):
+        """
+        Args:
+            slack_client: Reference to a valid Slack connection
+            ttl (int): Seconds before the whole directory is reloaded from the API
+            retry_interval (int): Seconds before a load that partly failed is retried
+        """
+        self.slack_client = slack_client
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.channels = {}  # channel id -> channel
+        self.channel_names = {}  # channel name -> channel id
+        self.users = {}  # user id -> user
+        self.team = {}
+        self.loaded = 0  # time of the last load where every part loaded
+        self.retry_at = 0  # time before which a failed load isn't retried
+        self.replay = None  # events received while a refresh is fetching, None when not refreshing
+        self.lock = threading.RLock()  # guards the maps, only held for in-memory updates
+        self.refresh_lock = threading.RLock()  # one refresh at a time
+
+    def refresh(self):
+        """
+        Loads the whole directory from the Slack API. Parts that fail to load keep their cached values.
+
+        The pages are fetched without holding the lock, so RTM events keep being applied meanwhile; events
+        received during the fetch are applied again on top of the freshly loaded maps.
+        """
+        with self.refresh_lock:
+            with self.lock:
+                self.replay = []
+
+            try:
+                channels = self.load_list("channels.list", "channels", exclude_members=True)
+                users = self.load_list("users.list", "members")
+                team_info = self.slack_client.api_call("team.info")
+            except Exception:
+                with self.lock:
+                    self.replay = None
+                raise
+
+            if not team_info.get("ok"):
+                log.warning("Unable to load the team info: %s", team_info.get("error"))
+
+            with self.lock:
+                if channels is not None:
+                    self.channels = channels
+                    self.channel_names = {channel["name"]: channel["id"] for channel in channels.values()}
+
+                if users is not None:
+                    self.users = users
+
+                if team_info.get("ok"):
+                    self.team = team_info.get("team", {})
+
+                if channels is not None and users is not None and team_info.get("ok"):
+                    self.loaded = time.time()
+                else:
+                    # keep serving what is cached, and try again soon rather than after the full ttl
+                    self.retry_at = time.time() + self.retry_interval
+
+                replay, self.replay = self.replay, None
+
+                for event in replay:
+                    self.apply_event(event)
+
+            log.info("Workspace directory loaded: %d channels, %d users", len(self.channels), len(self.users))
+
+    def load_list(self, method, key, **kwargs):
+        """
+        Reads every page of a paginated list method, indexing the items by ID as they arrive
+
+        Returns:
+            (dict) Item ID -> item, or None if any page failed to load
+        """
+        items = {}
+
+        for page in self.slack_client.iter_pages(method, **kwargs):
+            if not page.get("ok"):
+                log.warning("Unable to load %s: %s", method, page.get("error"))
+                return None
+
+            for item in page.get(key, []):
+                items[item["id"]] = item
+
+        return items
+
+    def is_stale(self):
+        now = time.time()
+
+        return now - self.loaded >= self.ttl and now >= self.retry_at
+
+    def ensure_fresh(self):
+        if self.is_stale():
+            with self.refresh_lock:
+                # another thread may have refreshed while this one waited for the lock
+                if self.is_stale():
+                    self.refresh()
+
+    def get_channel(self, channel_id):
+        """
+        Returns: (dict) The channel with the given ID, or None
+        """
+        self.ensure_fresh()
+
+        return self.channels.get(channel_id)
+
+    def get_channel_by_name(self, name):
+        """
+        Returns: (dict) The channel with the given name (without the #), or None
+        """
+        self.ensure_fresh()
+
+        return self.channels.get(self.channel_names.get(name.lstrip("#")))
+
+    def list_channels(self):
+        """
+        Returns: (list) All channels in the workspace
+        """
+        self.ensure_fresh()
+
+        return list(self.channels.values())
+
+    def get_user(self, user_id):
+        """
+        Returns: (dict) The user with the given ID, or None
+        """
+        self.ensure_fresh()
+
+        return self.users.get(user_id)
+
+    def get_team_name(self, default=None):
+        self.ensure_fresh()
+
+        return self.team.get("name", default)
+
+    def add_channel(self, channel):
+        with self.lock:
+            old = self.channels.get(channel["id"])
+            if old and self.channel_names.get(old.get("name")) == channel["id"]:
+                del self.channel_names[old["name"]]
+
+            self.channels[channel["id"]] = dict(old or {}, **channel)
+            self.channel_names[channel["name"]] = channel["id"]
+
+    def remove_channel(self, channel_id):
+        with self.lock:
+            channel = self.channels.pop(channel_id, None)
+
+            if channel and self.channel_names.get(channel.get("name")) == channel_id:
+                del self.channel_names[channel["name"]]
+
+    def handle_event(self, event):
+        """
+        Applies an RTM event that changes the workspace to the cached directory
+
+        Args:
+            event (dict): Slack RTM event
+        """
+        if event.get("type") not in DIRECTORY_EVENTS:
+            return
+
+        with self.lock:
+            # a refresh in progress may have fetched the lists before this change
+            if self.replay is not None:
+                self.replay.append(event)
+
+            self.apply_event(event)
+
+    def apply_event(self, event):
+        """
+        Applies a directory event to the cached maps. Called while holding the lock.
+        """
+        event_type = event.get("type")
+
+        if event_type in ("channel_created", "channel_rename"):
+            self.add_channel(event["channel"])
+        elif event_type == "channel_deleted":
+            self.remove_channel(event["channel"])
+        elif event_type in ("channel_archive", "channel_unarchive"):
+            channel = self.channels.get(event["channel"])
+            if channel:
+                channel["is_archived"] = event_type == "channel_archive"
+        elif event_type in ("team_join", "user_change"):
+            self.users[event["user"]["id"]] = event["user"]
+        elif event_type == "team_rename":
+            self.team = dict(self.team, name=event["name"])
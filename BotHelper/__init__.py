@@ -1,6 +1,21 @@
 from .Scheduler import Scheduler
 from .MongoConn import MongoConn
 from .Catalog import Catalog, Course
-from .Response import Response
+from .SearchIndex import SearchIndex
+from .RequisiteGraph import RequisiteGraph
+from .CatalogIngest import CatalogIngest
+from .Metrics import Histogram, Metrics, metrics
+from .MetricsServer import MetricsServer
+from .Tracing import NOOP_SPAN, CollectorExporter, FileExporter, Tracer, tracer
+from .PacktBook import BookCache, PacktBook, PacktPageError
+from .DriverPool import DriverPool
+from .AhoCorasick import AhoCorasick
+from .RequestMatcher import RequestMatcher
+from .WorkspaceDirectory import WorkspaceDirectory
+from .Onboarding import Onboarding
+from .SingleFlight import SingleFlight
+from .Response import Response, split_message
 from .SlackConn import SlackConn
+from .Logger import SAMPLED, get_logger, setup_logging, shutdown_logging
 from .Output import output
+from .Config import load_config
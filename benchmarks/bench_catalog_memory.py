@@ -0,0 +1,145 @@
+"""
+Measures the memory used per course by the in-memory catalog.
+
+Compares the original dict-backed Course representation against the current slotted and
+interned one, using a synthetic multi-campus catalog decoded from JSON (as the BSON decode does,
+every document carries its own copy of each repeated string).
+
+The search index and the precomputed requisite graph are not part of the course representation, so they
+are left out of the "compact" figure and reported on their own rows. The synthetic subjects are chains of
+prerequisites, the worst case for the graph, whose ancestor and descendant lists grow with the square of the
+chain length.
+
+Usage:
+    python benchmarks/bench_catalog_memory.py [campuses] [courses_per_subject]
+"""
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from BotHelper import Catalog  # noqa: E402
+
+SUBJECTS = ["Accounting", "Computer Science", "Information Technology", "Mathematics", "English", "History",
+            "Biology", "Chemistry", "Psychology", "Marketing", "Economics", "Finance"]
+CREDITS = ["3 credits", "4 credits", "1 credit", "0 credits"]
+WORDS = ["introduction", "advanced", "principles", "analysis", "design", "systems", "theory", "methods",
+         "practice", "applications", "students", "research", "data", "programming", "writing", "culture"]
+
+
+class LegacyCourse:
+    """
+    The original Course representation, with a per-instance __dict__ and no interning
+    """
+
+    def __init__(self, title, description, creds, reqs):
+        self.title = title
+        self.description = description
+        self.credits = creds
+        self.requisites = reqs
+
+
+def build_documents(campuses, courses_per_subject):
+    rand = random.Random(42)
+    documents = []
+
+    for campus in range(campuses):
+        for subject in SUBJECTS:
+            # e.g. MATA for Mathematics at the first campus, unique for every subject and campus
+            prefix = subject[:3].upper() + chr(ord("A") + campus)
+            courses = []
+
+            for num in range(100, 100 + courses_per_subject):
+                courses.append({
+                    "id": "{}{}".format(prefix, num),
+                    "title": " ".join(rand.choice(WORDS) for _ in range(3)).title(),
+                    "description": " ".join(rand.choice(WORDS) for _ in range(40)),
+                    "credits": rand.choice(CREDITS),
+                    "requisites": "Prerequisite: {}{}".format(prefix, num - 1) if num > 100 else None
+                })
+
+            documents.append({"title": "{} - Campus {}".format(subject, campus), "courses": courses})
+
+    # round-trip through JSON so every document holds its own copies of repeated strings
+    return json.loads(json.dumps(documents))
+
+
+def load_legacy(documents):
+    subjects = {}
+
+    for subject in documents:
+        course_data = {}
+        for course in subject['courses']:
+            course_data[course['id']] = LegacyCourse(
+                course['title'], course['description'], course['credits'], course['requisites'])
+        subjects[subject['title']] = course_data
+
+    return subjects
+
+
+def load_compact(documents):
+    catalog = Catalog()
+    catalog.load_documents(documents)
+
+    # the search index and requisite graph are measured separately
+    catalog.index = None
+    catalog.graph = None
+
+    return catalog
+
+
+def load_index(documents):
+    catalog = Catalog()
+    catalog.load_documents(documents)
+
+    # only the index (and the course IDs it references) stays alive
+    return catalog.index
+
+
+def load_graph(documents):
+    catalog = Catalog()
+    catalog.load_documents(documents)
+
+    # only the requisite graph (and the course IDs it references) stays alive
+    return catalog.graph
+
+
+def measure(loader, campuses, courses_per_subject):
+    tracemalloc.start()
+
+    documents = build_documents(campuses, courses_per_subject)
+    num_courses = sum(len(subject['courses']) for subject in documents)
+    result = loader(documents)
+
+    # drop the decoded documents so only what the loader kept alive is counted
+    del documents
+    gc.collect()
+
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+
+    return size, num_courses
+
+
+def main():
+    campuses = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    courses_per_subject = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    if not 0 < campuses <= 26:
+        sys.exit("campuses must be between 1 and 26")
+
+    for name, loader in (("legacy", load_legacy), ("compact", load_compact), ("index", load_index),
+                         ("graph", load_graph)):
+        size, num_courses = measure(loader, campuses, courses_per_subject)
+        print("{:<8} {:>8} courses {:>12,} bytes {:>8.1f} bytes/course".format(
+            name, num_courses, size, size / num_courses))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Measures end-to-end latency and resource use of the packtbook command against the local Packt fixture server.
+
+Every call starts with an empty book cache, so each one scrapes the page using the selected fetch strategy:
+http (plain HTTP only), selenium (headless Chrome only) or auto (HTTP, falling back to Chrome). Without Chrome
+installed the selenium strategy is skipped.
+
+Usage:
+    python benchmarks/bench_packtbook.py [-n iterations] [-s strategy ...] [-p scenario ...] [-l latency]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from Bot import Bot  # noqa: E402
+from cmds import packtbook as cmd_packtbook  # noqa: E402
+from tests.fixtures.packt.server import SCENARIOS, PacktFixtureServer  # noqa: E402
+
+STRATEGIES = {
+    "http": [("http", cmd_packtbook.scrape_http)],
+    "selenium": [("selenium", cmd_packtbook.scrape_selenium)],
+    "auto": list(cmd_packtbook.strategies),
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def selenium_available():
+    try:
+        with cmd_packtbook.pool.driver(timeout=60):
+            return True
+    except Exception as err:
+        print("Skipping selenium: {}".format(str(err).strip().splitlines()[0] if str(err).strip() else err))
+        return False
+
+
+def run(strategy, page_url, iterations):
+    """
+    Runs the packtbook command iterations times
+
+    Returns:
+        (dict) Latencies, CPU time, peak Python memory and outcomes of the calls
+    """
+    bot = Bot("UBENCHMARK", None, None)
+    cmd_packtbook.strategies = STRATEGIES[strategy]
+    cmd_packtbook.url = page_url
+    latencies = []
+    books = 0
+
+    tracemalloc.start()
+    cpu_start = time.process_time()
+
+    for _ in range(iterations):
+        cmd_packtbook.cache.book = None
+
+        start = time.perf_counter()
+        attachment = cmd_packtbook.execute("packtbook", "UBENCHMARK", bot)[1]
+        latencies.append(time.perf_counter() - start)
+
+        books += attachment is not None
+
+    cpu = time.process_time() - cpu_start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {"latencies": latencies, "cpu": cpu, "peak": peak, "books": books}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the packtbook command against local fixtures")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="Calls per strategy and scenario")
+    parser.add_argument("-s", "--strategy", nargs="+", choices=sorted(STRATEGIES), default=["http", "selenium", "auto"])
+    parser.add_argument("-p", "--scenario", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("-l", "--latency", type=float, default=0.0, help="Simulated server latency in seconds")
+    parser.add_argument("-r", "--render_delay", type=int, default=1500,
+                        help="Milliseconds before the slow scenario renders its book")
+    args = parser.parse_args()
+
+    strategies = list(args.strategy)
+    if "selenium" in strategies and not selenium_available():
+        # auto still runs, its browser fallback fails like it would in production
+        strategies.remove("selenium")
+
+    print("{:<9} {:<8} {:>7} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10} {:>11}".format(
+        "strategy", "scenario", "books", "mean ms", "p50 ms", "p95 ms", "max ms", "cpu ms", "py peak KB",
+        "browser MB"))
+
+    with PacktFixtureServer(latency=args.latency) as fixture:
+        for strategy in strategies:
+            for scenario in args.scenario:
+                page_url = fixture.url(scenario)
+                if scenario == "slow":
+                    page_url += "?render_delay={}".format(args.render_delay)
+
+                result = run(strategy, page_url, args.iterations)
+                latencies = result["latencies"]
+                browser = [cmd_packtbook.pool.memory_mb(d) for d in cmd_packtbook.pool.idle]
+                browser = [m for m in browser if m is not None]
+
+                print("{:<9} {:<8} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>10.2f} {:>10.1f} {:>11}".format(
+                    strategy, scenario, "{}/{}".format(result["books"], len(latencies)),
+                    sum(latencies) / len(latencies) * 1000, percentile(latencies, 50) * 1000,
+                    percentile(latencies, 95) * 1000, max(latencies) * 1000,
+                    result["cpu"] / len(latencies) * 1000, result["peak"] / 1024,
+                    "{:.0f}".format(sum(browser)) if browser else "-"))
+
+        print("\n{} page requests served".format(fixture.requests))
+
+    cmd_packtbook.pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
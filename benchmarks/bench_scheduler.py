@@ -0,0 +1,95 @@
+"""
+Measures the cost of a Scheduler.process_schedule tick with many scheduled commands.
+
+The main loop calls process_schedule after every RTM read, and almost every tick has nothing due. The original
+implementation parsed every cron entry and computed its next run on each tick; the current one compiles the
+entries once and compares the cached earliest fire time.
+
+Usage:
+    python benchmarks/bench_scheduler.py [entries] [ticks]
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from croniter import croniter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from BotHelper import Scheduler  # noqa: E402
+
+
+def build_config(entries, tz):
+    rand = random.Random(42)
+    config = {}
+
+    for i in range(entries):
+        # daily and weekly jobs at a minute granularity, none of them due during the benchmark
+        hour = (datetime.now(tz).hour + rand.randint(2, 20)) % 24
+        schedule = "{} {} * * {}".format(rand.randint(0, 59), hour, rand.choice(["*", "1-5", "0", "3"]))
+        config["cmd{}".format(i)] = {"args": "", "channel": "C{:08}".format(i), "schedule": schedule}
+
+    return config
+
+
+def legacy_tick(config, tz, bot_commands, schedule_delay=600):
+    """
+    The original process_schedule loop, without scheduling anything
+    """
+    due = 0
+
+    for cmd in config.keys():
+        if cmd in bot_commands:
+            cmd_data = config.get(cmd)
+
+            local = tz.localize(datetime.now())
+
+            cmd_time = croniter(cmd_data.get("schedule"), local)
+            next_run = tz.localize(datetime.fromtimestamp(cmd_time.get_next()))
+
+            if timedelta(seconds=schedule_delay) >= next_run - local:
+                due += 1
+
+    return due
+
+
+def measure(tick, ticks):
+    start = time.perf_counter()
+
+    for _ in range(ticks):
+        tick()
+
+    return (time.perf_counter() - start) / ticks
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    tz = pytz.timezone("US/Eastern")
+    config = build_config(entries, tz)
+    bot_commands = list(config)
+
+    scheduler = Scheduler(config)
+
+    start = time.perf_counter()
+    scheduler.compile_schedule(bot_commands)
+    compile_time = time.perf_counter() - start
+
+    results = (
+        ("legacy", measure(lambda: legacy_tick(config, tz, bot_commands), ticks)),
+        ("cached", measure(lambda: scheduler.process_schedule("UBOT", bot_commands, None), ticks * 100)),
+    )
+
+    print("{} entries, compiled once in {:.1f}ms".format(entries, compile_time * 1000))
+    for name, per_tick in results:
+        print("{:<8} {:>12.2f} us/tick".format(name, per_tick * 1e6))
+
+    scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import sys
+
+from BotHelper import CatalogIngest, MongoConn, load_config, output
+from BotHelper.CatalogIngest import read_records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Ingest a catalog export into the Noob SNHUBot catalog database.')
+    parser.add_argument("file", help="Relative path to the JSON, JSON lines or CSV catalog export.")
+    parser.add_argument("-m", "--mongo_config", required=True,
+                        help="Relative path to Mongo Database configuration file.")
+    parser.add_argument("-f", "--format", required=False, choices=["json", "csv"],
+                        help="Format of the export. Detected from the file extension by default.")
+    parser.add_argument("-b", "--batch_size", required=False, default=500, type=int,
+                        help="Number of write operations sent to the database at once.")
+    parser.add_argument("-p", "--prune", action="store_true",
+                        help="Remove courses that are not present in the export.")
+    parser.add_argument("-n", "--dry_run", action="store_true",
+                        help="Report the differences without writing them.")
+    args = parser.parse_args()
+
+    mc = load_config(args.mongo_config)
+
+    mongo = MongoConn(mc,
+                      db=mc['db'],
+                      collection=mc['collections']['conn'],
+                      hostname=mc['hostname'],
+                      port=mc['port']
+                      )
+
+    if not mongo.connected:
+        sys.exit("Could not connect to the database. Exiting...")
+
+    try:
+        ingest = CatalogIngest(mongo, batch_size=args.batch_size, dry_run=args.dry_run)
+        stats = ingest.run(read_records(args.file, args.format), prune=args.prune)
+    except FileNotFoundError as e:
+        sys.exit("Could not find catalog export: {}".format(e.filename))
+    except ValueError as e:
+        sys.exit("Invalid catalog export: {}".format(e))
+
+    if "version" in stats:
+        output("Catalog version is now {}".format(stats["version"]))
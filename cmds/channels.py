@@ -1,31 +1,35 @@
+import itertools
+
+from BotHelper import split_message
+
 command = "channels"
 public = True
+coalesce = True
 
+header = """
+_*Here's a detailed list of our channels for your convenience.*_
+Click on the links to view the channels and start chatting!"""
 
-def execute(command, user, bot):
-    # Get IM list
-    channels_info = bot.slack_client.api_call("channels.list")
-    channels = {}  # dictionary for listing all channels in workspace
 
-    # Get the channels list and prep for mention expansion
-    if channels_info.get("ok"):
-        for channel in channels_info.get("channels"):
-            id = channel.get("id")
-            purpose = channel.get("purpose").get("value")
+def render_channels(channels):
+    """
+    Renders one line per channel, as the channels are read
+    """
+    for channel in channels:
+        purpose = (channel.get("purpose") or {}).get("value", "")
 
-            channels[id] = purpose  # Add new dictionary item with purpose
+        yield "<#{}>: {}".format(channel.get("id"), purpose.encode('ascii', errors="replace").decode())
 
+
+def execute(command, user, bot):
     attachment = None
 
-    channel_output = ""
-    for k, v in channels.items():
-        channel_output += "<#{}>: {}\n".format(
-            k, v.encode('ascii', errors="replace").decode())
+    # Get the channels list from the cached workspace directory, and split the list into as many messages
+    # as needed to stay under Slack's message size limit
+    lines = itertools.chain([header], render_channels(bot.slack_client.directory.list_channels()))
+    messages = list(split_message(lines))
 
-    response = """
-_*Here's a detailed list of our channels for your convenience.*_
-Click on the links to view the channels and start chatting!
-{}
-""".format(channel_output)
+    # Most workspaces fit in a single message
+    response = messages[0] if len(messages) == 1 else messages
 
     return response, attachment
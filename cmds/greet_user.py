@@ -4,30 +4,33 @@ public = False
 
 
 def execute(command, user, bot):
-    # Get IM list
-    team_info = bot.slack_client.api_call("team.info")
-    channels_info = bot.slack_client.api_call("channels.list")
-    bot_id = bot.id
+    # open the IM channel to the new user
+    im_channel = bot.slack_client.api_call("im.open", user=user)
 
-    # Set the Team Name
-    if team_info.get("ok"):
-        team_name = team_info.get("team").get("name")
+    greeting = render_template(bot).replace("{user}", user)
+
+    # Return the new greeting and send private message
+    if im_channel.get("ok"):
+        return greeting, im_channel.get("channel").get("id")
     else:
-        team_name = "snhu_coders"
+        return None, None
 
-    # Get the general channel ID
-    if channels_info.get("ok"):
-        for channel in channels_info.get("channels"):
-            channel_id = channel.get("id")
-            name = channel.get("name")
 
-            if name == "general":
-                general = channel_id
+def render_template(bot):
+    """
+    Renders the greeting with the workspace's details, leaving "{user}" where the new user's ID goes.
+    Used once per batch of users by the Onboarding pipeline.
+    """
+    directory = bot.slack_client.directory
+    bot_id = bot.id
+
+    # Set the Team Name
+    team_name = directory.get_team_name("snhu_coders")
 
-    # open the IM channel to the new user
-    im_channel = bot.slack_client.api_call("im.open", user=user)
+    # Get the general channel ID
+    general = (directory.get_channel_by_name("general") or {}).get("id")
 
-    greeting = """
+    return """
 _Welcome to *{0}*, <@{1}>!_
 
 We're so happy that you've joined our community! Please introduce yourself in <#{3}>, and let us know what brings you to the team!
@@ -45,10 +48,4 @@ Use `<@{2}> help` to _*learn more about the commands*_ I respond to. For a _*det
 _If you're new to Slack_, please check out the <https://get.slack.help/hc/en-us/articles/217626358-Tour-the-Slack-app#windows-app-1|Slack Tour>.
 _A handy feature of Slack_ is the ability to <https://get.slack.help/hc/en-us/articles/204145658-Create-a-snippet|Create a Snippet>.
 
-""".format(team_name, user, bot_id, general)
-
-    # Return the new greeting and send private message
-    if im_channel.get("ok"):
-        return greeting, im_channel.get("channel").get("id")
-    else:
-        return None, None
+""".format(team_name, "{user}", bot_id, general)
@@ -2,58 +2,305 @@ import json
 import time
 import re
 
+import requests
+from bs4 import BeautifulSoup
+from pymongo import DeleteMany, UpdateMany, UpdateOne
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.chrome.options import Options
-from urllib.error import HTTPError
+from selenium.webdriver.support.ui import WebDriverWait
+
+from BotHelper import BookCache, DriverPool, PacktBook, PacktPageError, RequestMatcher, get_logger, metrics
+
+log = get_logger(__name__)
 
 command = 'packtbook'
 public = True
-increment = 0.5
+render_timeout = 10
+poll_frequency = 0.1
+url = 'https://www.packtpub.com/packt/offers/free-learning/'
+http_timeout = 10
 
 
 # The following regex is designed to separate all of the words given
 # for requests while accounting for phrases indicated by "phrase".
 separator_regex = re.compile(r"(?<=\")[-+#.$ \w]+(?=\")|[-+#.$\w]+")
 
-try:
+# Reads every element the scraper needs from the rendered page in a single round trip to the browser
+extract_script = """
+var text = function (selector) {
+    var elem = document.querySelector(selector);
+    return elem ? (elem.textContent || '').trim() : '';
+};
+var img = document.querySelector('.product__img');
+
+return {
+    warning: text('.message.warning'),
+    error: text('.message.error'),
+    title: text('.product__title'),
+    image: img ? (img.getAttribute('src') || '') : '',
+    countdown: text('.countdown__timer')
+};
+"""
+
+
+def create_driver():
+    """
+    Starts a new headless Chrome browser for the driver pool.
+    """
     opts = Options()
     opts.add_argument("--headless")
     opts.add_argument('--no-sandbox')
     opts.add_argument('--disable-dev-shm-usage')
-    driver = webdriver.Chrome(options=opts)
-except WebDriverException as e:
-    print("Error encountered while starting the ChromeDriver:\n{}".format(e))
-    driver = None
 
+    try:
+        return webdriver.Chrome(options=opts)
+    except WebDriverException as e:
+        log.error("Error encountered while starting the ChromeDriver: %s", e)
+        raise
+
+
+# Browsers are started on first use and shared between threads through the pool
+pool = DriverPool(create_driver, size=1, max_uses=50, max_memory_mb=512)
+
+
+def page_is_ready(elements):
+    """
+    Returns True once the page shows either a book or a warning/error banner
+    """
+    return bool(elements and (elements["warning"] or elements["error"] or
+                              (elements["title"] and elements["image"] and elements["countdown"])))
+
+
+def scrape_http():
+    """
+    Downloads the free learning page over plain HTTP and parses the book of the day from the HTML.
+    Much cheaper than driving a browser, but fails when the page needs JavaScript to render the book.
+
+    Returns:
+        (PacktBook) The scraped book
+
+    Raises:
+        PacktPageError: The page shows a warning or error
+        requests.HTTPError: The page returned an error status
+        ValueError: The book elements or countdown are not in the HTML
+    """
+    page = requests.get(url, timeout=http_timeout, headers={"User-Agent": "Mozilla/5.0 (compatible; NoobSNHUbot)"})
+    page.raise_for_status()
+
+    return parse_html(page.text)
+
+
+def parse_html(html):
+    """
+    Parses the book of the day from the HTML of the free learning page, see scrape_http()
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    warning_message = soup.select_one(".message.warning")
+    if warning_message and warning_message.get_text(strip=True):
+        raise PacktPageError(warning_message.get_text(strip=True))
+    if soup.select_one(".message.error"):
+        raise PacktPageError("There are errors on the Packt page.  Try again after a while to see if "
+                             "they have been resolved.")
+
+    title = soup.select_one(".product__title")
+    img = soup.select_one(".product__img")
+    countdown = soup.select_one(".countdown__timer")
+
+    if not (title and title.get_text(strip=True) and img and img.get("src")):
+        raise ValueError("Book elements not found in the page HTML")
+
+    # Without the countdown the expiry would be a guess, so let the browser render it
+    if not (countdown and re.match(r"^\d+:\d{2}:\d{2}$", countdown.get_text(strip=True))):
+        raise ValueError("Countdown not found in the page HTML")
+
+    return PacktBook.from_countdown(title.get_text(strip=True), img["src"], countdown.get_text(strip=True))
 
-def grab_element(delay, elem_function, attr):
-    while delay:
+
+def scrape_selenium():
+    """
+    Loads the free learning page in the browser and scrapes the book of the day.
+
+    Returns:
+        (PacktBook) The scraped book
+
+    Raises:
+        PacktPageError: The page shows a warning or error, or the book elements could not be found
+    """
+    timings = {}
+
+    # Check out a browser for this thread only; it is shut down if it breaks while loading the page
+    with pool.driver(timeout=60) as driver:
+        # Explicit waits only, so nothing blocks on an element that is never going to show up
+        driver.implicitly_wait(0)
+
+        start = time.perf_counter()
+        driver.get(url)
+        timings["navigation"] = time.perf_counter() - start
+
+        # Wait until the book or a banner has rendered, checking the whole page at once
+        start = time.perf_counter()
         try:
-            if attr == "product__img":
-                elem = elem_function(attr)
-                text = elem.get_attribute("src")
-                if len(text) > 0:
-                    return text
-            else:
-                elem = elem_function(attr)
-                text = elem.text
-                if len(text) > 0:
-                    return text
-        except NoSuchElementException:
-            # returns here only on failure
-            return None
+            WebDriverWait(driver, render_timeout, poll_frequency=poll_frequency).until(
+                lambda d: page_is_ready(d.execute_script(extract_script)))
+        except TimeoutException:
+            # extract whatever is there, and let the checks below report it
+            pass
+        timings["render"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        elements = driver.execute_script(extract_script) or {}
+        timings["extraction"] = time.perf_counter() - start
+
+    for phase, seconds in timings.items():
+        metrics.record("packtbook.selenium.{}".format(phase), seconds)
+
+    log.debug("Packt page scraped", extra={"timings_ms": {k: round(v * 1000) for k, v in timings.items()}})
+
+    warning_message = elements.get("warning")
+    error_message = elements.get("error")
+    book_string = elements.get("title")
+    img_src = elements.get("image")
+    time_string = elements.get("countdown")
+
+    # Check to see if the warning message was present
+    if warning_message:
+        raise PacktPageError(warning_message)
+    elif error_message:
+        raise PacktPageError("There are errors on the Packt page.  Try again after a while to see if "
+                             "they have been resolved.")
+    # If any of the regular elements fail, tell the people to try again
+    elif not (book_string and img_src and time_string):
+        raise PacktPageError("I couldn't grab the correct page elements.  Try again in a few minutes.")
+
+    return PacktBook.from_countdown(book_string, img_src, time_string)
+
+
+def scrape_book():
+    """
+    Scrapes the book of the day using the cheapest strategy that works, falling back to the browser
+    only when the plain HTTP fetch fails. Latency and outcome are recorded per strategy in metrics.
+
+    Returns:
+        (PacktBook) The scraped book
+    """
+    for name, strategy in strategies:
+        try:
+            with metrics.timer("packtbook.fetch.{}".format(name)):
+                book = strategy()
+        except PacktPageError:
+            # the page itself says there is no book, so another strategy won't find one either
+            metrics.increment("packtbook.fetch.{}.success".format(name))
+            raise
+        except Exception as err:
+            metrics.increment("packtbook.fetch.{}.failure".format(name))
 
-        time.sleep(increment)
-        delay -= increment
+            # when the page is gone the browser would only render the same error page
+            if name == strategies[-1][0] or page_is_gone(err):
+                raise
+
+            log.warning("Packt %s fetch failed, falling back: %s", name, err)
+        else:
+            metrics.increment("packtbook.fetch.{}.success".format(name))
+
+            return book
+
+
+def page_is_gone(err):
+    """
+    Returns True if err is the HTTP error of a free learning page that doesn't exist anymore
+    """
+    return isinstance(err, requests.HTTPError) and err.response is not None and \
+        err.response.status_code in (404, 410)
+
+
+def format_time_left(seconds):
+    """
+    Formats a number of seconds as hours, minutes and seconds, e.g. "3 hours, 1 minute, and 5 seconds"
+    """
+    time_attrs = ["hours", "minutes", "seconds"]
+    time_split = [seconds // 3600, seconds % 3600 // 60, seconds % 60]
+    times_left = []
+
+    for ind, t in enumerate(time_split):
+        if t == 0:
+            # If there are no hours/etc, go ahead and skip it
+            pass
+        elif t == 1:
+            times_left.append("{} {}".format(t, time_attrs[ind][:-1]))
+        elif t > 1:
+            times_left.append("{} {}".format(t, time_attrs[ind]))
+
+    time_format = "{}"
+
+    if len(times_left) == 2:
+        time_format = "{} and {}"
+    elif len(times_left) == 3:
+        time_format = "{}, {}, and {}"
+
+    return time_format.format(*times_left)
+
+
+# Fetch strategies, cheapest first
+strategies = [("http", scrape_http), ("selenium", scrape_selenium)]
+
+# The book of the day is scraped in the background and answered from memory, see BookCache
+cache = BookCache(scrape_book)
+
+# Book requests are kept in memory and updated as users change them, see RequestMatcher
+matcher = RequestMatcher()
+matcher_reload_interval = 3600
+matcher_loaded = 0
+
+
+def load_matcher(bot):
+    """
+    Returns the book request matcher, (re)loading all requests from the database when missing or stale.
+    """
+    global matcher_loaded
+
+    if time.time() - matcher_loaded >= matcher_reload_interval:
+        # Gather all of the requests
+        req = bot.db_conn.find_documents(
+            {},
+            db=bot.db_conn.CONFIG["db"],
+            collection=bot.db_conn.CONFIG["collections"]["book_requests"],
+        )
+
+        matcher.load(req)
+        matcher_loaded = time.time()
+
+    return matcher
+
+
+def write_requests(bot, operations):
+    """
+    Applies changes to the book requests in a single round trip, then removes any words left without users.
+
+    The users arrays are only changed with $addToSet/$pull, so concurrent requests never overwrite each other.
+
+    Args:
+        bot: Reference to the bot, with a valid Mongo database connection
+        operations (list): UpdateOne/UpdateMany operations to apply
+    """
+    bot.db_conn.bulk_write(
+        operations + [DeleteMany({"users": {"$size": 0}})],
+        db=bot.db_conn.CONFIG["db"],
+        collection=bot.db_conn.CONFIG["collections"]["book_requests"],
+    )
+
+
+def coalesce(command):
+    """
+    Concurrent book lookups share one execution; request changes are per user and always run.
+    """
+    return separator_regex.findall(command)[1:2] != ["request"]
 
 
 def execute(command, user, bot):
     response = None
     attachment = None
-    delay = 10
-    time_attrs = ["hours", "minutes", "seconds"]
-    url = 'https://www.packtpub.com/packt/offers/free-learning/'
 
     # Split the given command here and set it all to lowercase
     split_command = separator_regex.findall(command)
@@ -72,33 +319,12 @@ def execute(command, user, bot):
                     # Gather the words, making sure there are no blanks
                     words = [x.lower() for x in split_command[3:] if not x.startswith("-")]
 
-                    # For each word given, remove the user from the word's entry in the collection
+                    # Remove the user from each word's entry in the collection
                     if len(words) > 0:
-                        req = bot.db_conn.find_documents(
-                            {"word": {"$in": words}},
-                            db=bot.db_conn.CONFIG["db"],
-                            collection=bot.db_conn.CONFIG["collections"]["book_requests"],
-                        )
-
-                        for word in req:
-                            if user in word["users"]:
-                                word["users"].remove(user)
-
-                                # Then check to see if the word's list is empty.  If so, remove it from the
-                                # collection
-                                if len(word["users"]) == 0:
-                                    bot.db_conn.delete_document(
-                                        {"word": word["word"]},
-                                        db=bot.db_conn.CONFIG["db"],
-                                        collection=bot.db_conn.CONFIG["collections"]["book_requests"]
-                                    )
-                                else:
-                                    bot.db_conn.update_document_by_oid(
-                                        word["_id"],
-                                        {"$set": {"users": word["users"]}},
-                                        db=bot.db_conn.CONFIG["db"],
-                                        collection=bot.db_conn.CONFIG["collections"]["book_requests"]
-                                    )
+                        write_requests(bot, [UpdateMany({"word": {"$in": words}}, {"$pull": {"users": user}})])
+
+                        for word in words:
+                            matcher.remove(word, user)
 
                         response = "I have deleted your request(s) for: " + ", ".join(words)
                     else:
@@ -107,64 +333,23 @@ def execute(command, user, bot):
                             "`@NoobSNHUbot packtbook request -d words, \"or phrases\", to, delete, here`  or:\n" \
                             "`@NoobSNHUbot packtbook request --delete words, \"or phrases\", to, delete, here`"
                 elif split_command[2] in ["-c", "--clear"]:
-                    req = bot.db_conn.find_documents(
-                        {"users": user},
-                        db=bot.db_conn.CONFIG["db"],
-                        collection=bot.db_conn.CONFIG["collections"]["book_requests"],
-                    )
+                    write_requests(bot, [UpdateMany({"users": user}, {"$pull": {"users": user}})])
 
-                    for word in req:
-                        if user in word["users"]:
-                            word["users"].remove(user)
-
-                            # Then check to see if the word's list is empty.  If so, remove it from the
-                            # collection
-                            if len(word["users"]) == 0:
-                                bot.db_conn.delete_document(
-                                    {"word": word["word"]},
-                                    db=bot.db_conn.CONFIG["db"],
-                                    collection=bot.db_conn.CONFIG["collections"]["book_requests"]
-                                )
-                            else:
-                                bot.db_conn.update_document_by_oid(
-                                    word["_id"],
-                                    {"$set": {"users": word["users"]}},
-                                    db=bot.db_conn.CONFIG["db"],
-                                    collection=bot.db_conn.CONFIG["collections"]["book_requests"]
-                                )
+                    matcher.clear(user)
 
                     response = "All of your requests have been cleared."
                 elif split_command[2] in ["-a", "--add"]:
                     # Gather the words, making sure there are no blanks
                     words = [x.lower() for x in split_command[2:] if not x.startswith("-")]
 
-                    # See if the words are already in the collection.  If they are, add the user to them if they aren't
-                    # there already.  If the words are not there, add them with an initial list of a single user.
+                    # Add the user to each word, creating the words that are not in the collection yet
+                    if len(words) > 0:
+                        write_requests(bot, [
+                            UpdateOne({"word": word}, {"$addToSet": {"users": user}}, upsert=True) for word in words
+                        ])
+
                     for word in words:
-                        req = bot.db_conn.find_document(
-                            {"word": word},
-                            db=bot.db_conn.CONFIG["db"],
-                            collection=bot.db_conn.CONFIG["collections"]["book_requests"],
-                        )
-
-                        if req:
-                            # Only add the user if they are not in there
-                            if user not in req["users"]:
-                                # Insert the user into the word
-                                req["users"].append(user)
-                                # Then update the document in the db
-                                bot.db_conn.update_document_by_oid(
-                                    req["_id"],
-                                    {"$set": {"users": req["users"]}},
-                                    db=bot.db_conn.CONFIG["db"],
-                                    collection=bot.db_conn.CONFIG["collections"]["book_requests"]
-                                )
-                        else:
-                            bot.db_conn.insert_document(
-                                {"word": word, "users": [user]},
-                                db=bot.db_conn.CONFIG["db"],
-                                collection=bot.db_conn.CONFIG["collections"]["book_requests"],
-                            )
+                        matcher.add(word, user)
 
                     if len(words) > 0:
                         response = "You have made a book request for: " + ", ".join(words)
@@ -204,87 +389,39 @@ def execute(command, user, bot):
     else:
         # Simple catch all error logic
         try:
-            # Set the driver to wait a little bit before assuming elements are not present, then grab the page:
-            driver.implicitly_wait(delay)
-            driver.get(url)
-
-            # Get the elements
-            warning_message = grab_element(2, driver.find_element_by_css_selector, ".message.warning")
-            error_message = grab_element(2, driver.find_element_by_css_selector, ".message.error")
-            book_string = grab_element(delay, driver.find_element_by_class_name, "product__title")
-            img_src = grab_element(delay, driver.find_element_by_class_name, "product__img")
-            time_string = grab_element(delay, driver.find_element_by_class_name, "countdown__timer")
-
-            # Check to see if the warning message was present
-            if warning_message:
-                response = warning_message
-            elif error_message:
-                response = "There are errors on the Packt page.  Try again after a while to see if " \
-                           "they have been resolved."
-            # If any of the regular elements fail, tell the people to try again.  If not, do the attachment
-            elif None in [book_string, img_src, time_string]:
-                response = "I couldn't grab the correct page elements.  Try again in a few minutes."
-            else:
-                tag_list = set()
+            # The book is prefetched in the background, so this normally doesn't touch the page at all
+            book = cache.get()
 
-                if bot.db_conn and "book_requests" in bot.db_conn.CONFIG["collections"]:
-                    # Gather all of the requests
-                    req = bot.db_conn.find_documents(
-                        {},
-                        db=bot.db_conn.CONFIG["db"],
-                        collection=bot.db_conn.CONFIG["collections"]["book_requests"],
-                    )
+            tag_list = set()
+
+            if bot.db_conn and "book_requests" in bot.db_conn.CONFIG["collections"]:
+                # Figure out if we have to tag anyone
+                tag_list = load_matcher(bot).match(book.title)
+
+            output = {
+                "pretext": f"The Packt Free Book of the Day is:",
+                "text": f"Come and get it!\n{', '.join([f'<@{x}>' for x in tag_list])}",
+                "title": book.title,
+                "title_link": url,
+                "footer": "There's still {} to get this book!".format(format_time_left(book.time_left())),
+                "color": "#ffca5b",
+                "image_url": "{}".format(book.image)
+            }
+
+            attachment = json.dumps([output])
 
-                    # Figure out if we have to tag anyone
-                    for word in req:
-                        if word["word"] in book_string.lower():
-                            tag_list.update(word["users"])
-
-                # Set the time here
-                time_split = [int(x) for x in time_string.split(":")]
-                times_left = []
-
-                for t in time_split:
-                    ind = time_split.index(t)
-                    if t == 0:
-                        # If there are no hours/etc, go ahead and skip it
-                        pass
-                    elif t == 1:
-                        times_left.append("{} {}".format(t, time_attrs[ind][:-1]))
-                    elif t > 1:
-                        times_left.append("{} {}".format(t, time_attrs[ind]))
-
-                time_format = "{}"
-
-                if len(times_left) == 2:
-                    time_format = "{} and {}"
-                elif len(times_left) == 3:
-                    time_format = "{}, {}, and {}"
-
-                time_left_string = time_format.format(*times_left)
-
-                output = {
-                    "pretext": f"The Packt Free Book of the Day is:",
-                    "text": f"Come and get it!\n{', '.join([f'<@{x}>' for x in tag_list])}",
-                    "title": book_string,
-                    "title_link": url,
-                    "footer": "There's still {} to get this book!".format(time_left_string),
-                    "color": "#ffca5b",
-                    "image_url": "{}".format(img_src)
-                }
-
-                attachment = json.dumps([output])
-
-        except HTTPError as err:
-            print(err)
+        except PacktPageError as err:
+            response = str(err)
+        except requests.HTTPError as err:
+            log.warning("Packt free book page unavailable: %s", err)
 
             response = "It appears that the free book page doesn't exist anymore.  Are they still giving away books?"
         except (TimeoutError, TimeoutException) as err:
-            print(err)
+            log.warning("Timed out getting the Packt free book: %s", err)
 
             response = "Looks like the operation timed out.  Please try again later."
         except Exception as err:
-            print(err)
+            log.exception("Unable to get the Packt free book: %s", err)
 
             response = 'I have failed my human overlords!\nYou should be able to find the Packt Free' \
                        ' Book of the day here: {}'.format(url)
@@ -1,39 +1,267 @@
 import re
 import json
+import threading
+import time
 
-from BotHelper import Catalog, Course
+from pymongo.errors import PyMongoError
+
+from BotHelper import Catalog, get_logger
+from BotHelper.CatalogIngest import CATALOG_DB, META_COLLECTION, SUBJECTS_COLLECTION, VERSION_ID
 #from BotHelper.HashTable import HashTable
 
+log = get_logger(__name__)
+
 command = "catalog"
 public = True
+coalesce = True
 disabled = False
 
+# The catalog is loaded once and kept in memory, then refreshed incrementally in the background
+# whenever the catalog version changes (see catalog_ingest.py), or every refresh_interval seconds
+refresh_interval = 3600
+version_check_interval = 60
+catalog = None
+last_loaded = 0
+last_checked = 0
+refresh_thread = None
+watch_thread = None
+watch_stop = threading.Event()
+
+# Optional location of an on-disk snapshot used to warm start the catalog, see warm_start()
+snapshot_path = None
+
+
+def get_catalog_version(db_conn):
+    """
+    Returns the current catalog version stored in the database, bumped by each ingest.
+    """
+    doc = db_conn.find_document(
+        {"_id": VERSION_ID},
+        db=CATALOG_DB,
+        collection=META_COLLECTION,
+    )
+
+    return doc.get("version", 0) if doc else 0
 
-def execute(command, user, bot):
-    global disabled
 
-    # Check if we're running with a database connection
-    if bot.db_conn:
-        # perform imports
-        bot_id = bot.id
+def refresh_catalog(db_conn):
+    """
+    Reloads the catalog from the database if its version changed or it is stale, and writes a new snapshot
+    if anything changed. The cached catalog is kept if the database can't be reached.
+    """
+    global catalog, last_loaded, last_checked
+
+    try:
+        version = get_catalog_version(db_conn)
+        last_checked = time.time()
+
+        if catalog is not None and catalog.version == version and time.time() - last_loaded < refresh_interval:
+            return catalog
 
         # get all documents
-        data = bot.db_conn.find_documents(
+        data = db_conn.find_documents(
             {},
-            db="catalog",
-            collection="subjects",
+            db=CATALOG_DB,
+            collection=SUBJECTS_COLLECTION,
         )
+    except PyMongoError as err:
+        log.error("Unable to load the catalog from the database: %s", err)
+        # try again at the next version check
+        last_checked = time.time()
+        return catalog
+
+    new_catalog = catalog or Catalog()
+    changes = new_catalog.load_documents(data)
+    new_catalog.version = version
+    catalog = new_catalog
+    last_loaded = time.time()
+
+    log.info("Catalog version %s loaded: %d course(s) re-indexed", version, changes)
+
+    if snapshot_path and changes:
+        try:
+            new_catalog.save(snapshot_path)
+        except OSError as err:
+            log.error("Unable to write catalog snapshot %s: %s", snapshot_path, err)
+
+    return new_catalog
+
+
+def start_refresh(db_conn):
+    """
+    Refreshes the catalog on a background thread, unless a refresh is already running.
+    """
+    global refresh_thread
+
+    if not (refresh_thread and refresh_thread.is_alive()):
+        refresh_thread = threading.Thread(target=refresh_catalog, args=(db_conn,))
+        refresh_thread.daemon = True
+        refresh_thread.start()
+
+    return refresh_thread
+
+
+def watch_version(db_conn):
+    """
+    Checks the catalog version every version_check_interval seconds on a background thread, reloading the
+    catalog when an ingest changed it, even while nobody uses the catalog command.
+    """
+    global watch_thread
+
+    if watch_thread and watch_thread.is_alive():
+        return watch_thread
+
+    watch_stop.clear()
+
+    def watch():
+        while not watch_stop.wait(version_check_interval):
+            # load_catalog may have checked in the meantime
+            if time.time() - last_checked >= version_check_interval:
+                start_refresh(db_conn).join()
+
+    watch_thread = threading.Thread(target=watch)
+    watch_thread.daemon = True
+    watch_thread.start()
+
+    return watch_thread
+
+
+def stop_watch():
+    """
+    Stops the background version check
+    """
+    watch_stop.set()
+
+    if watch_thread:
+        watch_thread.join()
+
+
+def warm_start(db_conn=None, path=None):
+    """
+    Loads the catalog from its snapshot file, if one exists, then starts a background refresh from the database
+    and the background version check. Intended to be called once when the bot starts.
+
+    Args:
+        db_conn: Reference to a valid Mongo database connection (can be None)
+        path (str): Location of the catalog snapshot file (can be None to disable snapshots)
+    """
+    global catalog, snapshot_path
 
-        # create Catalog using HashTable implementation
-        catalog = Catalog()
-        for subject in data:
-            course_data = {}
-            for course in subject['courses']:
-                course_data[course['id']] = Course(
-                    course['title'], course['description'], course['credits'], course['requisites'])
-            catalog.subjects[subject['title']] = course_data
-    else:
-        disabled = True
+    snapshot_path = path
+
+    if snapshot_path and catalog is None:
+        try:
+            start = time.perf_counter()
+            catalog = Catalog.load(snapshot_path)
+
+            log.info("Catalog snapshot loaded from %s in %.1fms", snapshot_path, (time.perf_counter() - start) * 1000)
+        except FileNotFoundError:
+            log.info("No catalog snapshot found at %s", snapshot_path)
+        except (OSError, ValueError) as err:
+            log.warning("Unable to load catalog snapshot %s: %s", snapshot_path, err)
+
+    if db_conn:
+        start_refresh(db_conn)
+        watch_version(db_conn)
+
+
+def load_catalog(bot):
+    """
+    Returns the cached catalog, loading it from the database when missing. The version is checked by
+    watch_version's thread; when that isn't running, it is checked here, in the background, at most every
+    version_check_interval seconds. Returns None when no catalog is available.
+    """
+    if bot.db_conn and time.time() - last_checked >= version_check_interval:
+        thread = start_refresh(bot.db_conn)
+
+        # Nothing to answer from yet, so wait for the first load
+        if catalog is None:
+            thread.join()
+
+    return catalog
+
+
+def build_course_attachment(course, course_data):
+    """
+    Builds the Slack attachment describing a single course.
+    """
+    attach = {
+        "title": "{}".format(course_data.title),
+        "fields": [
+            {
+                "title": "Description",
+                "value": "{}".format(course_data.description)
+            },
+            {
+                "title": "Course ID",
+                "value": "{}".format(course),
+                "short": "true"
+            },
+            {
+                "title": "Credits",
+                "value": "{}".format(course_data.credits),
+                "short": "true"
+            }
+        ],
+        "color": "#0a3370",  # notice the SNHU Color Scheme!
+        "footer": "Brought to you by SNHU",
+        "footer_icon": "https://www.snhu.edu/assets/SNHU/images/common/favicon.ico"
+    }
+
+    if course_data.requisites:
+        attach['fields'].append({
+            "title": "Requisites",
+            "value": "{}".format(course_data.requisites)
+        })
+
+    return attach
+
+
+def build_path_response(course, graph):
+    """
+    Builds the response listing every prerequisite of a course, grouped by the order they can be taken in.
+    """
+    prerequisites = graph.get_prerequisites(course, transitive=True)
+
+    if not prerequisites:
+        return "*{}* doesn't have any prerequisites. Dive right in!".format(course)
+
+    steps = {}
+    for req in prerequisites:
+        steps.setdefault(graph.get_level(req), []).append(req)
+
+    lines = ["{}. {}".format(i, ', '.join(reqs)) for i, reqs in enumerate(steps.values(), 1)]
+    lines.append("{}. *{}*".format(len(lines) + 1, course))
+
+    return "Here is the path to *{}*:\n{}".format(course, '\n'.join(lines))
+
+
+def build_unlocks_response(course, graph):
+    """
+    Builds the response listing the courses that a course is a prerequisite for.
+    """
+    direct = graph.get_unlocks(course)
+
+    if not direct:
+        return "*{}* isn't a prerequisite for any other courses.".format(course)
+
+    response = "*{}* is a prerequisite for: {}".format(course, ', '.join(direct))
+    later = [c for c in graph.get_unlocks(course, transitive=True) if c not in direct]
+
+    if later:
+        response += "\nFurther down the line, it also unlocks: {}".format(', '.join(later))
+
+    return response
+
+
+def execute(command, user, bot):
+    global disabled
+
+    bot_id = bot.id
+
+    # The catalog is available with a database connection, or from a snapshot without one
+    catalog = load_catalog(bot)
+    disabled = catalog is None
 
     default_response = "Sorry, I don't understand. Try `<@{}> catalog help` for more details.".format(
         bot_id) if not disabled else "I'm sorry. This command has been disabled because I'm currently running without a database connection."
@@ -48,7 +276,25 @@ def execute(command, user, bot):
 
         if len(requests) > 1:
             if requests[1].lower().startswith('help'):
-                response = "There's two ways I can help you:\n`catalog <Subject>` will return a list of course IDs for a given subject: `catalog Computer Science`\n`catalog <Course ID>` will give you details about a given course: `catalog CS499`\nYou can also feed me a list of up to three courses, and I'll try to find all of them: `catalog CS200 CS201 CS260`"
+                response = "Here's how I can help you:\n`catalog <Subject>` will return a list of course IDs for a given subject: `catalog Computer Science`\n`catalog <Course ID>` will give you details about a given course: `catalog CS499`\nYou can also feed me a list of up to three courses, and I'll try to find all of them: `catalog CS200 CS201 CS260`\n`catalog search <terms>` will find the courses that best match your terms: `catalog search recursion`\n`catalog path <Course ID>` will list every prerequisite you need to take first: `catalog path CS499`\n`catalog unlocks <Course ID>` will list the courses a course is a prerequisite for: `catalog unlocks CS200`"
+            elif requests[1].lower() == 'search':
+                terms = ' '.join(requests[2:])
+                results = catalog.search(terms) if terms else []
+
+                if results:
+                    attachment = json.dumps([build_course_attachment(course, course_data)
+                                             for course, course_data in results])
+                elif terms:
+                    response = "I couldn't find any courses matching *{}*.".format(terms)
+            elif requests[1].lower() in ('path', 'unlocks') and len(course_matches) > 0:
+                course = re.sub(r"[ -]", "", course_matches[0].upper())
+
+                if catalog.get_course(course) is None:
+                    response = "I couldn't find *{}* in the catalog.".format(course)
+                elif requests[1].lower() == 'path':
+                    response = build_path_response(course, catalog.graph)
+                else:
+                    response = build_unlocks_response(course, catalog.graph)
             elif len(course_matches) > 0:
                 # process course list
                 attachments = []
@@ -62,34 +308,7 @@ def execute(command, user, bot):
                     course_data = catalog.get_course(course)
 
                     if course_data:
-                        attach = {
-                            "title": "{}".format(course_data.title),
-                            "fields": [
-                                {
-                                    "title": "Description",
-                                    "value": "{}".format(course_data.description)
-                                },
-                                {
-                                    "title": "Course ID",
-                                    "value": "{}".format(course),
-                                    "short": "true"
-                                },
-                                {
-                                    "title": "Credits",
-                                    "value": "{}".format(course_data.credits),
-                                    "short": "true"
-                                }
-                            ],
-                            "color": "#0a3370",  # notice the SNHU Color Scheme!
-                            "footer": "Brought to you by SNHU",
-                            "footer_icon": "https://www.snhu.edu/assets/SNHU/images/common/favicon.ico"
-                        }
-
-                        if course_data.requisites:
-                            attach['fields'].append({
-                                "title": "Requisites",
-                                "value": "{}".format(course_data.requisites)
-                            })
+                        attach = build_course_attachment(course, course_data)
 
                         attachments.append(attach)
                     else:
@@ -4,12 +4,16 @@ import os
 import sys
 import smtplib
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import websocket._exceptions as ws_exceptions
-import yaml
 
+import cmds
 from Bot import Bot
-from BotHelper import MongoConn, Scheduler, SlackConn, output
+from BotHelper import (CollectorExporter, FileExporter, MetricsServer, MongoConn, Scheduler, SlackConn, get_logger,
+                       load_config, metrics, setup_logging, shutdown_logging, tracer)
+
+log = get_logger("noob_snhubot")
 
 
 def get_token(slack_config=None, slack_env_variable='SLACK_CLIENT'):
@@ -33,24 +37,6 @@ def get_token(slack_config=None, slack_env_variable='SLACK_CLIENT'):
         sys.exit("No environment variable {} defined. Exiting...".format(e))
 
 
-def load_config(config):
-    """
-    Process the YAML contents of a configuration file.
-    Exit's the program if an invalid file is passed.
-
-    Args:
-        config (str): Path of the configuration file to be processed
-
-    Returns:
-        Python object representing the YAML configuration
-    """
-    try:
-        with open(os.path.realpath(config), 'r') as f:
-            return yaml.load(f.read(), Loader=yaml.FullLoader)
-    except FileNotFoundError as e:
-        sys.exit("Could not find configuration file: {}".format(e.filename))
-
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='Launch the Noob SNHUBot application.')
@@ -82,6 +68,13 @@ if __name__ == "__main__":
         app_config = None
         bot_name = 'Noob SNHUbot'
 
+    # Log JSON lines from a background thread, so writing the log doesn't hold up the bot
+    # Per-command messages are sampled, 1 in log_sample_rate is written
+    if app_config:
+        setup_logging(app_config.get("log_level", "INFO"), sample_rate=app_config.get("log_sample_rate", 10))
+    else:
+        setup_logging("INFO", sample_rate=10)
+
     # Process Token
     if args.slack_config:
         token = get_token(slack_config=args.slack_config)
@@ -106,30 +99,58 @@ if __name__ == "__main__":
                           port=mc['port']
                           )
 
+    # Warm start the course catalog from its snapshot and refresh it from Mongo in the background
+    cmds.snhu_catalog.warm_start(mongo, app_config.get('catalog_snapshot') if app_config else None)
+
+    # Prefetch the Packt free book of the day in the background
+    cmds.packtbook.cache.start()
+
     # Setup Scheduler if config present
     if args.sched_config:
         sc = load_config(args.sched_config)
 
-        # Localize scheduler
+        # Localize scheduler, and keep its state between restarts if configured
         if app_config:
-            if "timezone" in app_config.keys():
-                scheduler = Scheduler(sc, app_config["timezone"])
-            else:
-                scheduler = Scheduler(sc)
+            scheduler = Scheduler(sc, app_config.get("timezone", "US/Eastern"),
+                                  state_path=app_config.get("schedule_state"),
+                                  catch_up=app_config.get("schedule_catch_up", "skip"))
+        else:
+            scheduler = Scheduler(sc)
+
+        # Pick up changes to the schedule without restarting
+        scheduler.watch_config(args.sched_config)
     else:
         scheduler = Scheduler()
 
+    # Serve metrics locally for Prometheus if a port is configured
+    if app_config and app_config.get("metrics_port"):
+        MetricsServer(app_config["metrics_port"]).start()
+
+    # Trace commands from the RTM event to the reply, to a file or a collector
+    if app_config and (app_config.get("trace_file") or app_config.get("trace_collector")):
+        if app_config.get("trace_collector"):
+            exporter = CollectorExporter(app_config["trace_collector"])
+        else:
+            exporter = FileExporter(app_config["trace_file"])
+
+        tracer.configure(exporter, sample_rate=app_config.get("trace_sample_rate", 1.0),
+                         slow_threshold=app_config.get("trace_slow_threshold"))
+
+    # Commands are executed on worker threads; identical commands running at once share one execution
+    command_pool = ThreadPoolExecutor(max_workers=8)
+    running = set()  # futures of the commands submitted to the pool and not checked yet
+
     # Primary Loop
     while True:
         if slack_client.rtm_connect(
                 with_team_state=False, auto_reconnect=True):
-            output("{} connected and running!".format(bot_name))
+            log.info("%s connected and running!", bot_name)
 
             # Instantiate Bot with user id from Web API method 'auth.test', and
             # slack and mongo connections
             bot = Bot(slack_client.api_call("auth.test")[
                       "user_id"], slack_client, scheduler, mongo)
-            output(f"Bot ID: {bot.id}")
+            log.info("Bot ID: %s", bot.id)
 
             # Log Connection
             if mongo:
@@ -150,27 +171,32 @@ if __name__ == "__main__":
                 # Exceptions: TimeoutError, ConnectionResetError,
                 # WebSocketConnectionClosedException
                 try:
-                    command, channel, user, msg_type = slack_client.parse_bot_commands(
-                        slack_client.rtm_read(), bot.id)
+                    with metrics.timer("stage.duration", stage="rtm_read"):
+                        events = slack_client.rtm_read()
+
+                    command, channel, user, msg_type = slack_client.parse_bot_commands(events, bot.id)
 
                     if command:
-                        slack_client.response_to_client(
-                            bot.handle_command(command, channel, user, msg_type))
+                        # run on a worker, so the RTM loop keeps reading while the command executes
+                        running.add(command_pool.submit(bot.respond_to_command, command, channel, user, msg_type,
+                                                        slack_client.trace))
+
+                    # a command that failed raises its exception here, to be handled below like it always was
+                    for future in [f for f in running if f.done()]:
+                        running.discard(future)
+                        future.result()
+
                     time.sleep(args.delay)
                 except TimeoutError as err:
-                    output("Timeout Error occurred.\n{}".format(err))
+                    log.warning("Timeout Error occurred: %s", err)
                 except ws_exceptions.WebSocketConnectionClosedException as err:
-                    output("Connection is closed.\n{}\n{}".format(
-                        err, *sys.exc_info()[0:]))
+                    log.warning("Connection is closed: %s", err, exc_info=True)
                     break
                 except ConnectionResetError as err:
-                    output("Connection has been reset.\n{}\n{}".format(
-                        err, *sys.exc_info()[0:]))
+                    log.warning("Connection has been reset: %s", err, exc_info=True)
                     break
                 except Exception as err:
-                    output("Something awful happened!")
-                    output(err)
-                    output("{}".format(*sys.exc_info()[0:]))
+                    log.critical("Something awful happened! %s", err, exc_info=True)
 
                     bot.cleanup_your_mess()
 
@@ -195,11 +221,11 @@ if __name__ == "__main__":
                             smtp_server.sendmail(app_config.get(
                                 'mail_user'), app_config.get('admin_emails'), email_text)
                         except Exception as err:
-                            output(
-                                "Something REALLY awful happened while processing an EMAIL! OH NO!")
-                            output(err)
-                            output("{}".format(*sys.exc_info()[0:]))
+                            log.critical("Something REALLY awful happened while processing an EMAIL! OH NO! %s",
+                                         err, exc_info=True)
 
+                    tracer.flush()
+                    shutdown_logging()
                     sys.exit()
 
                 # schedule tasks if the bot is running a scheduler
@@ -207,12 +233,11 @@ if __name__ == "__main__":
                     bot.scheduler.process_schedule(
                         bot.id, bot.commands, bot.handle_scheduled_command)
 
-                    # Execute clean up only when tasks have been scheduled
-                    if bot.scheduler.schedule:
-                        bot.scheduler.cleanup_sched()
-
         else:
-            output("Connection failed. Exception traceback printed above.")
+            log.error("Connection failed. Exception traceback printed above.")
             break
 
-        output("Reconnecting...")
+        log.info("Reconnecting...")
+
+    tracer.flush()
+    shutdown_logging()
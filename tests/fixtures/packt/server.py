@@ -0,0 +1,119 @@
+"""
+Serves synthetic Packt free learning pages locally, so the packtbook scraper can be tested and tuned without
+hitting the live site.
+
+The pages are hand-written, not captured from packtpub.com: they only reproduce the elements the scraper looks
+for (.product__title, .product__img, .countdown__timer and the .message banners), and the script in slow.html is
+made up. They show whether the scraper handles each scenario, not that it still matches the live page.
+
+Each scenario is served at /<scenario>/ (see SCENARIOS). Response latency can be simulated for every request,
+and the slow scenario renders its book client side after ?render_delay=N milliseconds.
+
+Usage:
+    python -m tests.fixtures.packt.server [port] [latency]
+"""
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    "book": "book.html",  # the book is in the served HTML
+    "warning": "warning.html",  # free learning is on a break
+    "error": "error.html",  # the page failed to load the offer
+    "slow": "slow.html",  # the book is rendered by script after a delay
+}
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PacktFixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        scenario = urlsplit(self.path).path.strip("/")
+        self.server.fixture.requests += 1
+
+        if self.server.fixture.latency:
+            time.sleep(self.server.fixture.latency)
+
+        if scenario not in SCENARIOS:
+            self.send_error(404)
+            return
+
+        with open(os.path.join(FIXTURE_DIR, SCENARIOS[scenario]), "rb") as f:
+            body = f.read()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep test and benchmark output clean
+        pass
+
+
+class PacktFixtureServer:
+    """
+    Runs the fixture server in a background thread.
+    """
+
+    def __init__(self, port=0, latency=0):
+        """
+        Args:
+            port (int): Port to listen on (default: any free port)
+            latency (float): Seconds to wait before answering each request
+        """
+        self.latency = latency
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), PacktFixtureHandler)
+        self.server.fixture = self
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def url(self, scenario="book"):
+        """
+        Returns: (str) URL of the given scenario's page
+        """
+        return "http://127.0.0.1:{}/{}/".format(self.port, scenario)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    fixture = PacktFixtureServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8000,
+                                 float(sys.argv[2]) if len(sys.argv) > 2 else 0)
+
+    print("Serving Packt fixtures on:")
+    for name in SCENARIOS:
+        print("  " + fixture.url(name))
+
+    try:
+        fixture.server.serve_forever()
+    except KeyboardInterrupt:
+        fixture.server.server_close()
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+import cmds
+from Bot import Bot
+from BotHelper import PacktBook, metrics
+from cmds import packtbook as cmd_packtbook
+from tests.unit.BotHelper.test_slack_conn import RecordingSlackConn
+
+
+class SlowCommand(object):
+    """
+    Stand-in for a slow command module that allows concurrent runs to share one execution
+    """
+    command = "slow"
+    public = True
+    coalesce = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, command, user, bot):
+        self.calls += 1
+        time.sleep(0.2)
+        return "Here you go ({})".format(command), None
+
+
+class ResponseRecordingSlack(RecordingSlackConn):
+    """
+    Records the responses sent to Slack instead of posting them
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+
+    def response_to_client(self, response):
+        self.responses.append(response)
+
+
+class TestBot(object):
+
+    def test_can_coalesce(self):
+        assert Bot.can_coalesce(cmds.snhu_catalog, "catalog CS499")
+        assert Bot.can_coalesce(cmds.packtbook, "packtbook")
+        assert not Bot.can_coalesce(cmds.packtbook, "packtbook request -a python")
+        assert not Bot.can_coalesce(cmds.roll, "roll 1d20")
+
+    def test_coalesced_commands_share_execution(self):
+        bot = Bot("UBOT", None, None)
+        module = SlowCommand()
+        cmds.slow = module
+        responses = {}
+
+        def run(user, command):
+            responses[user] = bot.execute_command(command, [("slow", "slow")], user)
+
+        try:
+            threads = [threading.Thread(target=run, args=("U{}".format(i), "slow  now")) for i in range(4)]
+            threads.append(threading.Thread(target=run, args=("U4", "slow later")))
+
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            del cmds.slow
+
+        # the four identical commands ran once, the different one separately
+        assert module.calls == 2
+        for user in ("U0", "U1", "U2", "U3"):
+            assert responses[user] == ("Here you go (slow  now)", None)
+        assert responses["U4"] == ("Here you go (slow later)", None)
+
+    def test_coalesced_mentions_of_others_are_kept(self, monkeypatch):
+        bot = Bot("UBOT", None, None)
+        bot.db_conn = type("RequestsDb", (object,), {"CONFIG": {"collections": {"book_requests": "book_requests"}}})
+        book = PacktBook("Learning Python", "https://example.com/cover.png", time.time() + 3600)
+
+        def slow_get():
+            time.sleep(0.2)
+            return book
+
+        # the leader is one of the users who asked to be tagged for this book
+        monkeypatch.setattr(cmd_packtbook, "matcher", cmd_packtbook.RequestMatcher())
+        monkeypatch.setattr(cmd_packtbook, "matcher_loaded", time.time())
+        monkeypatch.setattr(cmd_packtbook.cache, "get", slow_get)
+        cmd_packtbook.matcher.add("python", "ULEADER")
+
+        shared = metrics.counters.get("commands.shared", 0)
+        responses = {}
+
+        def run(user):
+            responses[user] = bot.execute_command("packtbook", [("packtbook", "packtbook")], user)
+
+        leader = threading.Thread(target=run, args=("ULEADER",))
+        follower = threading.Thread(target=run, args=("UFOLLOW",))
+        leader.start()
+        time.sleep(0.05)
+        follower.start()
+        leader.join()
+        follower.join()
+
+        assert metrics.counters["commands.shared"] == shared + 1
+        assert "<@ULEADER>" in responses["ULEADER"][1]
+        assert responses["UFOLLOW"] == responses["ULEADER"]
+
+    def test_command_duration_is_recorded(self):
+        bot = Bot("UBOT", None, None)
+        before = metrics.get_histogram("command.duration", command="my_name", outcome="ok")
+        count = before[-1][1] if before else 0
+
+        bot.execute_command("what's my name?", [("my_name", "what's my name?")], "U1")
+
+        assert metrics.get_histogram("command.duration", command="my_name", outcome="ok")[-1][1] == count + 1
+
+    def test_reconnect_replaces_onboarding(self):
+        slack = RecordingSlackConn()
+        first = Bot("UBOT", slack, None)
+        slack.team_join_handler("U1")
+
+        second = Bot("UBOT", slack, None)
+
+        assert first.onboarding.executor._shutdown
+        assert first.onboarding.timer is None
+        assert [user for user, _ in second.onboarding.pending] == ["U1"]
+        assert slack.onboarding is second.onboarding
+        assert slack.team_join_handler == second.onboarding.add
+
+        second.onboarding.shutdown()
+
+    def test_failed_command_is_reported(self, monkeypatch):
+        slack = ResponseRecordingSlack()
+        bot = Bot("UBOT", slack, None)
+
+        def fail(command, user, bot):
+            raise RuntimeError("the catalog exploded")
+
+        monkeypatch.setattr(cmds.my_name, "execute", fail)
+
+        try:
+            # the exception is passed on, for the main loop to alert the admins
+            with pytest.raises(RuntimeError, match="the catalog exploded"):
+                bot.respond_to_command("what's my name?", "C1", "U1", "message")
+        finally:
+            bot.onboarding.shutdown()
+
+        # and the user is told
+        assert [r.channel for r in slack.responses] == ["C1"]
+        assert slack.responses[0].message.startswith("Sorry <@U1>, something went wrong")
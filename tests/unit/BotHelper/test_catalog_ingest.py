@@ -0,0 +1,93 @@
+import io
+import json
+
+from BotHelper import CatalogIngest
+from BotHelper.CatalogIngest import normalize_course_id, read_csv, read_json
+
+RECORDS = [
+    {"subject": "Computer Science", "id": "cs-200", "title": "Data Structures",
+     "description": "Lists and trees.", "credits": "3 credits", "requisites": "CS100"},
+    {"subject": "Computer Science", "id": "CS 260", "title": "Algorithms",
+     "description": "Sorting, now with graphs.", "credits": "3 credits", "requisites": "CS200"},
+    {"subject": "Mathematics", "id": "MAT140", "title": "Precalculus",
+     "description": "Functions.", "credits": "3 credits", "requisites": None},
+    {"subject": "Mathematics", "id": "not a course", "title": "Broken"},
+]
+
+
+class IngestDb(object):
+    """
+    Minimal stand-in for MongoConn recording the writes made by an ingest
+    """
+
+    def __init__(self):
+        self.subjects = [
+            {"title": "Computer Science", "courses": [
+                {"id": "CS200", "title": "Data Structures", "description": "Lists and trees.",
+                 "credits": "3 credits", "requisites": "CS100"},
+                {"id": "CS260", "title": "Algorithms", "description": "Sorting.",
+                 "credits": "3 credits", "requisites": "CS200"},
+                {"id": "CS499", "title": "Capstone", "description": "Final project.",
+                 "credits": "3 credits", "requisites": "CS260"},
+            ]}
+        ]
+        self.batches = []
+        self.version = 4
+
+    def find_documents(self, query, db=None, collection=None):
+        return self.subjects
+
+    def bulk_write(self, requests, ordered=True, db=None, collection=None):
+        self.batches.append(requests)
+
+    def find_one_and_update(self, query, update, upsert=False, db=None, collection=None):
+        self.version += update["$inc"]["version"]
+        return {"_id": "version", "version": self.version}
+
+
+class TestCatalogIngest(object):
+
+    def test_normalize_course_id(self):
+        assert normalize_course_id("cs-499") == "CS499"
+        assert normalize_course_id(" ACC 201 ") == "ACC201"
+        assert normalize_course_id("CS49") is None
+        assert normalize_course_id(None) is None
+
+    def test_read_json_array(self):
+        text = json.dumps(RECORDS, indent=2)
+
+        # a tiny chunk size forces records to span several reads
+        assert list(read_json(io.StringIO(text), chunk_size=7)) == RECORDS
+
+    def test_read_json_lines(self):
+        text = "\n".join(json.dumps(r) for r in RECORDS) + "\n"
+
+        assert list(read_json(io.StringIO(text), chunk_size=5)) == RECORDS
+
+    def test_read_csv(self):
+        text = "subject,id,title,description,credits,requisites\n" \
+               "Mathematics,MAT140,Precalculus,Functions.,3 credits,\n"
+
+        assert list(read_csv(io.StringIO(text))) == [RECORDS[2]]
+
+    def test_run(self):
+        db = IngestDb()
+        stats = CatalogIngest(db, batch_size=2).run(RECORDS, prune=True)
+
+        assert stats["records"] == 4
+        assert stats["invalid"] == 1
+        assert stats["unchanged"] == 1
+        assert stats["added"] == 1
+        assert stats["updated"] == 1
+        assert stats["removed"] == 1
+        assert stats["version"] == 5
+        assert [len(b) for b in db.batches] == [2, 1]
+
+    def test_dry_run(self):
+        db = IngestDb()
+        stats = CatalogIngest(db, dry_run=True).run(RECORDS)
+
+        assert stats["written"] == 2
+        assert "version" not in stats
+        assert db.batches == []
+        assert db.version == 4
@@ -0,0 +1,154 @@
+import sys
+import threading
+
+import pytest
+
+from BotHelper import DriverPool
+
+
+class FakeDriver(object):
+    """
+    Stand-in for a WebDriver that records whether it was shut down
+    """
+
+    def __init__(self):
+        self.alive = True
+        self.responding = threading.Event()
+        self.responding.set()
+
+    @property
+    def current_url(self):
+        self.responding.wait()
+
+        if not self.alive:
+            raise ConnectionError("browser crashed")
+        return "about:blank"
+
+    def quit(self):
+        self.alive = False
+
+
+class TestDriverPool(object):
+
+    def get_pool(self, **kwargs):
+        started = []
+
+        def factory():
+            started.append(FakeDriver())
+            return started[-1]
+
+        return DriverPool(factory, **kwargs), started
+
+    def test_lazy_start(self):
+        pool, started = self.get_pool()
+
+        assert started == []
+
+        with pool.driver() as driver:
+            assert driver is started[0]
+
+        with pool.driver() as driver:
+            assert driver is started[0]
+
+        assert len(started) == 1
+
+    def test_recycle_after_max_uses(self):
+        pool, started = self.get_pool(max_uses=2)
+
+        for _ in range(3):
+            with pool.driver():
+                pass
+
+        assert len(started) == 2
+        assert not started[0].alive
+
+    def test_discard_broken(self):
+        pool, started = self.get_pool()
+
+        with pytest.raises(ValueError):
+            with pool.driver():
+                raise ValueError("page blew up")
+
+        assert not started[0].alive
+        assert len(pool) == 0
+
+    def test_restart_crashed(self):
+        pool, started = self.get_pool()
+
+        with pool.driver():
+            pass
+
+        started[0].alive = False
+
+        with pool.driver() as driver:
+            assert driver is started[1]
+
+    def test_exclusive_checkout(self):
+        pool, started = self.get_pool(size=1)
+        checked_out = pool.checkout()
+
+        with pytest.raises(TimeoutError):
+            pool.checkout(timeout=0.01)
+
+        thread = threading.Thread(target=pool.checkin, args=(checked_out,))
+        thread.start()
+
+        assert pool.checkout(timeout=5) is checked_out
+        thread.join()
+
+    def test_shutdown(self):
+        pool, started = self.get_pool()
+
+        with pool.driver():
+            pass
+
+        pool.shutdown()
+
+        assert not started[0].alive
+
+        with pytest.raises(RuntimeError):
+            pool.checkout()
+
+    def test_hung_driver_does_not_block_checkout(self):
+        pool, started = self.get_pool(size=2)
+
+        with pool.driver():
+            pass
+
+        started[0].responding.clear()
+        hung = threading.Thread(target=pool.checkout)
+        hung.start()
+
+        try:
+            # the other thread is stuck health checking the first driver, outside the lock
+            driver = pool.checkout(timeout=1)
+            assert driver is started[1]
+            pool.checkin(driver)
+        finally:
+            started[0].responding.set()
+            hung.join()
+
+    def test_recycle_reason(self, monkeypatch):
+        messages = []
+        log = sys.modules["BotHelper.DriverPool"].log
+        monkeypatch.setattr(log, "info", lambda msg, *args: messages.append(msg % args))
+
+        pool, started = self.get_pool(max_uses=2, max_memory_mb=100)
+        monkeypatch.setattr(pool, "memory_mb", lambda driver: 150 if driver is started[0] else 10)
+
+        with pool.driver():
+            pass
+
+        for _ in range(2):
+            with pool.driver():
+                pass
+
+        driver = pool.checkout()
+        pool.shutdown()
+        pool.checkin(driver)
+
+        assert messages == [
+            "Recycling WebDriver after reaching 150MB of memory",
+            "Recycling WebDriver after 2 uses",
+            "Recycling WebDriver after the pool was shut down",
+        ]
@@ -0,0 +1,107 @@
+import io
+import json
+import logging
+
+import pytest
+
+from BotHelper import SAMPLED, get_logger, output, setup_logging, shutdown_logging
+from BotHelper.Logger import log_manager
+
+
+class Expensive(object):
+    """
+    Counts how often it was turned into a string
+    """
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "expensive"
+
+
+class TestLogger(object):
+
+    @pytest.fixture(autouse=True)
+    def stream(self):
+        stream = io.StringIO()
+        setup_logging("INFO", stream, queue_size=100)
+        yield stream
+        shutdown_logging()
+        log_manager.logger.setLevel(logging.INFO)
+        log_manager.sampler.rate = 1
+
+    def lines(self, stream):
+        shutdown_logging()
+        return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_json_lines(self, stream):
+        get_logger("test").info("Hello %s", "world", extra={"user": "U123"})
+        output("Plain output")
+
+        first, second = self.lines(stream)
+
+        assert first["level"] == "INFO"
+        assert first["logger"] == "snhubot.test"
+        assert first["msg"] == "Hello world"
+        assert first["user"] == "U123"
+        assert second["logger"] == "snhubot.output"
+        assert second["msg"] == "Plain output"
+
+    def test_disabled_level_is_not_formatted(self, stream):
+        value = Expensive()
+
+        get_logger("test").debug("Payload: %s", value)
+
+        assert value.formatted == 0
+        assert self.lines(stream) == []
+
+    def test_sampling(self, stream):
+        log = get_logger("test.sampling")
+
+        for i in range(10):
+            log.info("Tick %d", i, extra={"sample": 5})
+        log.info("Not sampled")
+
+        lines = self.lines(stream)
+
+        assert [line["msg"] for line in lines] == ["Tick 0", "Tick 5", "Not sampled"]
+        assert lines[0]["sampled"] == 5
+
+    def test_hot_path_sampling(self, stream):
+        log = get_logger("test.hot_path")
+
+        log.info("Command %d", 0, extra=SAMPLED)
+        setup_logging("INFO", stream, sample_rate=3)
+
+        for i in range(1, 7):
+            log.info("Command %d", i, extra=SAMPLED)
+
+        # not sampled at the default rate of 1, then one in three
+        assert [line["msg"] for line in self.lines(stream)] == ["Command 0", "Command 1", "Command 4"]
+
+    def test_exception(self, stream):
+        try:
+            raise ValueError("bad value")
+        except ValueError:
+            get_logger("test").exception("Failed")
+
+        line = self.lines(stream)[0]
+
+        assert line["level"] == "ERROR"
+        assert "ValueError: bad value" in line["exc"]
+
+    def test_full_queue_drops_records(self, stream):
+        setup_logging("INFO", stream, queue_size=1)
+        log_manager.listener.stop()  # nothing drains the queue
+
+        log = get_logger("test")
+        for i in range(5):
+            log.info("Record %d", i)
+
+        log_manager.listener.start()
+        lines = self.lines(stream)
+
+        assert lines[0]["msg"] == "Record 0"
+        assert lines[-1]["msg"] == "Dropped 4 log record(s), the log queue was full"
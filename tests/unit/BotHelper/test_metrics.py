@@ -0,0 +1,70 @@
+from urllib.request import urlopen
+
+import pytest
+
+from BotHelper import Histogram, Metrics, MetricsServer
+
+
+class TestMetrics(object):
+
+    def test_histogram_buckets(self):
+        histogram = Histogram((0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        assert histogram.cumulative() == [(0.1, 2), (1.0, 3), (float("inf"), 4)]
+        assert histogram.count == 4
+        assert histogram.sum == pytest.approx(2.65)
+
+    def test_labeled_series(self):
+        metrics = Metrics()
+
+        metrics.record("command.duration", 0.2, command="roll", outcome="ok")
+        metrics.record("command.duration", 0.3, command="roll", outcome="ok")
+        metrics.record("command.duration", 4.0, command="packtbook", outcome="error")
+        metrics.increment("sent", channel="C1")
+        metrics.increment("sent", channel="C2")
+
+        # the unlabeled summaries cover every series
+        assert metrics.get_timing("command.duration")["count"] == 3
+        assert metrics.counters["sent"] == 2
+
+        assert metrics.get_histogram("command.duration", command="roll", outcome="ok")[-1] == (float("inf"), 2)
+        assert metrics.get_histogram("command.duration", outcome="error", command="packtbook")[-1][1] == 1
+        assert metrics.get_histogram("command.duration", command="help", outcome="ok") is None
+
+    def test_render_prometheus(self):
+        metrics = Metrics(buckets=(0.5,))
+
+        metrics.increment("packtbook.fetch.http.success")
+        metrics.record("stage.duration", 0.25, stage="rtm_read")
+        metrics.record("stage.duration", 1.0, stage='post "message"')
+
+        assert metrics.render_prometheus().splitlines() == [
+            '# TYPE snhubot_packtbook_fetch_http_success_total counter',
+            'snhubot_packtbook_fetch_http_success_total 1',
+            '# TYPE snhubot_stage_duration_seconds histogram',
+            'snhubot_stage_duration_seconds_bucket{stage="post \\"message\\"",le="0.5"} 0',
+            'snhubot_stage_duration_seconds_bucket{stage="post \\"message\\"",le="+Inf"} 1',
+            'snhubot_stage_duration_seconds_sum{stage="post \\"message\\""} 1.0',
+            'snhubot_stage_duration_seconds_count{stage="post \\"message\\""} 1',
+            'snhubot_stage_duration_seconds_bucket{stage="rtm_read",le="0.5"} 1',
+            'snhubot_stage_duration_seconds_bucket{stage="rtm_read",le="+Inf"} 1',
+            'snhubot_stage_duration_seconds_sum{stage="rtm_read"} 0.25',
+            'snhubot_stage_duration_seconds_count{stage="rtm_read"} 1',
+        ]
+
+    def test_metrics_server(self):
+        metrics = Metrics()
+        metrics.increment("scraped")
+
+        server = MetricsServer(port=0, metrics=metrics)
+        server.start()
+
+        try:
+            with urlopen("http://127.0.0.1:{}/metrics".format(server.port)) as response:
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                assert "snhubot_scraped_total 1" in response.read().decode("utf-8")
+        finally:
+            server.stop()
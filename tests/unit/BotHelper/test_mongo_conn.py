@@ -0,0 +1,72 @@
+import threading
+
+from BotHelper.MongoConn import MongoConn
+
+
+class FakeCollection(object):
+
+    def __init__(self, name, release=None):
+        self.name = name
+        self.release = release
+
+    def find_one(self, query):
+        if self.release is not None:
+            self.release.wait(2)
+
+        return {"collection": self.name}
+
+
+class FakeDatabase(object):
+
+    def __init__(self, name, release):
+        self.name = name
+        self.release = release
+
+    def __getitem__(self, collection):
+        return FakeCollection("{}.{}".format(self.name, collection), self.release.get(collection))
+
+
+class FakeClient(object):
+
+    def __init__(self, release):
+        self.release = release
+
+    def __getitem__(self, db):
+        return FakeDatabase(db, self.release)
+
+
+class TestMongoConn(object):
+
+    def get_conn(self, release=None):
+        conn = MongoConn.__new__(MongoConn)
+        conn.client = FakeClient(release or {})
+        conn.use_db("snhubot")
+        conn.use_collection("cmds")
+        conn.CONFIG = {}
+
+        return conn
+
+    def test_per_call_collection(self):
+        conn = self.get_conn()
+
+        assert conn.find_document({}, db="catalog", collection="subjects") == {"collection": "catalog.subjects"}
+        # the shared connection keeps its own db and collection
+        assert conn.collection.name == "snhubot.cmds"
+        assert conn.find_document({}) == {"collection": "snhubot.cmds"}
+
+    def test_calls_do_not_wait_for_each_other(self):
+        release = threading.Event()
+        conn = self.get_conn({"slow": release})
+        results = []
+
+        slow = threading.Thread(target=lambda: results.append(conn.find_document({}, collection="slow")))
+        slow.start()
+
+        # a query on another collection is answered while the slow one is still running
+        assert conn.find_document({}, collection="fast") == {"collection": "snhubot.fast"}
+        assert slow.is_alive()
+
+        release.set()
+        slow.join()
+
+        assert results == [{"collection": "snhubot.slow"}]
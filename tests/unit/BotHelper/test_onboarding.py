@@ -0,0 +1,138 @@
+import threading
+import time
+
+from BotHelper import Onboarding, metrics
+
+
+class FakeSlack(object):
+    """
+    Records the onboarding API calls, failing im.open for users starting with "BAD" and raising for users
+    starting with "ERR"
+    """
+
+    def __init__(self, ratelimited=0):
+        self.calls = []
+        self.ratelimited = ratelimited
+        self.lock = threading.Lock()
+
+    def api_call(self, method, **kwargs):
+        with self.lock:
+            self.calls.append((time.time(), method, kwargs))
+
+            if method == "im.open" and self.ratelimited:
+                self.ratelimited -= 1
+                return {"ok": False, "error": "ratelimited", "headers": {"Retry-After": "0.01"}}
+
+        if method == "im.open":
+            if kwargs["user"].startswith("ERR"):
+                raise ConnectionError("Connection reset by peer")
+
+            if kwargs["user"].startswith("BAD"):
+                return {"ok": False, "error": "user_not_found"}
+
+            return {"ok": True, "channel": {"id": "D" + kwargs["user"]}}
+
+        return {"ok": True}
+
+
+class TestOnboarding(object):
+
+    def test_batch_renders_once(self):
+        slack = FakeSlack()
+        renders = []
+
+        def render():
+            renders.append(1)
+            return "Welcome <@{user}>!"
+
+        onboarding = Onboarding(slack, render, window=0.1, rate=1000)
+        count = metrics.get_timing("onboarding.latency")["count"] if "onboarding.latency" in metrics.timings else 0
+
+        for user in ("U1", "U2", "U3", "BAD1"):
+            onboarding.add(user)
+
+        timer = onboarding.timer
+        timer.join()
+
+        posts = sorted((kwargs["channel"], kwargs["text"]) for _, method, kwargs in slack.calls
+                       if method == "chat.postMessage")
+
+        assert len(renders) == 1
+        assert posts == [("DU1", "Welcome <@U1>!"), ("DU2", "Welcome <@U2>!"), ("DU3", "Welcome <@U3>!")]
+        assert metrics.get_timing("onboarding.latency")["count"] == count + 3
+        assert onboarding.timer is None and not onboarding.pending
+
+    def test_rate_limit(self):
+        slack = FakeSlack()
+        onboarding = Onboarding(slack, lambda: "Hi <@{user}>", window=0.1, rate=20)
+
+        for user in ("U1", "U2", "U3", "U4", "U5"):
+            onboarding.add(user)
+
+        timer = onboarding.timer
+        timer.join()
+
+        opened = sorted(t for t, method, _ in slack.calls if method == "im.open")
+
+        assert len(opened) == 5
+        # five calls at 20 per second are spread over at least 0.2s
+        assert opened[-1] - opened[0] >= 0.19
+
+    def test_retry_when_ratelimited(self):
+        slack = FakeSlack(ratelimited=1)
+        onboarding = Onboarding(slack, lambda: "Hi <@{user}>", window=0.1, rate=1000)
+
+        onboarding.add("U1")
+
+        timer = onboarding.timer
+        timer.join()
+
+        assert [method for _, method, _ in slack.calls] == ["im.open", "im.open", "chat.postMessage"]
+
+    def test_shutdown_hands_over_pending(self):
+        slack = FakeSlack()
+        onboarding = Onboarding(slack, lambda: "Hi <@{user}>", window=10, rate=1000)
+
+        onboarding.add("U1", joined=123.0)
+        timer = onboarding.timer
+
+        assert onboarding.shutdown() == [("U1", 123.0)]
+        timer.join(1)
+
+        assert not timer.is_alive()
+        assert slack.calls == []
+        assert onboarding.executor._shutdown
+
+    def test_exception_is_counted_per_user(self):
+        slack = FakeSlack()
+        onboarding = Onboarding(slack, lambda: "Hi <@{user}>", window=10, rate=1000)
+        failures = metrics.counters.get("onboarding.failure", 0)
+
+        onboarding.add("ERR1")
+        onboarding.add("U1")
+        onboarding.timer.cancel()
+
+        # the failure doesn't escape flush, and the other users are still greeted
+        onboarding.flush()
+
+        posts = [kwargs["channel"] for _, method, kwargs in slack.calls if method == "chat.postMessage"]
+
+        assert posts == ["DU1"]
+        assert metrics.counters["onboarding.failure"] == failures + 1
+
+    def test_shutdown_while_flushing(self):
+        slack = FakeSlack()
+
+        def render():
+            # shut down after the batch was taken from pending, before it is handed to the executor
+            assert onboarding.shutdown() == []
+            return "Hi <@{user}>"
+
+        onboarding = Onboarding(slack, render, window=10, rate=1000)
+        onboarding.add("U1")
+        onboarding.timer.cancel()
+        onboarding.flush()
+
+        posts = [kwargs["channel"] for _, method, kwargs in slack.calls if method == "chat.postMessage"]
+
+        assert posts == ["DU1"]
@@ -0,0 +1,43 @@
+import time
+
+from BotHelper import BookCache, PacktBook
+
+
+class TestBookCache(object):
+
+    def get_cache(self, time_left):
+        fetches = []
+
+        def fetch():
+            fetches.append(time.time())
+            return PacktBook("Book {}".format(len(fetches)), "cover.png", time.time() + time_left)
+
+        return BookCache(fetch, refresh_interval=3600, expiry_margin=60), fetches
+
+    def test_from_countdown(self):
+        book = PacktBook.from_countdown("Book", "cover.png", "01:02:03")
+
+        assert 3722 <= book.time_left() <= 3723
+
+    def test_get_cached(self):
+        cache, fetches = self.get_cache(600)
+
+        assert cache.get().title == "Book 1"
+        assert cache.get().title == "Book 1"
+        assert len(fetches) == 1
+
+    def test_get_expired(self):
+        cache, fetches = self.get_cache(-1)
+
+        assert cache.get().title == "Book 1"
+        assert cache.get().title == "Book 2"
+
+    def test_next_refresh(self):
+        cache, _ = self.get_cache(600)
+
+        assert cache.next_refresh() == cache.retry_interval
+
+        cache.get()
+
+        # refreshed just after the offer expires, rather than at the regular interval
+        assert 659 <= cache.next_refresh() <= 660
@@ -0,0 +1,56 @@
+from BotHelper import AhoCorasick, RequestMatcher
+
+
+class TestRequestMatcher(object):
+
+    def get_matcher(self):
+        matcher = RequestMatcher()
+        matcher.load([
+            {"word": "python", "users": ["U1"]},
+            {"word": "java", "users": ["U2"]},
+            {"word": "machine learning", "users": ["U3"]},
+            {"word": "c++", "users": ["U4"]},
+            {"word": ".net", "users": ["U5"]},
+            {"word": "empty", "users": []},
+        ])
+
+        return matcher
+
+    def test_automaton_overlapping(self):
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+        assert sorted(automaton.find("ushers")) == [(1, "she"), (2, "he"), (2, "hers")]
+
+    def test_automaton_remove(self):
+        automaton = AhoCorasick(["he", "she"])
+        automaton.remove("he")
+
+        assert list(automaton.find("she")) == [(0, "she")]
+
+    def test_match_words(self):
+        matcher = self.get_matcher()
+
+        assert matcher.match("Learning Python: Fourth Edition") == {"U1"}
+        assert matcher.match("Hands-On Machine Learning with Python") == {"U1", "U3"}
+
+    def test_match_word_boundaries(self):
+        matcher = self.get_matcher()
+
+        assert matcher.match("JavaScript: The Good Parts") == set()
+        assert matcher.match("Modern C++ Programming") == {"U4"}
+        assert matcher.match("ASP.NET Core in Action") == {"U5"}
+        assert matcher.match("Learning Javanese") == set()
+
+    def test_incremental_updates(self):
+        matcher = self.get_matcher()
+
+        matcher.add("javascript", "U2")
+        assert matcher.match("JavaScript: The Good Parts") == {"U2"}
+
+        matcher.remove("python", "U1")
+        assert matcher.match("Learning Python") == set()
+
+        matcher.add("python", "U6")
+        matcher.clear("U6")
+        assert matcher.match("Learning Python") == set()
+        assert "python" not in matcher.requests
@@ -0,0 +1,25 @@
+from BotHelper import Response, split_message
+
+
+class TestResponse(object):
+
+    def test_get_messages(self):
+        assert Response("C123", "Hello!").get_messages() == ["Hello!"]
+        assert Response("C123", ["Part 1", "Part 2"]).get_messages() == ["Part 1", "Part 2"]
+
+    def test_split_message(self):
+        lines = ["line {:03}".format(i) for i in range(100)]
+        messages = list(split_message(lines, limit=100))
+
+        assert all(len(message) <= 100 for message in messages)
+        assert "\n".join(messages) == "\n".join(lines)
+        assert len(messages) == 10
+
+    def test_split_message_long_line(self):
+        messages = list(split_message(["short", "x" * 25, "end"], limit=10))
+
+        assert messages == ["short", "x" * 10, "x" * 10, "xxxxx\nend"]
+
+    def test_split_message_single(self):
+        assert list(split_message(["one", "two"])) == ["one\ntwo"]
+        assert list(split_message([])) == []
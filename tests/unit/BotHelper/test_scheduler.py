@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+import yaml
+
+from BotHelper import Scheduler, load_config
+
+
+class TestScheduler(object):
+
+    def test_fires_in_order_on_one_thread(self):
+        scheduler = Scheduler()
+        fired = []
+        done = threading.Event()
+
+        def handle(command, channel, user, msg_type, args=None):
+            fired.append(command)
+            if len(fired) == 20:
+                done.set()
+
+        threads = threading.active_count()
+        now = time.time()
+
+        # scheduled out of order, so the heap has to sort them
+        for i in reversed(range(20)):
+            scheduler.schedule_cmd("cmd{:02}".format(i), "C123", now + 0.1 + i * 0.01, handle, "UBOT")
+
+        # one timer thread, no matter how many tasks are waiting
+        assert threading.active_count() == threads + 1
+        assert scheduler.get_num_of_tasks() == 20
+
+        assert done.wait(5)
+        assert fired == ["cmd{:02}".format(i) for i in range(20)]
+
+        scheduler.stop()
+
+    def test_earlier_task_wakes_timer(self):
+        scheduler = Scheduler()
+        fired = threading.Event()
+
+        scheduler.schedule_cmd("later", "C123", time.time() + 3600, lambda *args: None, "UBOT")
+        scheduler.schedule_cmd("roll", "C123", time.time() + 0.05, lambda *args: fired.set(), "UBOT", args="1d20")
+
+        assert fired.wait(2)
+        assert scheduler.has_task("later")
+
+        scheduler.stop()
+
+    def test_finished_tasks_are_removed(self):
+        scheduler = Scheduler()
+
+        def handle(*args):
+            raise ValueError("tasks that fail are still removed")
+
+        scheduler.schedule_cmd("roll", "C123", time.time() + 0.05, handle, "UBOT")
+        scheduler.schedule_cmd("later", "C123", time.time() + 3600, lambda *args: None, "UBOT")
+
+        deadline = time.time() + 5
+        while scheduler.has_task("roll"):
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        assert "roll" not in scheduler.tasks
+        assert scheduler.has_task("later")
+        assert scheduler.get_num_of_tasks() == 1
+
+        scheduler.stop()
+
+    def test_duplicate_and_exact_matching(self):
+        scheduler = Scheduler()
+        fire_time = time.time() + 3600
+
+        scheduler.schedule_cmd("packtbook", "C123", fire_time, lambda *args: None, "UBOT")
+        scheduler.schedule_cmd("packtbook", "C123", fire_time, lambda *args: None, "UBOT")
+        scheduler.schedule_cmd("packtbook", "C456", fire_time, lambda *args: None, "UBOT")
+
+        assert scheduler.get_num_of_tasks() == 2
+        assert scheduler.has_task("packtbook", fire_time, "C456")
+        assert not scheduler.has_task("packtbook", fire_time, "C789")
+        assert not scheduler.has_task("packtbook", fire_time + 60)
+        # the command name is matched exactly, not as a substring of the arguments
+        assert not scheduler.has_task("packt")
+        assert not scheduler.has_task("C123")
+
+        scheduler.remove_task(("packtbook", "C123", fire_time))
+        assert scheduler.get_num_of_tasks() == 1
+
+        scheduler.stop()
+
+    def test_process_schedule_caches_next_run(self):
+        config = {
+            "packtbook": {"args": "", "channel": "C123", "schedule": "* * * * *"},
+            "roll": {"args": "1d20", "channel": "C456", "schedule": "0 0 1 1 *"},
+            "unknown": {"args": "", "channel": "C789", "schedule": "* * * * *"},
+        }
+        scheduler = Scheduler(config)
+        commands = ["packtbook", "roll"]
+
+        scheduler.process_schedule("UBOT", commands, lambda *args: None, schedule_delay=0)
+        assert set(scheduler.entries) == {"packtbook", "roll"}
+        assert scheduler.next_due == scheduler.entries["packtbook"]["next"]
+        assert scheduler.next_due % 60 == 0
+
+        # every minute is within a 60 second delay; the next run is advanced once it has been queued
+        first = scheduler.entries["packtbook"]["next"]
+        scheduler.process_schedule("UBOT", commands, lambda *args: None, schedule_delay=60)
+        scheduler.process_schedule("UBOT", commands, lambda *args: None, schedule_delay=60)
+
+        assert scheduler.has_task("packtbook", first)
+        assert scheduler.get_num_of_tasks() == 1
+        assert scheduler.entries["packtbook"]["next"] == first + 60
+        assert scheduler.next_due == first + 60
+
+        scheduler.stop()
+
+    def test_config_change_recompiles(self):
+        scheduler = Scheduler({"roll": {"args": "1d20", "channel": "C456", "schedule": "0 0 1 1 *"}})
+
+        scheduler.process_schedule("UBOT", ["roll", "packtbook"], lambda *args: None)
+        assert set(scheduler.entries) == {"roll"}
+
+        scheduler.CONFIG = {"packtbook": {"args": "", "channel": "C123", "schedule": "30 20 * * *"}}
+        scheduler.process_schedule("UBOT", ["roll", "packtbook"], lambda *args: None)
+        assert set(scheduler.entries) == {"packtbook"}
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition():
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+    def test_state_prevents_second_delivery(self, tmp_path):
+        state_path = str(tmp_path / "schedule.json")
+        fire_time = time.time() + 0.05
+        fired = []
+
+        scheduler = Scheduler(state_path=state_path)
+        scheduler.schedule_cmd("packtbook", "C123", fire_time, lambda *args: fired.append(args), "UBOT")
+        self.wait_for(lambda: not scheduler.has_task("packtbook"))
+        scheduler.stop()
+
+        assert len(fired) == 1
+        with open(state_path) as f:
+            assert json.load(f) == {"last_fired": {"packtbook": fire_time}}
+
+        # after a restart, the same run is queued again, but not delivered again
+        restarted = Scheduler(state_path=state_path)
+        restarted.schedule_cmd("packtbook", "C123", fire_time, lambda *args: fired.append(args), "UBOT")
+        self.wait_for(lambda: not restarted.has_task("packtbook"))
+        restarted.stop()
+
+        assert len(fired) == 1
+
+    @pytest.mark.parametrize("policy, expected", [("skip", 0), ("once", 1), ("all", 3)])
+    def test_catch_up_policies(self, tmp_path, policy, expected):
+        state_path = str(tmp_path / "schedule.json")
+        last_minute = time.time() // 60 * 60
+
+        # the bot was down for the last three runs of a job scheduled every minute
+        with open(state_path, "w") as f:
+            json.dump({"last_fired": {"roll": last_minute - 180}}, f)
+
+        fired = []
+        config = {"roll": {"args": "1d20", "channel": "C123", "schedule": "* * * * *"}}
+        scheduler = Scheduler(config, state_path=state_path, catch_up=policy)
+        scheduler.process_schedule("UBOT", ["roll"], lambda *args: fired.append(args), schedule_delay=0)
+
+        self.wait_for(lambda: scheduler.get_num_of_tasks() == 0)
+        scheduler.stop()
+
+        assert len(fired) == expected
+        if expected:
+            assert scheduler.last_fired["roll"] == last_minute
+
+    def test_unknown_catch_up_policy(self):
+        with pytest.raises(ValueError):
+            Scheduler(catch_up="sometimes")
+
+    def test_channel_list(self):
+        fired = []
+        config = {
+            "packtbook": {"args": "", "channel": ["C123", "C456", "C789"], "schedule": "* * * * *"},
+            "roll": {"args": "1d20", "channel": ["C123"], "schedule": "* * * * *"},
+        }
+        scheduler = Scheduler(config)
+        scheduler.process_schedule("UBOT", ["packtbook", "roll"], lambda *args: fired.append(args),
+                                   schedule_delay=60)
+
+        # one task per job, no matter how many channels it posts to
+        assert scheduler.get_num_of_tasks() == 2
+        assert scheduler.has_task("packtbook", channel=("C123", "C456", "C789"))
+        assert scheduler.has_task("roll", channel="C123")
+
+        scheduler.stop()
+
+    def write_config(self, path, config, mtime):
+        with open(path, "w") as f:
+            yaml.dump(config, f)
+
+        # make sure the change is noticed even within the file system's timestamp resolution
+        os.utime(path, (mtime, mtime))
+
+    def test_hot_reload(self, tmp_path):
+        config_path = str(tmp_path / "schedule.yml")
+        config = {
+            "packtbook": {"args": "", "channel": "C123", "schedule": "* * * * *"},
+            "roll": {"args": "1d20", "channel": "C456", "schedule": "* * * * *"},
+            "help": {"args": "", "channel": "C789", "schedule": "0 0 1 1 *"},
+        }
+        commands = ["packtbook", "roll", "help", "my name"]
+        self.write_config(config_path, config, 1000)
+
+        scheduler = Scheduler(load_config(config_path))
+        scheduler.watch_config(config_path, interval=0)
+        scheduler.process_schedule("UBOT", commands, lambda *args: None, schedule_delay=60)
+
+        assert scheduler.get_num_of_tasks() == 2
+        packtbook, help_entry = scheduler.entries["packtbook"], scheduler.entries["help"]
+
+        # change roll, remove help, add my name; packtbook is untouched
+        config["roll"]["args"] = "2d6"
+        del config["help"]
+        config["my name"] = {"args": "", "channel": "C123", "schedule": "0 0 1 1 *"}
+        self.write_config(config_path, config, 2000)
+
+        scheduler.process_schedule("UBOT", commands, lambda *args: None, schedule_delay=60)
+
+        assert set(scheduler.entries) == {"packtbook", "roll", "my name"}
+        assert scheduler.entries["packtbook"] is packtbook
+        assert help_entry not in scheduler.entries.values()
+        assert scheduler.has_task("packtbook")
+        # the pending roll task was cancelled and rescheduled with the new arguments
+        assert [task["arguments"][4] for key, task in scheduler.schedule.items() if key[0] == "roll"] == ["2d6"]
+
+        scheduler.stop()
+
+    def test_hot_reload_invalid_config(self, tmp_path):
+        config_path = str(tmp_path / "schedule.yml")
+        config = {"roll": {"args": "1d20", "channel": "C456", "schedule": "0 0 1 1 *"}}
+        self.write_config(config_path, config, 1000)
+
+        scheduler = Scheduler(load_config(config_path))
+        scheduler.watch_config(config_path, interval=0)
+        scheduler.process_schedule("UBOT", ["roll"], lambda *args: None)
+
+        self.write_config(config_path, {"roll": {"args": "1d20", "channel": "C456", "schedule": "every day"}}, 2000)
+        scheduler.process_schedule("UBOT", ["roll"], lambda *args: None)
+
+        assert scheduler.CONFIG == config
+        assert scheduler.validate_config({"roll": {"schedule": "every day"}}) == [
+            "roll: no channel", "roll: invalid schedule 'every day'"]
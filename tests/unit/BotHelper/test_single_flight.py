@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from BotHelper import SingleFlight
+
+
+class TestSingleFlight(object):
+
+    def run_concurrently(self, flight, key, function, callers=5):
+        results = [None] * callers
+
+        def caller(i):
+            try:
+                results[i] = flight.do(key, function)
+            except Exception as err:
+                results[i] = err
+
+        threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        return results
+
+    def test_shares_result(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow():
+            calls.append(1)
+            release.wait(2)
+            return "book"
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        results = self.run_concurrently(flight, "packtbook", slow)
+
+        assert len(calls) == 1
+        assert sorted(results) == [("book", False)] + [("book", True)] * 4
+        assert not flight.calls
+
+    def test_shares_error(self):
+        flight = SingleFlight()
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError("no book")
+
+        results = self.run_concurrently(flight, "packtbook", failing)
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_sequential_calls_run_again(self):
+        flight = SingleFlight()
+        calls = []
+
+        flight.do("key", calls.append, 1)
+        flight.do("key", calls.append, 2)
+
+        assert calls == [1, 2]
+
+    def test_different_keys(self):
+        flight = SingleFlight()
+
+        assert flight.do("a", lambda: "a") == ("a", False)
+        assert flight.do("b", lambda: "b") == ("b", False)
+
+        with pytest.raises(KeyError):
+            flight.do("c", {}.__getitem__, "missing")
@@ -0,0 +1,128 @@
+import json
+
+from Bot import Bot
+from BotHelper import FileExporter, NOOP_SPAN, Response, Tracer, tracer
+from tests.unit.BotHelper.test_slack_conn import RecordingSlackConn
+
+
+class ListExporter(object):
+
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append(spans)
+
+
+class TestTracing(object):
+
+    def test_off_without_exporter(self):
+        local_tracer = Tracer()
+
+        assert local_tracer.start_trace("event") is NOOP_SPAN
+
+        with local_tracer.span("work") as span:
+            assert span is NOOP_SPAN
+
+    def test_span_tree(self):
+        exporter = ListExporter()
+        local_tracer = Tracer(exporter)
+
+        root = local_tracer.start_trace("event", user="U1")
+
+        with local_tracer.activate(root):
+            with local_tracer.span("outer"):
+                with local_tracer.span("inner", rows=3):
+                    pass
+
+        root.end()
+        local_tracer.flush()
+
+        spans = {span["name"]: span for span in exporter.traces[0]}
+
+        assert spans["event"]["parent_id"] is None
+        assert spans["event"]["attributes"] == {"user": "U1"}
+        assert spans["outer"]["parent_id"] == spans["event"]["span_id"]
+        assert spans["inner"]["parent_id"] == spans["outer"]["span_id"]
+        assert len({span["trace_id"] for span in spans.values()}) == 1
+
+    def test_sampling_keeps_failed_and_slow_traces(self):
+        exporter = ListExporter()
+        local_tracer = Tracer(exporter, sample_rate=0.0, slow_threshold=60)
+
+        for name in ("fast", "failed"):
+            root = local_tracer.start_trace(name)
+
+            with local_tracer.activate(root):
+                try:
+                    with local_tracer.span("work"):
+                        if name == "failed":
+                            raise ValueError("bad")
+                except ValueError:
+                    pass
+
+            root.end()
+
+        local_tracer.slow_threshold = 0
+        local_tracer.start_trace("slow").end()
+        local_tracer.flush()
+
+        roots = [[span for span in trace if span["parent_id"] is None][0] for trace in exporter.traces]
+
+        assert [root["name"] for root in roots] == ["failed", "slow"]
+        assert [span["status"] for span in exporter.traces[0] if span["name"] == "work"] == ["error"]
+
+    def test_file_exporter(self, tmpdir):
+        path = str(tmpdir.join("traces.jsonl"))
+        local_tracer = Tracer(FileExporter(path))
+
+        local_tracer.start_trace("event").end()
+        local_tracer.flush()
+
+        with open(path) as f:
+            assert json.loads(f.readline())["name"] == "event"
+
+    def test_command_trace(self):
+        exporter = ListExporter()
+        tracer.configure(exporter)
+
+        try:
+            slack = RecordingSlackConn()
+            bot = Bot("UBOT", slack, None)
+            events = [{"type": "message", "text": "<@UBOT> what's my name?", "channel": "C1", "user": "U1"}]
+
+            command, channel, user, msg_type = slack.parse_bot_commands(events, "UBOT")
+            bot.respond_to_command(command, channel, user, msg_type, slack.trace)
+            tracer.flush()
+        finally:
+            tracer.configure(None)
+
+        spans = {span["name"]: span for span in exporter.traces[0]}
+
+        assert set(spans) == {"slack.command", "handle_command", "command", "response_to_client",
+                              "slack.post_message"}
+        assert "queued_ms" in spans["slack.command"]["attributes"]
+        assert spans["command"]["attributes"] == {"command": "my_name", "outcome": "ok"}
+        assert spans["command"]["parent_id"] == spans["handle_command"]["span_id"]
+        assert spans["slack.post_message"]["parent_id"] == spans["response_to_client"]["span_id"]
+
+    def test_fan_out_spans(self):
+        exporter = ListExporter()
+        tracer.configure(exporter)
+
+        try:
+            slack = RecordingSlackConn()
+            root = tracer.start_trace("event")
+
+            with tracer.activate(root):
+                slack.response_to_client(Response(("C1", "C2", "C3"), "Hello!", None))
+
+            root.end()
+            tracer.flush()
+        finally:
+            tracer.configure(None)
+
+        spans = exporter.traces[0]
+        parent = [span["span_id"] for span in spans if span["name"] == "response_to_client"][0]
+
+        assert [span["parent_id"] for span in spans if span["name"] == "slack.post_message"] == [parent] * 3
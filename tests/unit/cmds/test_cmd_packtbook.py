@@ -0,0 +1,261 @@
+import string
+import random
+import json
+import time
+
+import pytest
+
+from Bot import Bot
+from BotHelper import DriverPool, PacktBook, PacktPageError, metrics
+
+from cmds import packtbook as cmd_packtbook
+from tests.fixtures.packt.server import PacktFixtureServer
+
+
+class FakeBrowser(object):
+    """
+    Stand-in for a WebDriver whose page finishes rendering after a few polls
+    """
+
+    def __init__(self, elements, polls=3):
+        self.elements = elements
+        self.polls = polls
+        self.current_url = "about:blank"
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def get(self, url):
+        self.current_url = url
+
+    def execute_script(self, script):
+        self.polls -= 1
+        return self.elements if self.polls <= 0 else None
+
+    def quit(self):
+        pass
+
+
+class RequestsDb(object):
+    """
+    Stand-in for the Mongo connection that records the bulk writes sent to it
+    """
+    CONFIG = {"db": "bot", "collections": {"book_requests": "book_requests"}}
+
+    def __init__(self):
+        self.writes = []
+
+    def bulk_write(self, requests, ordered=True, db=None, collection=None):
+        self.writes.append((requests, ordered, collection))
+
+
+class TestCmdPacktbook(object):
+    cmd = "packtbook"
+    uid = ''.join(random.choice(string.ascii_uppercase + string.digits)
+                  for _ in range(9))
+    bot = Bot(uid, None, None)
+
+    def test_command(self):
+        assert cmd_packtbook.command == self.cmd
+
+    def test_public(self):
+        assert cmd_packtbook.public
+
+    def test_format_time_left(self):
+        assert cmd_packtbook.format_time_left(5 * 3600 + 5 * 60 + 5) == "5 hours, 5 minutes, and 5 seconds"
+        assert cmd_packtbook.format_time_left(3600 + 1) == "1 hour and 1 second"
+        assert cmd_packtbook.format_time_left(60) == "1 minute"
+
+    def test_output_from_cache(self):
+        cmd_packtbook.cache.book = PacktBook("Learning Python", "https://example.com/cover.png", time.time() + 7200.5)
+
+        response = cmd_packtbook.execute(self.cmd, self.uid, self.bot)
+        attachment = json.loads(response[1])[0]
+
+        assert response[0] is None
+        assert attachment["title"] == "Learning Python"
+        assert attachment["image_url"] == "https://example.com/cover.png"
+        assert attachment["footer"] == "There's still 2 hours to get this book!"
+
+    def test_output_page_error(self):
+        def fetch():
+            raise PacktPageError("No free book today!")
+
+        cache = cmd_packtbook.cache
+        cmd_packtbook.cache = cmd_packtbook.BookCache(fetch)
+
+        try:
+            response = cmd_packtbook.execute(self.cmd, self.uid, self.bot)
+        finally:
+            cmd_packtbook.cache = cache
+
+        assert response == ("No free book today!", None)
+
+    def test_parse_html(self):
+        html = """
+        <div class="product">
+            <h3 class="product__title">Hands-On Python</h3>
+            <img class="product__img" src="https://example.com/cover.png">
+            <div class="countdown__timer">05:04:03</div>
+        </div>
+        """
+        book = cmd_packtbook.parse_html(html)
+
+        assert book.title == "Hands-On Python"
+        assert book.image == "https://example.com/cover.png"
+        assert 5 * 3600 + 4 * 60 + 2 <= book.time_left() <= 5 * 3600 + 4 * 60 + 3
+
+    def test_parse_html_warning(self):
+        html = '<div class="message warning">Free learning is taking a break!</div>'
+
+        with pytest.raises(PacktPageError, match="Free learning is taking a break!"):
+            cmd_packtbook.parse_html(html)
+
+    def test_parse_html_without_countdown(self):
+        html = """
+        <div class="product">
+            <h3 class="product__title">Hands-On Python</h3>
+            <img class="product__img" src="https://example.com/cover.png">
+            <div class="countdown__timer"></div>
+        </div>
+        """
+
+        # the expiry isn't guessed, the browser has to render the countdown
+        with pytest.raises(ValueError, match="Countdown"):
+            cmd_packtbook.parse_html(html)
+
+    def test_output_page_gone(self):
+        url, cache = cmd_packtbook.url, cmd_packtbook.cache
+        cmd_packtbook.cache = cmd_packtbook.BookCache(cmd_packtbook.scrape_book)
+
+        with PacktFixtureServer() as fixture:
+            cmd_packtbook.url = fixture.url("gone")
+
+            try:
+                response = cmd_packtbook.execute(self.cmd, self.uid, self.bot)
+            finally:
+                cmd_packtbook.url, cmd_packtbook.cache = url, cache
+
+        # a missing page isn't retried in the browser
+        assert response[0].startswith("It appears that the free book page doesn't exist anymore")
+        assert fixture.requests == 1
+
+    @pytest.mark.parametrize("scenario, expected", [
+        ("book", "Hands-On Python for Beginners"),
+        ("warning", PacktPageError),
+        ("error", PacktPageError),
+        ("slow", ValueError),
+    ])
+    def test_scrape_http_fixtures(self, scenario, expected):
+        url = cmd_packtbook.url
+
+        with PacktFixtureServer() as fixture:
+            cmd_packtbook.url = fixture.url(scenario)
+
+            try:
+                if isinstance(expected, str):
+                    assert cmd_packtbook.scrape_http().title == expected
+                else:
+                    with pytest.raises(expected):
+                        cmd_packtbook.scrape_http()
+            finally:
+                cmd_packtbook.url = url
+
+            assert fixture.requests == 1
+
+    def test_scrape_fallback(self):
+        def http():
+            raise ValueError("Book elements not found in the page HTML")
+
+        def selenium():
+            return PacktBook("From the browser", "cover.png", time.time() + 60)
+
+        strategies = cmd_packtbook.strategies
+        cmd_packtbook.strategies = [("http", http), ("selenium", selenium)]
+
+        try:
+            book = cmd_packtbook.scrape_book()
+        finally:
+            cmd_packtbook.strategies = strategies
+
+        assert book.title == "From the browser"
+        assert metrics.counters["packtbook.fetch.http.failure"] >= 1
+        assert metrics.counters["packtbook.fetch.selenium.success"] >= 1
+
+    def test_scrape_selenium(self):
+        elements = {"warning": "", "error": "", "title": "Rendered Book", "image": "cover.png",
+                    "countdown": "00:10:00"}
+        pool = cmd_packtbook.pool
+        cmd_packtbook.pool = DriverPool(lambda: FakeBrowser(elements))
+
+        try:
+            book = cmd_packtbook.scrape_selenium()
+        finally:
+            cmd_packtbook.pool = pool
+
+        assert book.title == "Rendered Book"
+        assert 599 <= book.time_left() <= 600
+
+        for phase in ("navigation", "render", "extraction"):
+            assert metrics.get_timing("packtbook.selenium.{}".format(phase))["count"] >= 1
+
+    def test_scrape_selenium_missing_elements(self):
+        elements = {"warning": "", "error": "", "title": "Rendered Book", "image": "", "countdown": ""}
+        pool, render_timeout = cmd_packtbook.pool, cmd_packtbook.render_timeout
+        cmd_packtbook.pool = DriverPool(lambda: FakeBrowser(elements, polls=0))
+        cmd_packtbook.render_timeout = 0.2
+
+        try:
+            with pytest.raises(PacktPageError, match="I couldn't grab the correct page elements"):
+                cmd_packtbook.scrape_selenium()
+        finally:
+            cmd_packtbook.pool, cmd_packtbook.render_timeout = pool, render_timeout
+
+    def get_requests_bot(self):
+        bot = Bot(self.uid, None, None)
+        bot.db_conn = RequestsDb()
+
+        return bot
+
+    def test_request_add(self):
+        bot = self.get_requests_bot()
+        words = ["word{}".format(i) for i in range(20)]
+
+        response = cmd_packtbook.execute('packtbook request -a ' + ' '.join(words) + ' "machine learning"',
+                                         self.uid, bot)
+
+        assert response[0].startswith("You have made a book request for: word0")
+        assert len(bot.db_conn.writes) == 1
+
+        operations, ordered, collection = bot.db_conn.writes[0]
+        assert ordered and collection == "book_requests"
+        assert len(operations) == 22
+        assert operations[0]._filter == {"word": "word0"}
+        assert operations[0]._doc == {"$addToSet": {"users": self.uid}}
+        assert operations[0]._upsert
+        assert operations[20]._filter == {"word": "machine learning"}
+        assert operations[-1]._filter == {"users": {"$size": 0}}
+
+        assert self.uid in cmd_packtbook.matcher.match("Machine Learning for Everyone")
+        cmd_packtbook.matcher.clear(self.uid)
+
+    def test_request_delete(self):
+        bot = self.get_requests_bot()
+
+        response = cmd_packtbook.execute('packtbook request -d java python', self.uid, bot)
+        operations = bot.db_conn.writes[0][0]
+
+        assert response[0] == "I have deleted your request(s) for: java, python"
+        assert len(operations) == 2
+        assert operations[0]._filter == {"word": {"$in": ["java", "python"]}}
+        assert operations[0]._doc == {"$pull": {"users": self.uid}}
+
+    def test_request_clear(self):
+        bot = self.get_requests_bot()
+
+        response = cmd_packtbook.execute('packtbook request -c', self.uid, bot)
+        operations = bot.db_conn.writes[0][0]
+
+        assert response[0] == "All of your requests have been cleared."
+        assert operations[0]._filter == {"users": self.uid}
+        assert operations[0]._doc == {"$pull": {"users": self.uid}}
@@ -0,0 +1,269 @@
+import string
+import random
+import json
+import os
+import struct
+import time
+
+import pytest
+
+from Bot import Bot
+from BotHelper import Catalog
+from BotHelper.Catalog import SNAPSHOT_FORMAT
+
+from cmds import snhu_catalog as cmd_snhu_catalog
+
+SUBJECTS = [
+    {
+        "title": "Computer Science",
+        "courses": [
+            {
+                "id": "CS100",
+                "title": "Introduction to Programming",
+                "description": "Variables, loops and functions.",
+                "credits": "3 credits",
+                "requisites": None
+            },
+            {
+                "id": "CS200",
+                "title": "Data Structures",
+                "description": "Covers lists, stacks, queues, trees and recursion.",
+                "credits": "3 credits",
+                "requisites": "CS100"
+            },
+            {
+                "id": "CS260",
+                "title": "Algorithms",
+                "description": "Analysis of sorting and searching algorithms.",
+                "credits": "3 credits",
+                "requisites": "Prerequisite: CS 200"
+            },
+            {
+                "id": "CS499",
+                "title": "Capstone",
+                "description": "Final project.",
+                "credits": "3 credits",
+                "requisites": "CS-260 or permission of instructor"
+            }
+        ]
+    },
+    {
+        "title": "Accounting",
+        "courses": [
+            {
+                "id": "ACC201",
+                "title": "Financial Accounting",
+                "description": "Principles of financial statements.",
+                "credits": "3 credits",
+                "requisites": None
+            }
+        ]
+    }
+]
+
+
+class CatalogDb(object):
+    """
+    Minimal stand-in for MongoConn serving the catalog subjects
+    """
+
+    def __init__(self, subjects, version=1):
+        self.subjects = subjects
+        self.version = version
+        self.loads = 0
+
+    def find_document(self, query, db=None, collection=None):
+        return {"_id": "version", "version": self.version}
+
+    def find_documents(self, query, db=None, collection=None):
+        self.loads += 1
+        return self.subjects
+
+
+class TestCmdSnhuCatalog(object):
+    cmd = "catalog"
+    uid = ''.join(random.choice(string.ascii_uppercase + string.digits)
+                  for _ in range(9))
+
+    def get_bot(self):
+        if cmd_snhu_catalog.refresh_thread:
+            cmd_snhu_catalog.refresh_thread.join()
+
+        cmd_snhu_catalog.catalog = None
+        cmd_snhu_catalog.last_loaded = 0
+        cmd_snhu_catalog.last_checked = 0
+        cmd_snhu_catalog.snapshot_path = None
+
+        return Bot(self.uid, None, None, CatalogDb(SUBJECTS))
+
+    def test_command(self):
+        assert cmd_snhu_catalog.command == self.cmd
+
+    def test_public(self):
+        assert cmd_snhu_catalog.public
+
+    def test_output_course(self):
+        response = cmd_snhu_catalog.execute("catalog CS-200", self.uid, self.get_bot())
+        attachment = json.loads(response[1])
+
+        assert attachment[0]["title"] == "Data Structures"
+        assert attachment[0]["fields"][-1]["value"] == "CS100"
+
+    def test_output_path(self):
+        response = cmd_snhu_catalog.execute("catalog path cs-499", self.uid, self.get_bot())
+
+        assert response[0] == "Here is the path to *CS499*:\n1. CS100\n2. CS200\n3. CS260\n4. *CS499*"
+
+    def test_output_path_no_prerequisites(self):
+        response = cmd_snhu_catalog.execute("catalog path ACC201", self.uid, self.get_bot())
+
+        assert response[0] == "*ACC201* doesn't have any prerequisites. Dive right in!"
+
+    def test_output_unlocks(self):
+        response = cmd_snhu_catalog.execute("catalog unlocks CS200", self.uid, self.get_bot())
+
+        assert response[0] == "*CS200* is a prerequisite for: CS260\n" \
+                              "Further down the line, it also unlocks: CS499"
+
+    def test_output_unlocks_unknown(self):
+        response = cmd_snhu_catalog.execute("catalog unlocks CS999", self.uid, self.get_bot())
+
+        assert response[0] == "I couldn't find *CS999* in the catalog."
+
+    def test_output_search(self):
+        response = cmd_snhu_catalog.execute("catalog search recursion", self.uid, self.get_bot())
+        attachment = json.loads(response[1])
+
+        assert len(attachment) == 1
+        assert attachment[0]["title"] == "Data Structures"
+
+    def test_output_search_no_match(self):
+        response = cmd_snhu_catalog.execute("catalog search basket weaving", self.uid, self.get_bot())
+
+        assert response[0] == "I couldn't find any courses matching *basket weaving*."
+        assert response[1] is None
+
+    def test_catalog_cached(self):
+        bot = self.get_bot()
+
+        cmd_snhu_catalog.execute("catalog CS200", self.uid, bot)
+        cmd_snhu_catalog.execute("catalog search sorting", self.uid, bot)
+
+        assert bot.db_conn.loads == 1
+
+    def test_refresh_on_new_version(self):
+        bot = self.get_bot()
+        cmd_snhu_catalog.load_catalog(bot)
+
+        # same version: only the version is checked
+        cmd_snhu_catalog.last_checked = 0
+        cmd_snhu_catalog.load_catalog(bot)
+        cmd_snhu_catalog.refresh_thread.join()
+
+        assert bot.db_conn.loads == 1
+
+        bot.db_conn.version = 2
+        cmd_snhu_catalog.last_checked = 0
+        cmd_snhu_catalog.load_catalog(bot)
+        cmd_snhu_catalog.refresh_thread.join()
+
+        assert bot.db_conn.loads == 2
+        assert cmd_snhu_catalog.catalog.version == 2
+
+    def test_background_version_check(self, monkeypatch):
+        bot = self.get_bot()
+        cmd_snhu_catalog.load_catalog(bot)
+        monkeypatch.setattr(cmd_snhu_catalog, "version_check_interval", 0.05)
+
+        cmd_snhu_catalog.watch_version(bot.db_conn)
+
+        try:
+            # nobody calls the command, the watcher picks up the new version on its own
+            bot.db_conn.version = 2
+            deadline = time.time() + 5
+
+            while cmd_snhu_catalog.catalog.version != 2 and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            cmd_snhu_catalog.stop_watch()
+
+        assert cmd_snhu_catalog.catalog.version == 2
+        assert bot.db_conn.loads == 2
+        assert not cmd_snhu_catalog.watch_thread.is_alive()
+
+    def test_incremental_refresh(self):
+        bot = self.get_bot()
+        catalog = cmd_snhu_catalog.load_catalog(bot)
+
+        subjects = json.loads(json.dumps(SUBJECTS))
+        subjects[0]["courses"][2]["description"] = "Graph traversal and recursion."
+
+        assert catalog.load_documents(subjects) == 1
+        assert {c for c, _ in catalog.search("recursion")} == {"CS200", "CS260"}
+        assert catalog.load_documents(subjects[:1]) == 1
+        assert catalog.get_course("ACC201") is None
+        assert catalog.search("financial") == []
+
+    def test_output_disabled(self):
+        cmd_snhu_catalog.catalog = None
+        cmd_snhu_catalog.last_checked = 0
+
+        response = cmd_snhu_catalog.execute("catalog CS200", self.uid, Bot(self.uid, None, None))
+
+        assert response[0].startswith("I'm sorry. This command has been disabled")
+
+    def test_snapshot_warm_start(self, tmpdir):
+        path = os.path.join(str(tmpdir), "catalog.snapshot")
+        cmd_snhu_catalog.load_catalog(self.get_bot())
+        cmd_snhu_catalog.catalog.save(path)
+
+        cmd_snhu_catalog.catalog = None
+        cmd_snhu_catalog.warm_start(None, path)
+
+        # answered from the snapshot without a database connection
+        bot = Bot(self.uid, None, None)
+        response = cmd_snhu_catalog.execute("catalog search recursion", self.uid, bot)
+
+        assert json.loads(response[1])[0]["title"] == "Data Structures"
+        assert cmd_snhu_catalog.catalog.get_course("ACC201").credits == "3 credits"
+
+    def test_snapshot_invalid(self, tmpdir):
+        path = os.path.join(str(tmpdir), "catalog.snapshot")
+
+        with open(path, "wb") as f:
+            f.write(b"not a snapshot at all")
+
+        cmd_snhu_catalog.catalog = None
+        cmd_snhu_catalog.warm_start(None, path)
+
+        assert cmd_snhu_catalog.catalog is None
+
+    def test_snapshot_round_trip(self, tmpdir):
+        path = os.path.join(str(tmpdir), "catalog.snapshot")
+        catalog = cmd_snhu_catalog.load_catalog(self.get_bot())
+        catalog.save(path)
+
+        loaded = Catalog.load(path)
+
+        assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+        assert loaded.version == catalog.version
+        assert loaded.get_subjects() == catalog.get_subjects()
+        assert repr(loaded) == repr(catalog)
+        assert loaded.search("recursion")
+        assert [c for c, _ in loaded.search("recursion")] == [c for c, _ in catalog.search("recursion")]
+        assert loaded.graph.get_prerequisites("CS260", True) == catalog.graph.get_prerequisites("CS260", True)
+
+        # the restored index keeps working incrementally
+        assert loaded.load_documents(SUBJECTS[:1]) == 1
+        assert loaded.search("financial") == []
+
+    def test_snapshot_other_format(self, tmpdir):
+        path = os.path.join(str(tmpdir), "catalog.snapshot")
+        cmd_snhu_catalog.load_catalog(self.get_bot()).save(path)
+
+        with open(path, "r+b") as f:
+            f.seek(7)
+            f.write(struct.pack("<H", SNAPSHOT_FORMAT - 1))
+
+        with pytest.raises(ValueError):
+            Catalog.load(path)